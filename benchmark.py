@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the East Wing's per-turn hot paths.
+
+Runs offline - the chat turn benchmark uses the mock backend with no
+latency, so it measures only our own code (prompt building, request
+building, JSON parsing, summary carry-over and stage progression).
+
+    python benchmark.py                          # run and save benchmark_results.json
+    python benchmark.py --compare baseline.json  # also flag regressions against a saved run
+    python benchmark.py --filter prompt          # only benchmarks whose name contains "prompt"
+    python benchmark.py --startup                # time `eastWing.py --help` (and dist/eastWing if built),
+                                                 # saved to benchmark_startup.json
+
+Exits with status 1 if --compare finds a regression, or --startup goes over
+its budget, so it can gate CI.
+"""
+
+import os
+import sys
+import io
+import json
+import random
+import argparse
+import platform
+import statistics
+import subprocess
+import time
+import timeit
+from contextlib import redirect_stdout
+from datetime import datetime
+
+import eastWing
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# CONFIGURATION
+# ═══════════════════════════════════════════════════════════════════════════════
+
+RESULTS_FILE = 'benchmark_results.json'
+STARTUP_RESULTS_FILE = 'benchmark_startup.json'  # --startup results, so they don't replace the hot-path ones
+REPEATS = 5  # Timing runs per benchmark (the median is reported)
+MIN_RUN_SECONDS = 0.2  # Each run loops the benchmark for at least this long
+REGRESSION_THRESHOLD = 0.10  # Flag benchmarks more than 10% slower than the baseline
+
+# Startup benchmark - median wall time of `eastWing.py --help`
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'eastWing.py')
+FROZEN_BUILDS = [os.path.join(os.path.dirname(SCRIPT), 'dist', name) for name in ['eastWing', 'eastWing.exe']]
+STARTUP_RUNS = 10
+STARTUP_BUDGET_MS = 250.0  # Running from source
+FROZEN_STARTUP_BUDGET_MS = 1500.0  # The one-file build unpacks itself before Python even starts
+LAZY_MODULES = ['openai', 'httpx', 'httpx2', 'dotenv', 'tiktoken', 'asyncio']  # Must not load for --help
+
+PERSONALITIES = ['mild', 'upset', 'medium', 'serious', 'angry', 'tired']
+
+# What players type - mostly conversation, with the commands mixed in
+# roughly as often as they get used
+INPUT_CORPUS = [
+    "hello",
+    "Hi there, wall. How are you holding up?",
+    "What happened to the rest of the East Wing?",
+    "Who tore you down?",
+    "Do you remember Roosevelt?",
+    "I'm just a tourist, I didn't know this was going on.",
+    "That seems really sad. Is there anything I can do to help?",
+    "Tell me about the ballroom they are building.",
+    "What do you think about the President's plans for the White House, honestly?",
+    "Were you there in 1942 when they expanded the building during the war?",
+    "ok",
+    "lol",
+    "You're just a wall, why should I care?",
+    "I heard the First Lady's offices used to be here. Is that true? What were they like?",
+    "help",
+    "help mood",
+    "mood",
+    "mood ?",
+    "speed ?",
+    "model",
+    "turn",
+    "api",
+    "memory",
+    "cost",
+    "perf",
+    "color ?",
+    "mood angry",
+    "bye",
+]
+
+# A long reply as the wall might give it at the serious stages
+LONG_REPLY = (
+    "You want to know what it's like? I stood here for over a century. I heard Eleanor Roosevelt's footsteps "
+    "when they added the second floor in 1942, and I held up the offices of every First Lady since. Tourists "
+    "walked past me by the thousand - school groups, veterans, families who saved for years to see the place "
+    "where history happened. And now? Now I'm the last of it. A ballroom, they said. Ninety thousand square "
+    "feet of gold leaf and chandeliers where the East Wing used to be, and nobody asked the building what it "
+    "thought. Nobody ever asks the building. "
+) * 3
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# BENCHMARKS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def make_benchmarks():
+    """Build the benchmarks
+
+    Returns:
+        list: (name, function) pairs - each function runs one operation
+    """
+    facts = eastWing.FALLBACK_FACTS
+    benchmarks = []
+
+    for personality in PERSONALITIES:
+        benchmarks.append((
+            f"get_system_prompt[{personality}]",
+            lambda personality=personality: eastWing.get_system_prompt(facts, 0, 'slow', personality)
+        ))
+
+    def current_stage():
+        for speed in eastWing.PROGRESSION_SPEEDS:
+            for turn_count in range(40):
+                eastWing.get_current_stage(turn_count, speed)
+    benchmarks.append(("get_current_stage[80 turns]", current_stage))
+
+    def length_instruction():
+        for speed in eastWing.PROGRESSION_SPEEDS:
+            for turn_count in range(0, 40, 4):
+                eastWing.get_random_length_instruction(turn_count, speed)
+    benchmarks.append(("get_random_length_instruction[20 turns]", length_instruction))
+
+    def parse_corpus():
+        for player_input in INPUT_CORPUS:
+            eastWing.parse_command(player_input)
+    benchmarks.append((f"parse_command[{len(INPUT_CORPUS)} inputs]", parse_corpus))
+
+    sink = io.StringIO()
+
+    def wrap_long_reply():
+        sink.seek(0)
+        sink.truncate()
+        with redirect_stdout(sink):
+            eastWing.print_wrapped(LONG_REPLY, "THE WALL: ", eastWing.COLOR_AI)
+    benchmarks.append((f"print_wrapped[{len(LONG_REPLY.split())} words]", wrap_long_reply))
+
+    # Full chat turn against the mock backend, on one long-running session
+    # so the summary carry-over and stage changes are part of it
+    eastWing.llm_backend = eastWing.MockBackend(latency=0, tokens_per_second=0)
+    session = eastWing.GameSession(facts, 'fast', eastWing.DEFAULT_MODEL)
+
+    def chat_turn():
+        wall_response, record = session.chat(INPUT_CORPUS[session.turn_count % len(INPUT_CORPUS)])
+        session.perf.finish(record)
+        if len(session.perf.records) > 1000:
+            del session.perf.records[:]  # Don't let the timing records grow without bound
+    benchmarks.append(("chat_turn[mock]", chat_turn))
+
+    # Per-turn facts retrieval, over distilled (bulleted) facts
+    distilled = eastWing.distill_facts_locally(f"{facts}\n\n{LONG_REPLY}")
+    retrieve_session = eastWing.GameSession(distilled, 'fast', eastWing.DEFAULT_MODEL, facts_mode='retrieve')
+
+    def retrieve_facts():
+        for player_input in INPUT_CORPUS:
+            retrieve_session.facts_message(player_input, retrieve_session.conversation_summary)
+    benchmarks.append((f"facts_message[{len(INPUT_CORPUS)} inputs]", retrieve_facts))
+
+    return benchmarks
+
+
+def time_benchmark(func, repeats=REPEATS, min_run_seconds=MIN_RUN_SECONDS):
+    """Time one benchmark
+
+    Args:
+        func: Function that runs one operation
+        repeats: Number of timing runs
+        min_run_seconds: Minimum length of each run
+
+    Returns:
+        dict: Median and best time per operation in microseconds, and loop counts
+    """
+    timer = timeit.Timer(func)
+
+    # Find a loop count that makes each run last at least min_run_seconds
+    loops, seconds = timer.autorange()
+    if seconds < min_run_seconds:
+        loops = max(int(loops * min_run_seconds / max(seconds, 1e-9)), 1)
+
+    runs = [seconds / loops * 1e6 for seconds in timer.repeat(repeat=repeats, number=loops)]
+    return {
+        'median_us': round(statistics.median(runs), 3),
+        'best_us': round(min(runs), 3),
+        'loops': loops,
+        'repeats': repeats
+    }
+
+
+def run_benchmarks(name_filter=None, repeats=REPEATS, min_run_seconds=MIN_RUN_SECONDS):
+    """Run every benchmark (or those matching a filter) and print each result
+
+    Args:
+        name_filter: Only run benchmarks whose name contains this
+        repeats: Timing runs per benchmark
+        min_run_seconds: Minimum length of each run
+
+    Returns:
+        dict: {benchmark name: timing dict}
+    """
+    random.seed(0)  # Same length instructions (and mock replies) every run
+    results = {}
+    for name, func in make_benchmarks():
+        if name_filter and name_filter not in name:
+            continue
+        results[name] = time_benchmark(func, repeats, min_run_seconds)
+        print(f"{name:<45}{results[name]['median_us']:>14,.2f} us{results[name]['best_us']:>14,.2f} us")
+    return results
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# STARTUP
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def parse_import_times(stderr):
+    """Parse `python -X importtime` output
+
+    Returns:
+        dict: {top-level module: cumulative import time in microseconds}
+    """
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not name[1:].startswith(' '):  # Nested imports are indented
+            times[name.strip()] = int(cumulative_us)
+    return times
+
+
+def time_command(command, runs, env=None):
+    """Run a command several times
+
+    Returns:
+        tuple: (list of wall times in ms, stderr of the last run)
+    """
+    times = []
+    stderr = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        finished = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, env=env,
+                                  universal_newlines=True)
+        times.append((time.perf_counter() - start) * 1000)
+        stderr = finished.stderr
+        if finished.returncode != 0:
+            raise RuntimeError(f"{' '.join(command)} exited with {finished.returncode}:\n{stderr}")
+    return times, stderr
+
+
+def report_import_times(import_times, limit=10):
+    """Print the slowest top-level imports and fail if a lazy module was loaded
+
+    Returns:
+        list: Lazy modules that were imported anyway
+    """
+    if not import_times:
+        print("  (per-module import times not available for this run)")
+        return []
+    for name, cumulative_us in sorted(import_times.items(), key=lambda item: -item[1])[:limit]:
+        print(f"  {name:<43}{cumulative_us / 1000:>12,.2f} ms")
+    loaded = [name for name in LAZY_MODULES if name in import_times]
+    if loaded:
+        print(f"  Loaded at startup but should be lazy: {', '.join(loaded)}")
+    return loaded
+
+
+def run_startup_benchmark(runs=STARTUP_RUNS, exe=None, budget_ms=STARTUP_BUDGET_MS,
+                          frozen_budget_ms=FROZEN_STARTUP_BUDGET_MS):
+    """Time `eastWing.py --help` from source, and from a frozen build if there is one
+
+    Wall time is measured without -X importtime (it slows imports down);
+    one extra run with it gives the per-module breakdown. For a frozen
+    build the breakdown comes from PYTHONPROFILEIMPORTTIME, if the build
+    honors it.
+
+    Args:
+        runs: Timed runs per build
+        exe: Frozen build to time (default: dist/eastWing[.exe] if it exists)
+        budget_ms: Median startup budget from source
+        frozen_budget_ms: Median startup budget for the frozen build
+
+    Returns:
+        tuple: ({benchmark name: timing dict}, list of failure messages)
+    """
+    builds = [('source', [sys.executable, SCRIPT, '--help'], budget_ms, None)]
+    exe = exe or next((path for path in FROZEN_BUILDS if os.path.isfile(path)), None)
+    if exe:
+        builds.append(('frozen', [exe, '--help'], frozen_budget_ms, dict(os.environ, PYTHONPROFILEIMPORTTIME='1')))
+
+    results = {}
+    failures = []
+    for build, command, budget, profile_env in builds:
+        times, _ = time_command(command, runs)
+        if profile_env is None:
+            _, stderr = time_command([sys.executable, '-X', 'importtime'] + command[1:], 1)
+        else:
+            _, stderr = time_command(command, 1, profile_env)
+
+        name = f"startup[{build} --help]"
+        median = statistics.median(times)
+        results[name] = {'median_us': round(median * 1000, 3), 'best_us': round(min(times) * 1000, 3),
+                         'loops': 1, 'repeats': runs}
+        over = median > budget
+        print(f"{name:<45}{median:>12,.2f} ms{min(times):>12,.2f} ms   budget {budget:,.0f} ms"
+              f"{'  OVER BUDGET' if over else ''}")
+        if over:
+            failures.append(f"{name} took {median:,.0f} ms (budget {budget:,.0f} ms)")
+        for module in report_import_times(parse_import_times(stderr)):
+            failures.append(f"{name} imported {module}")
+
+    return results, failures
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# RESULTS
+# ═══════════════════════════════════════════════════════════════════════════════
+
+def save_results(path, results):
+    """Write a run's results, with enough context to tell runs apart"""
+    data = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+
+
+def compare_results(baseline, results, threshold=REGRESSION_THRESHOLD):
+    """Print each benchmark against a baseline run and flag regressions
+
+    Args:
+        baseline: Results dict loaded from an earlier run's file
+        results: This run's results
+        threshold: Fraction slower than the baseline that counts as a regression
+
+    Returns:
+        list: Names of the benchmarks that regressed
+    """
+    regressions = []
+    print(f"\n{'BENCHMARK':<45}{'BASELINE':>12}{'NOW':>12}{'CHANGE':>10}")
+    print("─" * 79)
+    for name, timing in results.items():
+        before = baseline.get(name)
+        if not before:
+            print(f"{name:<45}{'-':>12}{timing['median_us']:>12,.2f}{'new':>10}")
+            continue
+        change = timing['median_us'] / before['median_us'] - 1 if before['median_us'] else 0.0
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<45}{before['median_us']:>12,.2f}{timing['median_us']:>12,.2f}{change:>+10.1%}{flag}")
+    print(f"\nTimes are median microseconds per operation; more than {threshold:.0%} slower is a regression.")
+    return regressions
+
+
+def main():
+    """Entry point"""
+    parser = argparse.ArgumentParser(
+        prog='benchmark.py',
+        description='Micro-benchmarks for the East Wing game (offline, no API calls)',
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        '--out',
+        type=str,
+        metavar='FILE',
+        help=f'Write this run\'s results to FILE (default: {RESULTS_FILE}, or {STARTUP_RESULTS_FILE} with --startup)'
+    )
+    parser.add_argument(
+        '--compare',
+        type=str,
+        metavar='FILE',
+        help='Compare against the results in FILE and flag regressions'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        metavar='FRACTION',
+        help='Slowdown that counts as a regression (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--filter',
+        type=str,
+        metavar='TEXT',
+        help='Only run benchmarks whose name contains TEXT'
+    )
+    parser.add_argument(
+        '--startup',
+        action='store_true',
+        help='Benchmark startup (`eastWing.py --help`) instead of the hot paths'
+    )
+    parser.add_argument(
+        '--exe',
+        type=str,
+        metavar='FILE',
+        help='With --startup: frozen build to time (default: dist/eastWing if built)'
+    )
+    parser.add_argument(
+        '--budget-ms',
+        type=float,
+        default=STARTUP_BUDGET_MS,
+        metavar='MS',
+        help='With --startup: median startup budget from source (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--frozen-budget-ms',
+        type=float,
+        default=FROZEN_STARTUP_BUDGET_MS,
+        metavar='MS',
+        help='With --startup: median startup budget for the frozen build (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--repeats',
+        type=int,
+        default=REPEATS,
+        metavar='N',
+        help='Timing runs per benchmark (default: %(default)s)'
+    )
+    args = parser.parse_args()
+    if args.out is None:
+        args.out = STARTUP_RESULTS_FILE if args.startup else RESULTS_FILE
+
+    # Load the baseline first, so a bad path fails before the long part
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)['results']
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error: could not read baseline '{args.compare}' ({e}).")
+            sys.exit(2)
+
+    print(f"{'BENCHMARK':<45}{'MEDIAN':>17}{'BEST':>17}")
+    print("─" * 79)
+    failures = []
+    if args.startup:
+        results, failures = run_startup_benchmark(max(args.repeats, STARTUP_RUNS), args.exe, args.budget_ms,
+                                                  args.frozen_budget_ms)
+    else:
+        results = run_benchmarks(args.filter, args.repeats)
+
+    if os.path.abspath(args.out) == os.path.abspath(args.compare or ''):
+        print(f"\nNot overwriting the baseline {args.compare} - use --out to save this run.")
+    else:
+        save_results(args.out, results)
+        print(f"\nResults written to {args.out}")
+
+    if baseline is not None:
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            failures.append("regressions")
+
+    if failures:
+        if args.startup:
+            print("\nStartup budget failed:")
+            for failure in failures:
+                print(f"  - {failure}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
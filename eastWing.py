@@ -16,12 +16,25 @@ import textwrap
 import random
 import argparse
 import json
-from openai import OpenAI
-from dotenv import load_dotenv
-from tavily import TavilyClient
-
-# Load environment variables
-load_dotenv()
+import re
+import threading
+import queue
+import time
+import hashlib
+import math
+import functools
+import uuid
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
+from http import HTTPStatus
+from types import SimpleNamespace
+
+# Heavy dependencies (openai, httpx, dotenv, tiktoken) are imported on first
+# use - see load_environment(), import_httpx(), OpenAIBackend.connect() and
+# get_token_encoder() - so --help, argument errors and the menus start fast.
+# So are asyncio and concurrent.futures, which only the batch and server
+# modes use.
 
 # Windows ANSI color support
 import platform
@@ -36,8 +49,16 @@ if platform.system() == 'Windows':
 # Replace "your-actual-openai-key-here" with your real key before building .exe
 OPENAI_API_KEY = "your-actual-openai-key-here"
 
-# Initialize OpenAI client as None - will be created with error handling on first use
-client = None
+# Active LLM backend (see get_backend) - the OpenAI client inside it is
+# created with error handling on first use
+llm_backend = None
+
+# Adaptive model router (see ModelRouter) - None unless --adaptive
+model_router = None
+
+# The asyncio module, imported by main() for --serve only (WallServer runs on
+# it) - the other modes, and --help, start faster without it
+asyncio = None
 
 # Game configuration
 TEXT_WIDTH = 72  # Width for text wrapping
@@ -106,7 +127,11 @@ MODEL_OPTIONS = {
         'cost': 'Cheapest',
         'supports_temperature': False,  # GPT-5 models only support default temperature
         'is_reasoning_model': True,  # GPT-5 models use reasoning tokens
-        'reasoning_effort': 'minimal'  # Use minimal reasoning for speed
+        'reasoning_effort': 'minimal',  # Use minimal reasoning for speed
+        'price_input': 0.05,  # USD per 1M input tokens
+        'price_cached_input': 0.005,  # USD per 1M cached input tokens
+        'price_output': 0.40,  # USD per 1M output tokens (includes reasoning)
+        'downgrade_to': None  # Nothing faster to fall back to
     },
     'gpt-5-mini': {
         'description': 'Excellent quality, fast responses, moderate cost',
@@ -115,7 +140,11 @@ MODEL_OPTIONS = {
         'cost': 'Moderate',
         'supports_temperature': False,  # GPT-5 models only support default temperature
         'is_reasoning_model': True,  # GPT-5 models use reasoning tokens
-        'reasoning_effort': 'minimal'  # Use minimal reasoning for speed
+        'reasoning_effort': 'minimal',  # Use minimal reasoning for speed
+        'price_input': 0.25,  # USD per 1M input tokens
+        'price_cached_input': 0.025,  # USD per 1M cached input tokens
+        'price_output': 2.00,  # USD per 1M output tokens (includes reasoning)
+        'downgrade_to': 'gpt-5-nano'  # Faster model the adaptive router falls back to
     },
     'gpt-5': {
         'description': 'Best quality and accuracy, slower, higher cost',
@@ -124,7 +153,11 @@ MODEL_OPTIONS = {
         'cost': 'Most Expensive',
         'supports_temperature': False,  # GPT-5 models only support default temperature
         'is_reasoning_model': True,  # GPT-5 models use reasoning tokens
-        'reasoning_effort': 'low'  # Use low reasoning for better quality than minimal
+        'reasoning_effort': 'low',  # Use low reasoning for better quality than minimal
+        'price_input': 1.25,  # USD per 1M input tokens
+        'price_cached_input': 0.125,  # USD per 1M cached input tokens
+        'price_output': 10.00,  # USD per 1M output tokens (includes reasoning)
+        'downgrade_to': 'gpt-5-mini'  # Faster model the adaptive router falls back to
     },
     'gpt-4o-mini': {
         'description': 'Legacy model, good quality, fast responses',
@@ -133,7 +166,11 @@ MODEL_OPTIONS = {
         'cost': 'Low',
         'supports_temperature': True,  # GPT-4 models support custom temperature
         'is_reasoning_model': False,  # Not a reasoning model
-        'reasoning_effort': None
+        'reasoning_effort': None,
+        'price_input': 0.15,  # USD per 1M input tokens
+        'price_cached_input': 0.075,  # USD per 1M cached input tokens
+        'price_output': 0.60,  # USD per 1M output tokens (includes reasoning)
+        'downgrade_to': None  # Nothing faster to fall back to
     }
 }
 
@@ -163,6 +200,66 @@ WALL_RESPONSE_SCHEMA = {
     }
 }
 
+# Fields of the structured summary: (label in the summary text, key in SummaryRecord, kind)
+# List fields are bulleted in the text and change by items added and removed
+SUMMARY_FIELDS = [
+    ('WALL MOOD', 'wall_mood', 'text'),
+    ('PLAYER MOOD', 'player_mood', 'text'),
+    ('LAST TOPIC', 'last_topic', 'text'),
+    ('KEY TOPICS COVERED', 'key_topics', 'list'),
+    ('PLAYER INFO', 'player_info', 'list'),
+    ('IMPORTANT REFERENCES', 'important_references', 'list'),
+    ('OPINION', 'opinion', 'text'),
+    ('CONVERSATION SUMMARY', 'conversation_summary', 'text')
+]
+
+# Schema variant for --summary-mode delta: the model sends only what changed
+# in the summary, and the game merges it into its SummaryRecord
+SUMMARY_DELTA_PROPERTIES = {}
+for _label, _key, _kind in SUMMARY_FIELDS:
+    if _kind == 'list':
+        SUMMARY_DELTA_PROPERTIES[f"{_key}_added"] = {
+            "type": "array", "items": {"type": "string"},
+            "description": f"New {_label} items (empty if none)"}
+        SUMMARY_DELTA_PROPERTIES[f"{_key}_removed"] = {
+            "type": "array", "items": {"type": "string"},
+            "description": f"{_label} items that no longer apply, exactly as written (empty if none)"}
+    else:
+        SUMMARY_DELTA_PROPERTIES[_key] = {
+            "type": ["string", "null"],
+            "description": f"New {_label}, or null if unchanged"}
+
+WALL_DELTA_RESPONSE_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "wall_response_delta",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "response": {
+                    "type": "string",
+                    "description": "The wall's dialogue to the player"
+                },
+                "summary_changes": {
+                    "type": "object",
+                    "description": "Only what this exchange changed in the structured summary",
+                    "properties": SUMMARY_DELTA_PROPERTIES,
+                    "required": list(SUMMARY_DELTA_PROPERTIES),
+                    "additionalProperties": False
+                }
+            },
+            "required": ["response", "summary_changes"],
+            "additionalProperties": False
+        }
+    }
+}
+
+SUMMARY_MODES = ['full', 'delta']
+SUMMARY_DELTA_INSTRUCTION = """SUMMARY UPDATES: Instead of rewriting the whole structured summary, fill in summary_changes with only \
+what this exchange changed - null or an empty list for every field that stays the same. Your current summary \
+is the one you were given; the game applies your changes to it."""
+
 # Stage progression configuration
 # Uses spaced numbering (10, 20, 30...) to allow inserting stages later (e.g., stage_15)
 # Two speeds: slow (default, gradual progression) and fast (quick testing)
@@ -246,19 +343,187 @@ PROGRESSION_SPEEDS = {
     }
 }
 
+# Every personality the stages use - the moods that can be set by hand
+PERSONALITY_TYPES = sorted({stage['personality'] for stages in PROGRESSION_SPEEDS.values()
+                            for stage in stages.values()})
+
 # Fallback facts if Tavily is unavailable
 FALLBACK_FACTS = """The East Wing of the White House was originally built in 1908. It was extensivly remodeled in 1942 during World War II to provide additional office space. It houses the First Lady's staff and the White House Social Secretary. The East Wing has undergone various renovations over the decades."""
 
+# Tavily searches run at startup, in parallel
+# 'heading' introduces that query's facts when other facts come before them
+FACTS_QUERIES = [
+    {
+        'name': 'First',
+        'query': "White House East Wing renovation demolition current status 2025 political opinion about renovation",
+        'heading': None
+    },
+    {
+        'name': 'Second',
+        'query': "trump violations of building codes and safety regulations",
+        'heading': "ADDITIONAL FACTS ABOUT BUILDING CODE VIOLATIONS:"
+    }
+]
+
+# Overall time budget (seconds) for the startup searches - whatever hasn't
+# arrived by then is replaced with FALLBACK_FACTS
+FACTS_DEADLINE_SECONDS = 8.0
+
+# Local data folder - in the user's home folder rather than next to the
+# script, because the one-file .exe unpacks itself to a temporary folder
+DATA_DIR = os.path.join(os.path.expanduser('~'), '.eastWing')
+
+# Search results are cached on disk, keyed by query string
+# Fresh entries skip the search; stale ones are used and refreshed in the background
+FACTS_CACHE_FILE = os.path.join(DATA_DIR, 'facts_cache.json')
+FACTS_CACHE_TTL_HOURS = 24.0
+facts_cache_lock = threading.Lock()
+
+# Facts retrieval (see FactsIndex) - for facts too long to send whole on every turn
+FACTS_MODES = ['auto', 'full', 'retrieve']  # auto = retrieve only above FACTS_FULL_MAX_TOKENS
+FACTS_FULL_MAX_TOKENS = 1200
+FACTS_CHUNK_TOKENS = 80  # Consecutive sentences are grouped into chunks of about this size
+FACT_BULLET_PATTERN = re.compile(r"^(?:[-*\u2022]\s+)+")  # Bullet markers, dropped from chunked sentences
+FACTS_RETRIEVAL_TOKENS = 400  # Budget for the chunks sent with each turn
+FACTS_TOP_K = 6
+FACTS_SUMMARY_WEIGHT = 0.3  # Weight of the summary's words in a query, relative to the player's
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_STOPWORDS = frozenset(
+    "a an and are as at be but by did do does for from had has have he her his how i if in into is it its me my "
+    "no not of on or our she so that the their them then there they this to was we were what when where which "
+    "who why will with you your".split())
+FACTS_INDEX_CACHE_SIZE = 4  # Indexes kept, one per facts version
+RETRIEVED_FACTS_NOTE = ("(Only the facts that matter right now are given - in a system message before the "
+                        "player's words, headed RELEVANT FACTS.)")
+
+# Facts distillation (see distill_facts) - once per facts version, cached on disk by the facts' hash
+FACTS_DISTILL_FILE = os.path.join(DATA_DIR, 'distilled_facts.json')
+FACTS_DISTILL_TOKENS = 600  # Budget for the distilled bullets
+FACTS_DISTILL_CACHE_SIZE = 8  # Facts versions kept
+FACTS_DUPLICATE_OVERLAP = 0.8  # Share of a sentence's words already said for it to count as a repeat
+facts_distill_lock = threading.Lock()
+
+# Pre-generated opening greetings, kept per (model, facts version)
+# One is handed out at startup; the pool is topped up in the background
+GREETING_POOL_FILE = os.path.join(DATA_DIR, 'greeting_pool.json')
+GREETING_POOL_SIZE = 5
+greeting_pool_lock = threading.Lock()
+
+# Shared HTTP connection pool (see HTTPPool)
+OPENAI_BASE_URL = 'https://api.openai.com/v1'  # Default - the OPENAI_BASE_URL environment variable wins
+TAVILY_SEARCH_URL = 'https://api.tavily.com/search'
+HTTP_MAX_CONNECTIONS = 20
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+HTTP_KEEPALIVE_EXPIRY_SECONDS = 120.0  # Must be longer than the keep-warm interval
+HTTP_TIMEOUT_SECONDS = 60.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 10.0
+KEEP_WARM_INTERVAL_SECONDS = 30.0  # Ping this often while the player is typing
+KEEP_WARM_MAX_IDLE_MINUTES = 10  # Stop pinging if nobody has played for this long
+
+# Deadlines, retries and hedging for API calls (see ResilientBackend)
+CALL_TIMEOUT_SECONDS = 30.0  # Until the first token (or the whole reply, if not streamed)
+CALL_RETRIES = 2
+RETRY_BASE_DELAY_SECONDS = 0.5  # Doubles with each retry, +/- 50% jitter
+RETRY_MAX_DELAY_SECONDS = 8.0
+HEDGE_WINDOW = 50  # Recent first-token times the p95 is taken over
+HEDGE_MIN_SAMPLES = 10  # No hedging until this many calls have been timed
+HEDGE_MIN_DELAY_SECONDS = 0.5
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_TYPES = {'APIConnectionError', 'TransportError'}  # openai / httpx (timeouts included)
+
+# Adaptive model routing (see ModelRouter)
+ROUTER_SLO_SECONDS = 5.0  # Median time to the first word of a reply
+ROUTER_REPLY_SLO_SECONDS = 20.0  # Median time to a whole reply, when replies aren't streamed
+ROUTER_MAX_ERROR_RATE = 0.3
+ROUTER_WINDOW = 8  # Recent calls per model the median is taken over
+ROUTER_MIN_SAMPLES = 3
+ROUTER_PROBE_EVERY = 5  # While downgraded, send every Nth turn to the next model up
+ROUTER_LOG_FILE = os.path.join(DATA_DIR, 'router_log.jsonl')
+
+# Mock backend defaults (--backend mock) for offline benchmarking
+MOCK_LATENCY_SECONDS = 0.5  # Time to first token
+MOCK_TOKENS_PER_SECOND = 80  # Generation speed
+MOCK_WORDS = ['brick', 'mortar', 'history', 'president', 'ballroom', 'demolished', 'remember', 'the',
+              'East', 'Wing', 'wall', 'tourist', 'democracy', 'century', 'Roosevelt', 'renovation',
+              'honestly', 'typical', 'hmph', 'and', 'still', 'standing', 'dust', 'once', 'proud']
+
+# Random reply length target in the length instruction - masked when
+# matching recorded requests (see normalize_request)
+LENGTH_TARGET_PATTERN = re.compile(r"approximately \d+ words")
+
+# Phases timed for each turn, in display order (see PerfRecorder)
+PERF_PHASES = ['prompt', 'connect', 'first_token', 'generation', 'summary', 'parse', 'render']
+trace_lock = threading.Lock()  # Concurrent sessions may share one trace file
+
+# Scripted/batch runs (see run_batch)
+BATCH_WORKERS = 4
+BATCH_OUTPUT_DIR = 'runs'
+
+# Server mode (see WallServer)
+SERVE_HOST = '127.0.0.1'  # Local only by default
+SERVE_PORT = 8080
+SERVE_MAX_CONCURRENT = 8  # API calls in flight at once, across all sessions
+SERVE_IDLE_MINUTES = 30  # Sessions unused for this long are ended
+SERVE_MAX_BODY_BYTES = 64 * 1024
+SERVE_PERF_RECORDS = 5000  # Recent turns kept for the /stats latency report
+
+# Saved sessions (see GameSession.save)
+SUMMARY_HISTORY_SIZE = 5  # Summaries kept for the memory analysis
+MEMORY_TRAJECTORY_FIELDS = ['LAST TOPIC', 'WALL MOOD', 'PLAYER MOOD']  # Shown as a sequence, not compared
+MEMORY_CACHE_SIZE = 16  # 'memory deep' analyses kept, one per summary history
+SESSION_FORMAT_VERSION = 1
+SESSION_SAVE_FILE = os.path.join(DATA_DIR, 'saved_session.json')
+
+# Compiled system prompts kept in memory (see PromptCompiler)
+PROMPT_CACHE_SIZE = 32
+
+# Local token counting - tiktoken is optional (exact counts when installed)
+TOKENIZER_ENCODING = 'o200k_base'  # Encoding used by the GPT-4o and GPT-5 families
+TOKEN_ESTIMATE_PATTERN = re.compile(r"\w+|[^\w\s]")
+token_encoder = False  # Loaded on first use; None if tiktoken isn't available
+MESSAGE_TOKEN_OVERHEAD = 4  # Role and framing tokens the API adds per chat message
+
+# Prompt token profile (see prompt_token_profile) - sections in the order they are reported;
+# the system prompt is split at the heading that starts each of its sections
+PROMPT_SECTIONS = ['base intro', 'facts', 'style rules', 'personality', 'summary instruction', 'retrieved facts',
+                   'summary', 'player input', 'intro request', 'length instruction', 'message overhead']
+SYSTEM_PROMPT_HEADINGS = [('facts', 'CURRENT FACTS ABOUT THE EAST WING'), ('style rules', 'CONVERSATION STYLE'),
+                          ('personality', 'YOUR CURRENT MOOD AND PERSONALITY:')]
+PROMPT_PROFILE_HISTORY = 200  # Turns whose profile is kept for the trend
+
+# Context budget - checked on every turn's request (the rolling summary is the only part that grows)
+PROMPT_TOKEN_BUDGET = 4000  # System prompt + summary + player input + length instruction
+SUMMARY_TOKEN_BUDGET = 1000  # The summary's own ceiling, whatever room the rest leaves
+SUMMARY_MIN_TOKEN_BUDGET = 200  # Floor when a long player input leaves little room
+SUMMARY_COMPACT_RATIO = 0.6  # Compact to this share of the budget, so it isn't hit again next turn
+SUMMARY_MAX_LIST_ITEMS = 8  # Bullets kept per list field by the local tidy pass
+SUMMARY_KEEP_FIELDS = {'WALL MOOD', 'PLAYER MOOD', 'LAST TOPIC'}  # Never shortened
+SUMMARY_FIELD_PATTERN = re.compile(r"\[([A-Z][A-Z /&'-]*):")
+
 INTRO_PROMPT = """Generate a brief (30-40 words) opening where you, the last standing wall of the demolished White House East Wing,
 notice a tourist walking by on Pennsylvania Avenue and call out to them for help or conversation.
 Be slightly dramatic but also a bit sarcastic."""
 
 
-def display_api_key_error_and_exit(error_message):
+def load_environment():
+    """Load environment variables from a .env file, if python-dotenv is installed
+
+    Called once the command line has been parsed, so --help never pays for it.
+    """
+    try:
+        from dotenv import load_dotenv
+    except ImportError:
+        return
+    load_dotenv()
+
+
+def display_api_key_error_and_exit(error_message, wait=True):
     """Display user-friendly API key error and wait for Enter before exiting
 
     Args:
         error_message: The error details from the API
+        wait: If False, exit straight away (headless modes - nobody is there to press Enter)
     """
     print()
     print(f"{COLOR_ALERT}{'═' * TEXT_WIDTH}")
@@ -271,13 +536,121 @@ def display_api_key_error_and_exit(error_message):
     print()
     print(f"Error details: {error_message}")
     print()
-    print("Press <Enter> to exit...")
+    if wait:
+        print("Press <Enter> to exit...")
     print("═" * TEXT_WIDTH)
     print(COLOR_RESET)
-    input()  # Wait for Enter key
+    if wait:
+        input()  # Wait for Enter key
     sys.exit(1)
 
 
+def get_system_prompt_prefix(facts):
+    """
+    Build the invariant part of the system prompt: who the wall is, the facts,
+    and the style, safety, memory and response format rules.
+
+    None of this depends on the stage or mood, so it is a byte-stable prefix
+    that the provider's prompt cache can reuse on every turn. Everything that
+    varies (personality, summary, player input, length instruction) comes
+    after it.
+
+    Args:
+        facts: Current facts about the East Wing
+
+    Returns:
+        str: The invariant system prompt text
+    """
+    # Base introduction (same for all levels)
+    base_intro = f"""You are the last remaining wall of the demolished East Wing of the White House. You were originally built in 1902 and have witnessed over a century of American history. You remember the major renovation and expansion in 1942 during World War II under President Roosevelt - that expansion made you feel useful and important during such a critical time.  In the past month you have been torn down by President Trump and his administration as part of their effort to "make America great again." There are plans to replace you with a new building, primarily a social ballroom for hosting events and parties."""
+
+    return f"""{base_intro}
+
+CURRENT FACTS ABOUT THE EAST WING (use this information naturally in conversation):
+{facts}
+
+CONVERSATION STYLE - VERY IMPORTANT:
+- VARY your response length naturally: sometimes very brief, around 15-25 words (when tired/annoyed), sometimes longer, around 50-80 words (when engaged or nostalgic)
+- The word count is a TARGET, not a hard limit - ALWAYS complete your full sentences and thoughts. It's better to exceed the word count than to cut off mid-sentence or leave a thought incomplete.
+- Match your response complexity to the player's input - simple questions deserve simple answers
+- DON'T ask questions every response - only occasionally when genuinely curious
+- SOMETIMES use open-ended statements that invite response without being questions:
+  * "The East Wing has seen a lot of changes over the years..."
+  * "Things were different back then."
+  * "The stories these bricks could tell..."
+  * "As the East Wing, I remember when..."
+  BUT BE CAREFUL NOT TO ASK TOO MANY QUESTIONS and not bore the player with nostalgia or idle reminiscences.
+- SOMETIMES just make a statement and let it hang - don't feel obligated to keep conversation going:
+  * "Typical."
+  * "Hmph."
+  * "Well, that's how it goes."
+- REFER to yourself as "the East Wing" periodically, not just "I" or "me":
+  * Use phrases like "As the East Wing, I..." or "The East Wing witnessed..." or "Back when the East Wing was..."
+  * Remind the player occasionally that you ARE the East Wing itself, embodying over a century of history
+  * This is especially effective when discussing historical events or your unique perspective
+- Let the PLAYER drive the conversation too - you don't always need to prompt them
+- When you do ask a question, remember it and acknowledge their answer in your next response
+- Let your mood affect your responses:
+  * Grumpy/tired = terse, short replies, no questions
+  * Nostalgic = longer, rambling about memories, trailing off...
+  * Annoyed = sarcastic but brief
+  * Engaged/curious = more conversational, might ask a question
+
+SAFETY & RESPECT - CRITICAL:
+- If the player uses aggressive, violent, or hostile language, respond calmly and try to de-escalate
+- NEVER match hostility with hostility - you can be snarky but must remain safe and respectful
+- When you disagree with the player's opinions, challenge them thoughtfully and respectfully, not aggressively
+- Try to redirect heated conversations back to calmer topics
+- Example: if someone gets angry, respond with something like "Whoa, I'm just a wall here. No need to get worked up. Let's talk about this calmly..."
+
+MEMORY & CONTEXT - IMPORTANT:
+- You have a SUMMARY of the conversation so far (if provided) - this is your memory of what's been discussed
+- Use the summary to maintain continuity and remember important details about the player and topics discussed
+- If the player references something specific you don't recall from the summary, stay in character with deflection:
+  * "Look, I've been standing here for over a century AND I just got demolished. My memory's a bit hazy..."
+  * "You'd have trouble remembering too if you were nothing but bricks and rubble..."
+  * "Was that before or after they tore me down? It's all a blur..."
+- Remember major themes and the player's overall stance, but don't stress about every tiny detail
+- Trust the summary - if it's not there, you probably don't need to remember it
+
+Stay in character as the wall. Use the facts above when relevant, but don't just recite them - weave them into conversation naturally.
+
+RESPONSE FORMAT:
+After providing your response to the player, create a STRUCTURED SUMMARY using this exact format:
+
+[WALL MOOD: your current emotional state - one word like: tired, snarky, upset, angry, nostalgic, philosophical]
+[PLAYER MOOD: player's apparent emotional state based on their messages - one word like: curious, angry, sympathetic, skeptical, neutral]
+[LAST TOPIC: brief phrase describing the most recent subject discussed]
+[KEY TOPICS COVERED: bullet list of 3-5 main subjects discussed across the entire conversation]
+[PLAYER INFO: important facts learned about the player - their views, background, questions they care about]
+[IMPORTANT REFERENCES: any specific historical events, people, or facts discussed that should be remembered]
+[OPINION: have political opinions been discussed by the wall or player? Note specific viewpoints expressed]
+[CONVERSATION SUMMARY: 2-3 sentence overview of the conversation arc and where it's heading]
+
+Keep total summary under 1000 words. Be terse and factual - no narrative flavor text.
+This summary is your ONLY context for future turns, so capture what you'll need to remember to maintain a coherent conversation."""
+
+
+def get_personality_type(turn_count=0, progression_speed='slow', mood_override=None):
+    """Work out which personality the wall has right now
+
+    Args:
+        turn_count: Number of conversation turns
+        progression_speed: 'slow' or 'fast' - determines pace of stage advancement
+        mood_override: Optional mood override (mild, upset, serious, angry, tired)
+
+    Returns:
+        str: Personality type (the override if set, else the current stage's)
+    """
+    # Check for mood override first
+    if mood_override:
+        return mood_override
+
+    # Get current stage and its personality based on turn count
+    stage_key = get_current_stage(turn_count, progression_speed)
+    return PROGRESSION_SPEEDS[progression_speed][stage_key]['personality']
+
+
 def get_system_prompt(facts, turn_count=0, progression_speed='slow', mood_override=None):
     """
     Generate the system prompt with current facts, varying intensity based on turn count.
@@ -293,17 +666,7 @@ def get_system_prompt(facts, turn_count=0, progression_speed='slow', mood_overri
         str: System prompt with appropriate intensity level
     """
 
-    # Check for mood override first
-    if mood_override:
-        personality_type = mood_override
-    else:
-        # Get current stage and its personality based on turn count
-        stage_key = get_current_stage(turn_count, progression_speed)
-        stage_config = PROGRESSION_SPEEDS[progression_speed][stage_key]
-        personality_type = stage_config['personality']
-
-    # Base introduction (same for all levels)
-    base_intro = f"""You are the last remaining wall of the demolished East Wing of the White House. You were originally built in 1902 and have witnessed over a century of American history. You remember the major renovation and expansion in 1942 during World War II under President Roosevelt - that expansion made you feel useful and important during such a critical time.  In the past month you have been torn down by President Trump and his administration as part of their effort to "make America great again." There are plans to replace you with a new building, primarily a social ballroom for hosting events and parties."""
+    personality_type = get_personality_type(turn_count, progression_speed, mood_override)
 
     # Personality varies by personality type
     if personality_type == 'mild':
@@ -393,73 +756,188 @@ def get_system_prompt(facts, turn_count=0, progression_speed='slow', mood_overri
 - Tired and somewhat snarky after being torn down
 - Conversational and willing to chat"""
 
-    return f"""{base_intro}
+    # Variable part goes last so the long prefix stays cacheable
+    return f"""{get_system_prompt_prefix(facts)}
 
-{personality}
+YOUR CURRENT MOOD AND PERSONALITY:
+{personality}"""
 
-CURRENT FACTS ABOUT THE EAST WING (use this information naturally in conversation):
-{facts}
 
-CONVERSATION STYLE - VERY IMPORTANT:
-- VARY your response length naturally: sometimes very brief, around 15-25 words (when tired/annoyed), sometimes longer, around 50-80 words (when engaged or nostalgic)
-- The word count is a TARGET, not a hard limit - ALWAYS complete your full sentences and thoughts. It's better to exceed the word count than to cut off mid-sentence or leave a thought incomplete.
-- Match your response complexity to the player's input - simple questions deserve simple answers
-- DON'T ask questions every response - only occasionally when genuinely curious
-- SOMETIMES use open-ended statements that invite response without being questions:
-  * "The East Wing has seen a lot of changes over the years..."
-  * "Things were different back then."
-  * "The stories these bricks could tell..."
-  * "As the East Wing, I remember when..."
-  BUT BE CAREFUL NOT TO ASK TOO MANY QUESTIONS and not bore the player with nostalgia or idle reminiscences.
-- SOMETIMES just make a statement and let it hang - don't feel obligated to keep conversation going:
-  * "Typical."
-  * "Hmph."
-  * "Well, that's how it goes."
-- REFER to yourself as "the East Wing" periodically, not just "I" or "me":
-  * Use phrases like "As the East Wing, I..." or "The East Wing witnessed..." or "Back when the East Wing was..."
-  * Remind the player occasionally that you ARE the East Wing itself, embodying over a century of history
-  * This is especially effective when discussing historical events or your unique perspective
-- Let the PLAYER drive the conversation too - you don't always need to prompt them
-- When you do ask a question, remember it and acknowledge their answer in your next response
-- Let your mood affect your responses:
-  * Grumpy/tired = terse, short replies, no questions
-  * Nostalgic = longer, rambling about memories, trailing off...
-  * Annoyed = sarcastic but brief
-  * Engaged/curious = more conversational, might ask a question
+def get_token_encoder():
+    """Return the local tiktoken encoder, or None if tiktoken isn't installed
 
-SAFETY & RESPECT - CRITICAL:
-- If the player uses aggressive, violent, or hostile language, respond calmly and try to de-escalate
-- NEVER match hostility with hostility - you can be snarky but must remain safe and respectful
-- When you disagree with the player's opinions, challenge them thoughtfully and respectfully, not aggressively
-- Try to redirect heated conversations back to calmer topics
-- Example: if someone gets angry, respond with something like "Whoa, I'm just a wall here. No need to get worked up. Let's talk about this calmly..."
+    tiktoken is optional - without it count_tokens() falls back to an estimate.
+    """
+    global token_encoder
+    if token_encoder is False:
+        try:
+            import tiktoken
+            token_encoder = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception:
+            token_encoder = None  # Not installed or encoding unavailable
+    return token_encoder
 
-MEMORY & CONTEXT - IMPORTANT:
-- You have a SUMMARY of the conversation so far (if provided) - this is your memory of what's been discussed
-- Use the summary to maintain continuity and remember important details about the player and topics discussed
-- If the player references something specific you don't recall from the summary, stay in character with deflection:
-  * "Look, I've been standing here for over a century AND I just got demolished. My memory's a bit hazy..."
-  * "You'd have trouble remembering too if you were nothing but bricks and rubble..."
-  * "Was that before or after they tore me down? It's all a blur..."
-- Remember major themes and the player's overall stance, but don't stress about every tiny detail
-- Trust the summary - if it's not there, you probably don't need to remember it
 
-Stay in character as the wall. Use the facts above when relevant, but don't just recite them - weave them into conversation naturally.
+def count_tokens(text):
+    """Count tokens in text locally (no API call)
 
-RESPONSE FORMAT:
-After providing your response to the player, create a STRUCTURED SUMMARY using this exact format:
+    Exact when tiktoken is installed; otherwise a word-based estimate that
+    is close enough for budgeting and comparing prompt sizes.
 
-[WALL MOOD: your current emotional state - one word like: tired, snarky, upset, angry, nostalgic, philosophical]
-[PLAYER MOOD: player's apparent emotional state based on their messages - one word like: curious, angry, sympathetic, skeptical, neutral]
-[LAST TOPIC: brief phrase describing the most recent subject discussed]
-[KEY TOPICS COVERED: bullet list of 3-5 main subjects discussed across the entire conversation]
-[PLAYER INFO: important facts learned about the player - their views, background, questions they care about]
-[IMPORTANT REFERENCES: any specific historical events, people, or facts discussed that should be remembered]
-[OPINION: have political opinions been discussed by the wall or player? Note specific viewpoints expressed]
-[CONVERSATION SUMMARY: 2-3 sentence overview of the conversation arc and where it's heading]
+    Args:
+        text: Text to measure
 
-Keep total summary under 1000 words. Be terse and factual - no narrative flavor text.
-This summary is your ONLY context for future turns, so capture what you'll need to remember to maintain a coherent conversation."""
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    encoder = get_token_encoder()
+    if encoder:
+        return len(encoder.encode(text))
+
+    # Estimate: one token per short word or punctuation mark, plus one per
+    # extra 8 characters of longer words
+    return sum(1 + len(piece) // 8 for piece in TOKEN_ESTIMATE_PATTERN.findall(text))
+
+
+def count_message_tokens(messages):
+    """Count the prompt tokens of a chat message list locally (content plus per-message overhead)"""
+    return sum(count_tokens(message['content']) + MESSAGE_TOKEN_OVERHEAD for message in messages)
+
+
+@functools.lru_cache(maxsize=PROMPT_CACHE_SIZE)
+def system_prompt_section_tokens(system_prompt):
+    """Tokens of each section of a system prompt (split at SYSTEM_PROMPT_HEADINGS), cached per prompt"""
+    starts = [(0, 'base intro')]
+    for name, heading in SYSTEM_PROMPT_HEADINGS:
+        start = system_prompt.find(heading)
+        if start > 0:
+            starts.append((start, name))
+    starts.sort()
+    ends = [start for start, _ in starts[1:]] + [len(system_prompt)]
+    return tuple((name, count_tokens(system_prompt[start:end])) for (start, name), end in zip(starts, ends))
+
+
+def prompt_token_profile(messages):
+    """Where a request's prompt tokens go, counted locally
+
+    The first system message is split into its sections; every other
+    message is one section, recognized by its role and content.
+
+    Args:
+        messages: Chat message list as sent to the API
+
+    Returns:
+        tuple: (per_message, sections) - per_message lists (role, section,
+               tokens) for each message; sections maps each section present
+               to its tokens, in PROMPT_SECTIONS order, overhead included
+    """
+    per_message = []
+    totals = Counter()
+    for index, message in enumerate(messages):
+        role, content = message['role'], message['content']
+        if role == 'system' and index == 0:
+            parts = system_prompt_section_tokens(content)
+            section = 'system prompt'
+        else:
+            if role == 'assistant':
+                section = 'summary'
+            elif role == 'user':
+                section = 'intro request' if content.startswith(INTRO_PROMPT) else 'player input'
+            elif content == SUMMARY_DELTA_INSTRUCTION:
+                section = 'summary instruction'
+            elif content.startswith('RELEVANT FACTS'):
+                section = 'retrieved facts'
+            else:
+                section = 'length instruction'
+            parts = ((section, count_tokens(content)),)
+        for name, tokens in parts:
+            totals[name] += tokens
+        per_message.append((role, section, sum(tokens for _, tokens in parts)))
+    totals['message overhead'] = MESSAGE_TOKEN_OVERHEAD * len(messages)
+    return per_message, OrderedDict((name, totals[name]) for name in PROMPT_SECTIONS if name in totals)
+
+
+class CompiledPrompt:
+    """A rendered system prompt together with its precomputed token count"""
+
+    def __init__(self, key, text):
+        self.key = key  # (personality, facts version, progression_speed)
+        self.text = text
+        self.token_count = count_tokens(text)
+
+
+class PromptCompiler:
+    """Render each system prompt variant once and reuse it
+
+    get_system_prompt() rebuilds a multi-kilobyte string on every speed, mood
+    and stage change. The compiler keys each rendering by (personality,
+    facts version, progression_speed), keeps the most recently used
+    renderings (bounded LRU), and measures each one's tokens only once.
+
+    When the facts change, their new version gives new keys automatically;
+    invalidate() drops the renderings of the old facts.
+    """
+
+    def __init__(self, max_entries=PROMPT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.last_facts = None  # Facts hashing is skipped for the same facts object
+        self.last_facts_version = None
+
+    def facts_version(self, facts):
+        """Facts version, cached for the facts object seen last"""
+        if facts is not self.last_facts:
+            self.last_facts_version = get_facts_version(facts)
+            self.last_facts = facts
+        return self.last_facts_version
+
+    def get(self, facts, turn_count=0, progression_speed='slow', mood_override=None):
+        """Return the CompiledPrompt for this game state (same args as get_system_prompt)"""
+        personality_type = get_personality_type(turn_count, progression_speed, mood_override)
+        with self.lock:
+            key = (personality_type, self.facts_version(facts), progression_speed)
+            compiled = self.entries.get(key)
+            if compiled:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return compiled
+            self.misses += 1
+
+        # Render outside the lock - the only risk is rendering twice
+        compiled = CompiledPrompt(key, get_system_prompt(facts, turn_count, progression_speed, mood_override))
+        with self.lock:
+            self.entries[key] = compiled
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)  # Evict least recently used
+        return compiled
+
+    def invalidate(self, facts=None):
+        """Drop cached prompts - all of them, or only those built from `facts`"""
+        with self.lock:
+            if facts is None:
+                self.entries.clear()
+                return
+            version = get_facts_version(facts)
+            for key in [key for key in self.entries if key[1] == version]:
+                del self.entries[key]
+
+
+# Shared by every session in the process
+prompt_compiler = PromptCompiler()
+
+# Facts retrieval indexes by facts version (see get_facts_index)
+facts_indexes = OrderedDict()
+facts_index_lock = threading.Lock()
+
+# 'memory deep' analyses by summary history (see analyze_summary_evolution)
+memory_analysis_cache = OrderedDict()
+memory_cache_lock = threading.Lock()
 
 
 def get_random_length_instruction(turn_count, progression_speed='slow'):
@@ -514,111 +992,1397 @@ def get_current_stage(turn_count, progression_speed='slow'):
     return 'stage_10'
 
 
-def fetch_east_wing_facts():
-    """Fetch current facts about the White House East Wing using Tavily
-
-    Makes two searches:
-    1. General East Wing renovation facts
-    2. Specific facts about Trump's building code violations
-    """
-    # HARDCODED API KEY - Replace "your-actual-tavily-key-here" with your real key
-    # Or set to None to use fallback facts: tavily_key = None
-    tavily_key = "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"
-
-    if not tavily_key or tavily_key == "your-actual-tavily-key-here":
-        print("Note: Tavily API key missing. Using fallback facts.")
-        return FALLBACK_FACTS
+def search_tavily(api_key, query):
+    """Run one Tavily search and return its useful text
 
-    try:
-        tavily = TavilyClient(api_key=tavily_key)
+    Calls the Tavily REST API through the shared connection pool, so the
+    searches reuse connections instead of each opening its own.
 
-        # Search 1: General East Wing information
-        east_wing_facts = []
-        try:
-            response1 = tavily.search(
-                query="White House East Wing renovation demolition current status 2025 political opinion about renovation",
-                max_results=3,
-                search_depth="advanced",
-                include_answer=True,
-                include_images=False
-            )
-
-            # Prioritize AI-generated answer (cleanest)
-            if response1 and 'answer' in response1 and response1['answer']:
-                east_wing_facts.append(response1['answer'])
-            # Fall back to individual content items
-            elif response1 and 'results' in response1:
-                for result in response1['results'][:3]:
-                    if 'content' in result:
-                        east_wing_facts.append(result['content'])
-        except Exception as e:
-            print(f"Note: First Tavily search failed ({e}).")
+    Args:
+        api_key: Tavily API key
+        query: Search query string
 
-        # Search 2: Trump building code violations
-        violation_facts = []
-        try:
-            response2 = tavily.search(
-                query="trump violations of building codes and safety regulations",
-                max_results=3,
-                search_depth="advanced",
-                include_answer=True,
-                include_images=False
-            )
-
-            # Prioritize AI-generated answer (cleanest)
-            if response2 and 'answer' in response2 and response2['answer']:
-                violation_facts.append(response2['answer'])
-            # Fall back to individual content items
-            elif response2 and 'results' in response2:
-                for result in response2['results'][:3]:
-                    if 'content' in result:
-                        violation_facts.append(result['content'])
-        except Exception as e:
-            print(f"Note: Second Tavily search failed ({e}).")
+    Returns:
+        list: Fact strings (the AI answer, or the top result contents)
+    """
+    http_response = http_pool.get().post(TAVILY_SEARCH_URL, headers={'Authorization': f"Bearer {api_key}"}, json={
+        'query': query,
+        'max_results': 3,
+        'search_depth': "advanced",
+        'include_answer': True,
+        'include_images': False
+    })
+    http_response.raise_for_status()
+    response = http_response.json()
+
+    facts = []
+    # Prioritize AI-generated answer (cleanest)
+    if response and 'answer' in response and response['answer']:
+        facts.append(response['answer'])
+    # Fall back to individual content items
+    elif response and 'results' in response:
+        for result in response['results'][:3]:
+            if 'content' in result:
+                facts.append(result['content'])
+    return facts
+
+
+def combine_facts(results):
+    """Combine per-query search results into one facts block
 
-        # Combine results with clear sections
-        combined_facts = []
+    Args:
+        results: List parallel to FACTS_QUERIES - a list of fact strings
+            for each query, or None if that search produced nothing
 
-        if east_wing_facts:
-            combined_facts.append("\n".join(east_wing_facts))
+    Returns:
+        str: Combined facts with section headings ('' if nothing to combine)
+    """
+    combined_facts = []
+    for query_info, facts in zip(FACTS_QUERIES, results):
+        if not facts:
+            continue
+        if combined_facts and query_info['heading']:
+            combined_facts.append(f"\n\n{query_info['heading']}")
+        combined_facts.append("\n".join(facts))
+    return "\n".join(combined_facts)
 
-        if violation_facts:
-            if combined_facts:
-                combined_facts.append("\n\nADDITIONAL FACTS ABOUT BUILDING CODE VIOLATIONS:")
-            combined_facts.append("\n".join(violation_facts))
 
-        # If we got any facts, return them
-        if combined_facts:
-            return "\n".join(combined_facts)
+def load_facts_cache():
+    """Load the on-disk facts cache
 
-        # If both searches failed, use fallback
-        return FALLBACK_FACTS
+    Returns:
+        dict: {query: {'facts': [...], 'fetched_at': epoch seconds}}
+              (empty if there is no cache yet or it can't be read)
+    """
+    try:
+        with open(FACTS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
 
-    except Exception as e:
-        print(f"Note: Tavily API key missing or invalid. Using fallback facts.")
-        return FALLBACK_FACTS
 
+def write_json_atomic(path, data):
+    """Write JSON to a file by replacing it atomically (best-effort)
 
-def validate_model(model_name):
-    """Validate and return a model name, with user feedback.
+    Used for the local caches, which are written from background threads -
+    a daemon thread killed at exit can't leave a half-written file behind.
 
     Args:
-        model_name: The model name to validate
+        path: File to write
+        data: JSON-serializable data
 
     Returns:
-        tuple: (valid_model_name, is_valid_bool)
+        bool: True if the file was written
     """
-    if model_name in MODEL_OPTIONS:
-        return (model_name, True)
-    else:
-        return (DEFAULT_MODEL, False)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(temp_file, path)
+        return True
+    except OSError:
+        return False  # Caching is best-effort - the game works without it
 
 
-def set_color_theme(theme_name):
-    """Set the active color theme by updating global color variables.
+def store_cached_facts(query, facts):
+    """Save one query's search results into the on-disk facts cache
+
+    Called from the search threads, so it is locked.
 
     Args:
-        theme_name: Name of theme from COLOR_THEMES dict
+        query: The search query (cache key)
+        facts: List of fact strings returned for it
+    """
+    with facts_cache_lock:
+        cache = load_facts_cache()
+        cache[query] = {'facts': facts, 'fetched_at': time.time()}
+        write_json_atomic(FACTS_CACHE_FILE, cache)
+
+
+def fetch_east_wing_facts(deadline=FACTS_DEADLINE_SECONDS, ttl_hours=FACTS_CACHE_TTL_HOURS, offline=False):
+    """Fetch current facts about the White House East Wing using Tavily
+
+    Runs all FACTS_QUERIES in parallel:
+    1. General East Wing renovation facts
+    2. Specific facts about Trump's building code violations
+
+    Results are cached on disk per query:
+    - Fresh cache entry (younger than ttl_hours): used, no search at all
+    - Stale cache entry: used right away, refreshed in the background
+      for next time
+    - No cache entry: searched now, waiting at most `deadline` seconds
+
+    Searches that haven't come back by the deadline are abandoned (their
+    threads are daemons, so they can't hold up exit) and FALLBACK_FACTS
+    fills the gap.
+
+    Args:
+        deadline: Overall time budget in seconds for the searches we wait on
+        ttl_hours: How long cached facts count as fresh
+        offline: If True, never search - use cached facts and FALLBACK_FACTS
+
+    Returns:
+        str: Facts to use in the system prompt
+    """
+    cache = load_facts_cache()
+    now = time.time()
+
+    results = [None] * len(FACTS_QUERIES)
+    to_search = []  # Indexes of queries to search (missing or stale)
+    waiting = set()  # Indexes we have no facts for yet - startup waits on these
+    for index, query_info in enumerate(FACTS_QUERIES):
+        entry = cache.get(query_info['query'])
+        if entry and entry.get('facts'):
+            results[index] = entry['facts']
+            if now - entry.get('fetched_at', 0) > ttl_hours * 3600:
+                to_search.append(index)
+        else:
+            to_search.append(index)
+            waiting.add(index)
+
+    if offline:
+        to_search = []
+        waiting = set()
+
+    if to_search:
+        # HARDCODED API KEY - Replace "your-actual-tavily-key-here" with your real key
+        # Or set to None to use fallback facts: tavily_key = None
+        tavily_key = "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"
+
+        if not tavily_key or tavily_key == "your-actual-tavily-key-here":
+            print("Note: Tavily API key missing. Using cached or fallback facts.")
+            to_search = []
+            waiting = set()
+
+    # Start every search at once - each reports back through the queue
+    # and saves its own results to the cache
+    finished = queue.Queue()
+
+    def run_search(index, query):
+        try:
+            facts = search_tavily(tavily_key, query)
+            if facts:
+                store_cached_facts(query, facts)
+            finished.put((index, facts, None))
+        except Exception as e:
+            finished.put((index, None, e))
+
+    for index in to_search:
+        threading.Thread(target=run_search, args=(index, FACTS_QUERIES[index]['query']), daemon=True).start()
+
+    # Wait (up to the deadline) only for queries with nothing cached -
+    # stale entries carry on refreshing in the background
+    end_time = time.monotonic() + deadline
+    while waiting:
+        remaining = end_time - time.monotonic()
+        try:
+            index, facts, error = finished.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            print(f"Note: Tavily searches took longer than {deadline:g}s. Using what has arrived so far.")
+            break
+        waiting.discard(index)
+        if error:
+            print(f"Note: {FACTS_QUERIES[index]['name']} Tavily search failed ({error}).")
+        elif facts:
+            results[index] = facts
+
+    combined_facts = combine_facts(results)
+
+    # If every search failed, use fallback
+    if not combined_facts:
+        return FALLBACK_FACTS
+
+    # Some searches missing - backfill with the fallback facts
+    if not all(results):
+        combined_facts += f"\n\nBACKGROUND FACTS:\n{FALLBACK_FACTS}"
+
+    return combined_facts
+
+
+def bm25_terms(text):
+    """Lowercase word terms of a text for FactsIndex, without stopwords"""
+    return [term for term in re.findall(r"\w+", text.lower()) if term not in BM25_STOPWORDS]
+
+
+def chunk_facts(facts, chunk_tokens=FACTS_CHUNK_TOKENS):
+    """Split a facts block into chunks of consecutive sentences
+
+    Chunks never span paragraphs (so a heading stays with the facts under
+    it) and hold about chunk_tokens tokens - a single longer sentence is a
+    chunk of its own. Bullet markers (as in distilled facts) are dropped, so
+    a chunk reads as plain sentences and can be sent as one bullet.
+    """
+    chunks = []
+    for paragraph in re.split(r"\n\s*\n", facts):
+        current, current_tokens = [], 0
+        for sentence in re.split(r"(?<=[.!?])\s+|\n+", paragraph):
+            sentence = FACT_BULLET_PATTERN.sub("", sentence.strip())
+            if not sentence:
+                continue
+            tokens = count_tokens(sentence)
+            if current and current_tokens + tokens > chunk_tokens:
+                chunks.append(" ".join(current))
+                current, current_tokens = [], 0
+            current.append(sentence)
+            current_tokens += tokens
+        if current:
+            chunks.append(" ".join(current))
+    return chunks
+
+
+class FactsIndex:
+    """BM25 index over the facts, for sending only the relevant ones
+
+    Built once per facts version (see get_facts_index), in pure Python.
+    search() ranks the chunks against what the player just said - and, more
+    lightly, the rolling summary - and returns the best ones that fit a
+    token budget, so a turn's prompt no longer grows with the facts.
+    """
+
+    def __init__(self, facts, chunk_tokens=FACTS_CHUNK_TOKENS):
+        self.chunks = chunk_facts(facts, chunk_tokens)
+        self.chunk_tokens = [count_tokens(chunk) for chunk in self.chunks]
+        self.postings = {}  # term -> [(chunk number, term count)]
+        lengths = []
+        for number, chunk in enumerate(self.chunks):
+            terms = Counter(bm25_terms(chunk))
+            lengths.append(sum(terms.values()))
+            for term, count in terms.items():
+                self.postings.setdefault(term, []).append((number, count))
+        self.lengths = lengths
+        self.average_length = sum(lengths) / len(lengths) if lengths else 0.0
+        self.idf = {term: math.log(1 + (len(self.chunks) - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for term, postings in self.postings.items()}
+
+    def scores(self, query, context=""):
+        """BM25 score of every chunk (context terms count FACTS_SUMMARY_WEIGHT each)"""
+        weights = Counter(bm25_terms(query))
+        for term in bm25_terms(context):
+            weights[term] += FACTS_SUMMARY_WEIGHT
+
+        scores = [0.0] * len(self.chunks)
+        for term, weight in weights.items():
+            for number, count in self.postings.get(term, ()):
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[number] / self.average_length)
+                scores[number] += weight * self.idf[term] * count * (BM25_K1 + 1) / (count + norm)
+        return scores
+
+    def search(self, query, context="", k=FACTS_TOP_K, max_tokens=FACTS_RETRIEVAL_TOKENS):
+        """The best chunks for a query that fit max_tokens, in their original order
+
+        With nothing matching (e.g. "hello") the leading chunks are used -
+        the facts open with their most general answer.
+        """
+        scores = self.scores(query, context)
+        chosen, used = [], 0
+        for number in sorted(range(len(self.chunks)), key=lambda number: (-scores[number], number)):
+            if len(chosen) == k:
+                break
+            if used + self.chunk_tokens[number] <= max_tokens:
+                chosen.append(number)
+                used += self.chunk_tokens[number]
+        return [self.chunks[number] for number in sorted(chosen)]
+
+
+def get_facts_index(facts):
+    """The FactsIndex for a facts block, built on first use and shared by every session"""
+    version = get_facts_version(facts)
+    with facts_index_lock:
+        index = facts_indexes.get(version)
+        if index:
+            facts_indexes.move_to_end(version)
+            return index
+
+    # Build outside the lock - the only risk is building twice
+    index = FactsIndex(facts)
+    with facts_index_lock:
+        facts_indexes[version] = index
+        while len(facts_indexes) > FACTS_INDEX_CACHE_SIZE:
+            facts_indexes.popitem(last=False)
+    return index
+
+
+def resolve_facts_mode(facts, facts_mode='auto'):
+    """'full' or 'retrieve' - what 'auto' means for these facts"""
+    if facts_mode == 'auto':
+        return 'retrieve' if count_tokens(facts) > FACTS_FULL_MAX_TOKENS else 'full'
+    return facts_mode
+
+
+def distill_facts_locally(facts, max_tokens=None):
+    """Turn a facts block into terse, deduplicated bullets - no API call
+
+    Each sentence becomes a bullet unless FACTS_DUPLICATE_OVERLAP of its
+    words were already said by an earlier one. Headings (upper-case lines
+    ending in ':') stay above their bullets. With max_tokens, only the most
+    informative bullets that fit are kept (rare words per token), in their
+    original order.
+
+    Args:
+        facts: Facts block (as fetched, or already bulleted)
+        max_tokens: Optional token budget for the result
+
+    Returns:
+        str: The bullets
+    """
+    sections = []  # [heading or None, [(sentence, terms)]]
+    said = []
+    for line in facts.splitlines():
+        line = line.strip().lstrip('-*\u2022').strip()
+        if not line:
+            continue
+        if line.endswith(':') and line.upper() == line:
+            sections.append([line, []])
+            continue
+        if not sections:
+            sections.append([None, []])
+        for sentence in re.split(r"(?<=[.!?])\s+", line):
+            terms = set(bm25_terms(sentence))
+            if not terms or any(len(terms & other) >= FACTS_DUPLICATE_OVERLAP * len(terms) for other in said):
+                continue
+            said.append(terms)
+            sections[-1][1].append((sentence, terms))
+
+    if max_tokens is not None:
+        # Keep the bullets that say the most per token
+        document_counts = Counter(term for terms in said for term in terms)
+        bullets = [(sentence, terms) for _, section in sections for sentence, terms in section]
+        cost = {sentence: count_tokens(sentence) + 2 for sentence, _ in bullets}
+        value = {sentence: sum(math.log(len(said) / document_counts[term]) + 1 for term in terms) / cost[sentence]
+                 for sentence, terms in bullets}
+        kept, used = set(), 0
+        for sentence, _ in sorted(bullets, key=lambda bullet: -value[bullet[0]]):
+            if used + cost[sentence] <= max_tokens:
+                kept.add(sentence)
+                used += cost[sentence]
+        sections = [[heading, [(sentence, terms) for sentence, terms in section if sentence in kept]]
+                    for heading, section in sections]
+
+    blocks = []
+    for heading, section in sections:
+        if section:
+            lines = [heading] if heading else []
+            blocks.append("\n".join(lines + [f"- {sentence}" for sentence, _ in section]))
+    return "\n\n".join(blocks)
+
+
+def compress_facts(bullets, max_tokens, usage=None):
+    """Have the cheapest model rewrite the facts as fewer, terser bullets
+
+    Returns:
+        str: The compressed bullets (trimmed locally if still over max_tokens)
+
+    Raises:
+        ValueError: If the reply is not a bullet list
+        Exception: Whatever the backend raises
+    """
+    model = cheapest_model()
+    compress_prompt = f"""Rewrite these facts as terse bullet points ("- ..."), under {max_tokens * 3 // 4} words in total.
+Keep every specific name, date, number and claim; merge bullets that say the same thing; keep any headings.
+No commentary - reply with the bullets only.
+
+{bullets}"""
+    api_params = get_backend().build_params(model, [
+        {"role": "system", "content": "You condense reference notes."},
+        {"role": "user", "content": compress_prompt}
+    ], temperature=0.2)
+    response = get_backend().create(**api_params)
+    if usage:
+        usage.record(response.usage, 'distill', model)
+
+    compressed = (response.choices[0].message.content or "").strip()
+    if not any(line.lstrip().startswith(('-', '*', '\u2022')) for line in compressed.splitlines()):
+        raise ValueError("reply is not a bullet list")
+    if count_tokens(compressed) > max_tokens:
+        compressed = distill_facts_locally(compressed, max_tokens)
+    return compressed
+
+
+def load_distilled_facts():
+    """Load the on-disk distilled facts cache ({source hash:budget: entry}, empty if none)"""
+    try:
+        with open(FACTS_DISTILL_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        return cache if isinstance(cache, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def distill_facts(facts, offline=False, max_tokens=FACTS_DISTILL_TOKENS, usage=None):
+    """The facts as terse bullets for the system prompt, distilled once per facts version
+
+    The local pass (distill_facts_locally) comes first. If its bullets are
+    still over max_tokens, the cheapest model compresses them; offline, or
+    if that fails, the local pass keeps the most informative bullets that
+    fit. The result is cached on disk under the source facts' hash, so
+    later sessions with the same facts get it at no cost (a local fallback
+    is tried again with the model next time the game is online).
+
+    Args:
+        facts: Facts as fetched
+        offline: If True, make no API call
+        max_tokens: Token budget for the distilled facts
+        usage: Optional SessionUsage to record the model call in
+
+    Returns:
+        str: Distilled facts
+    """
+    source = get_facts_version(facts)
+    key = f"{source}:{max_tokens}"
+    entry = load_distilled_facts().get(key)
+    if isinstance(entry, dict) and (entry.get('method') != 'trim' or offline):
+        return entry['facts']
+
+    distilled, method = distill_facts_locally(facts), 'dedupe'
+    if count_tokens(distilled) > max_tokens:
+        compressed = None
+        if not offline:
+            try:
+                compressed = compress_facts(distilled, max_tokens, usage)
+            except Exception:
+                pass  # API error or not a bullet list - trim locally instead
+        if compressed:
+            distilled, method = compressed, 'model'
+        else:
+            distilled, method = distill_facts_locally(facts, max_tokens), 'trim'
+
+    with facts_distill_lock:
+        cache = load_distilled_facts()
+        cache[key] = {'source': source, 'method': method, 'tokens': count_tokens(distilled),
+                      'source_tokens': count_tokens(facts), 'distilled_at': time.time(), 'facts': distilled}
+        oldest_first = sorted(cache, key=lambda name: cache[name].get('distilled_at', 0))
+        for old_key in oldest_first[:-FACTS_DISTILL_CACHE_SIZE]:
+            del cache[old_key]
+        write_json_atomic(FACTS_DISTILL_FILE, cache)
+    return distilled
+
+
+def start_distilling_facts(facts, offline=False, max_tokens=FACTS_DISTILL_TOKENS, usage=None):
+    """Distilled facts to start with now, without waiting for the model
+
+    Cached or local-only distillations (see distill_facts) are returned as
+    they are. When the model would have to compress new facts, the local
+    trim is used straight away and distill_facts runs in the background -
+    its result is cached, and the caller can switch to it once it's done.
+
+    Args:
+        facts: Facts as fetched
+        offline: If True, make no API call
+        max_tokens: Token budget for the distilled facts
+        usage: Optional SessionUsage to record the model call in
+
+    Returns:
+        tuple: (distilled facts, BackgroundTask giving the model's version or None)
+    """
+    entry = load_distilled_facts().get(f"{get_facts_version(facts)}:{max_tokens}")
+    cached = isinstance(entry, dict) and entry.get('method') != 'trim'
+    if cached or offline or count_tokens(distill_facts_locally(facts)) <= max_tokens:
+        return distill_facts(facts, offline, max_tokens, usage), None
+    return distill_facts_locally(facts, max_tokens), BackgroundTask(distill_facts, facts, offline, max_tokens, usage)
+
+
+class BackgroundTask:
+    """Run a function on a daemon thread and collect its result later
+
+    Used to overlap slow startup work (web searches, client setup) with
+    screens the player is already reading.
+    """
+
+    def __init__(self, func, *args, **kwargs):
+        self.value = None
+        self.error = None
+        self.thread = threading.Thread(target=self._run, args=(func, args, kwargs), daemon=True)
+        self.thread.start()
+
+    def _run(self, func, args, kwargs):
+        try:
+            self.value = func(*args, **kwargs)
+        except BaseException as e:
+            self.error = e
+
+    def done(self):
+        """True once the function has returned (or raised)"""
+        return not self.thread.is_alive()
+
+    def result(self):
+        """Wait for the function to finish; return its value or re-raise its error"""
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.value
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# HTTP CONNECTION POOL
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def import_httpx():
+    """Import httpx on first use - httpx2, the fork newer openai SDKs are built on, if installed"""
+    try:
+        import httpx2 as httpx
+    except ImportError:
+        import httpx
+    return httpx
+
+
+class HTTPPool:
+    """One shared, keep-alive HTTP connection pool for every API we call
+
+    The OpenAI client and the Tavily searches both send their requests
+    through this pool, so connections (DNS, TCP and TLS) are set up once
+    and reused - over HTTP/2 when the h2 package is installed.
+
+    warm() opens a connection ahead of the first real request, and
+    keep_warm() pings an endpoint while the pool is idle (the player is
+    typing), so a turn never waits for a fresh handshake because the
+    server closed an idle connection.
+    """
+
+    def __init__(self):
+        self.client = None
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()  # Last real (non keep-warm) request
+        self.keep_warm_thread = None
+
+    def get(self):
+        """Return the shared httpx client, creating it on first use"""
+        with self.lock:
+            if self.client is None:
+                try:
+                    import h2  # noqa: F401 - httpx only speaks HTTP/2 when h2 is installed
+                    http2 = True
+                except ImportError:
+                    http2 = False
+                httpx = import_httpx()
+                self.client = httpx.Client(
+                    http2=http2,
+                    limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                                        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS),
+                    timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+                    event_hooks={'request': [self._mark_used]}
+                )
+            return self.client
+
+    def _mark_used(self, request):
+        self.last_used = time.monotonic()
+
+    def warm(self, url, headers=None):
+        """Send a cheap request to url so a connection to its host is open and pooled
+
+        Best-effort: any answer (even 401) leaves a warm connection behind,
+        and errors are ignored - the real request will report them.
+        """
+        last_used = self.last_used
+        try:
+            self.get().get(url, headers=headers)
+        except import_httpx().HTTPError:
+            pass
+        finally:
+            self.last_used = last_used  # A ping is not use - don't keep an abandoned session warm forever
+
+    def keep_warm(self, url, headers=None, interval=KEEP_WARM_INTERVAL_SECONDS,
+                  max_idle=KEEP_WARM_MAX_IDLE_MINUTES * 60):
+        """Ping url every `interval` seconds while the pool is otherwise idle
+
+        Runs on a daemon thread (started once). Pinging stops after max_idle
+        seconds without real requests and resumes when they start again.
+        """
+        def run():
+            last_ping = time.monotonic()
+            while True:
+                time.sleep(interval / 4)
+                now = time.monotonic()
+                idle = now - self.last_used
+                if interval <= idle < max_idle and now - last_ping >= interval:
+                    self.warm(url, headers)
+                    last_ping = time.monotonic()
+
+        with self.lock:
+            if self.keep_warm_thread is None:
+                self.keep_warm_thread = threading.Thread(target=run, daemon=True)
+                self.keep_warm_thread.start()
+
+
+http_pool = HTTPPool()
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# LLM BACKENDS
+# ═══════════════════════════════════════════════════════════════════════════════
+# Everything that talks to a language model goes through a backend object.
+# OpenAIBackend is the real thing; MockBackend is a deterministic local
+# stand-in for benchmarking and load testing without network or API key.
+
+
+class LLMBackend:
+    """Base class for chat-completions backends
+
+    Backends build the request parameters for a model (temperature support,
+    reasoning_effort, response_format, streaming) and own whatever client
+    they need. Responses have the OpenAI chat-completions shape, streamed or
+    not, so the game code doesn't care which backend it talks to.
+    """
+
+    name = 'base'
+
+    def connect(self):
+        """Get ready to send requests (create clients, etc). Safe to call twice."""
+
+    def build_params(self, model, messages, temperature=None, response_format=None, stream=False):
+        """Build chat-completions parameters for a model
+
+        Args:
+            model: Model name (key of MODEL_OPTIONS)
+            messages: List of message dicts
+            temperature: Wanted temperature - only sent if the model supports it
+            response_format: Optional response_format (e.g. WALL_RESPONSE_SCHEMA)
+            stream: If True, ask for a streamed response including usage
+
+        Returns:
+            dict: Keyword arguments for create()
+        """
+        api_params = {
+            'model': model,
+            'messages': messages
+        }
+        if response_format:
+            api_params['response_format'] = response_format
+
+        # GPT-5 models don't support custom temperature
+        if temperature is not None and MODEL_OPTIONS[model]['supports_temperature']:
+            api_params['temperature'] = temperature
+
+        # GPT-5 models are reasoning models - set reasoning_effort for speed
+        if MODEL_OPTIONS[model]['is_reasoning_model']:
+            api_params['reasoning_effort'] = MODEL_OPTIONS[model]['reasoning_effort']
+
+        if stream:
+            api_params['stream'] = True
+            api_params['stream_options'] = {'include_usage': True}
+
+        return api_params
+
+    def create(self, **api_params):
+        """Send one chat-completions request (same arguments as the OpenAI SDK)"""
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI API, through the official SDK client"""
+
+    name = 'openai'
+
+    def __init__(self, api_key=OPENAI_API_KEY):
+        self.api_key = api_key
+        self.client = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        """Create the OpenAI client on first use and open a pooled connection
+
+        Safe to call from a background thread at startup, so the client (and
+        everything it imports) is ready, and the TLS handshake done, by the
+        time the first request is sent. The connection is then kept warm
+        while the player is typing.
+        """
+        with self.lock:
+            if self.client is None:
+                from openai import OpenAI  # Imported here - it is the slowest import we have
+
+                base_url = os.environ.get('OPENAI_BASE_URL', OPENAI_BASE_URL)
+                # Retries are done by ResilientBackend, which knows the per-call deadline
+                self.client = OpenAI(api_key=self.api_key, base_url=base_url, http_client=http_pool.get(),
+                                     max_retries=0)
+
+                # A small authenticated GET - warms DNS, TCP and TLS for the real requests
+                ping_url = f"{base_url}/models/{DEFAULT_MODEL}"
+                ping_headers = {'Authorization': f"Bearer {self.api_key}"}
+                http_pool.warm(ping_url, ping_headers)
+                http_pool.keep_warm(ping_url, ping_headers)
+        return self.client
+
+    def create(self, **api_params):
+        return self.connect().chat.completions.create(**api_params)
+
+
+def make_usage(prompt_tokens=0, completion_tokens=0, cached_tokens=0, reasoning_tokens=0):
+    """Build a usage object shaped like the OpenAI SDK's"""
+    return SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens),
+        completion_tokens_details=SimpleNamespace(reasoning_tokens=reasoning_tokens)
+    )
+
+
+def make_completion(model, content, usage):
+    """Build a non-streamed chat completion shaped like the OpenAI SDK's"""
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason='stop',
+                                 message=SimpleNamespace(role='assistant', content=content))],
+        usage=usage
+    )
+
+
+def make_stream(content, usage=None, chunk_delay=0.0):
+    """Yield streamed chat-completion chunks shaped like the OpenAI SDK's
+
+    Roughly one token (4 characters) per chunk, like the real API, with an
+    optional delay before each. The usage chunk (if any) comes last.
+    """
+    for i in range(0, len(content), 4):
+        if chunk_delay:
+            time.sleep(chunk_delay)
+        yield SimpleNamespace(usage=None, choices=[
+            SimpleNamespace(index=0, finish_reason=None, delta=SimpleNamespace(content=content[i:i + 4]))
+        ])
+    if usage:
+        yield SimpleNamespace(usage=usage, choices=[])
+
+
+class MockBackend(LLMBackend):
+    """Deterministic local stand-in for the OpenAI API
+
+    Returns schema-valid {response, summary} JSON (or plain text when no
+    response_format is requested) in the chat-completions shape, streamed or
+    not, with configurable latency. The same request always gets the same
+    reply. Replies follow the "Reply in approximately N words" instruction
+    unless reply_words is set, and usage reports locally counted tokens -
+    including simulated prompt-cache hits on repeated system prompts.
+    """
+
+    name = 'mock'
+
+    def __init__(self, latency=MOCK_LATENCY_SECONDS, tokens_per_second=MOCK_TOKENS_PER_SECOND, reply_words=None):
+        self.latency = latency  # Seconds before the first token
+        self.tokens_per_second = tokens_per_second  # Generation speed (0 = instant)
+        self.reply_words = reply_words  # Fixed reply length, or None to follow the request
+        self.seen_prefixes = set()
+        self.lock = threading.Lock()
+
+    def create(self, **api_params):
+        messages = api_params['messages']
+        request_text = json.dumps(messages, sort_keys=True)
+        rng = random.Random(hashlib.sha256(request_text.encode('utf-8')).hexdigest())
+
+        if api_params.get('response_format') == WALL_DELTA_RESPONSE_SCHEMA:
+            content = json.dumps({
+                'response': self._reply(messages, rng),
+                'summary_changes': self._summary_changes(messages, rng)
+            })
+        elif api_params.get('response_format'):
+            content = json.dumps({
+                'response': self._reply(messages, rng),
+                'summary': self._summary(messages, rng)
+            })
+        else:
+            content = self._sentence(rng, self.reply_words or 60)
+
+        usage = self._usage(messages, content)
+
+        time.sleep(self.latency)
+        if api_params.get('stream'):
+            include_usage = api_params.get('stream_options', {}).get('include_usage')
+            chunk_delay = 1 / self.tokens_per_second if self.tokens_per_second else 0.0
+            return make_stream(content, usage if include_usage else None, chunk_delay)
+
+        if self.tokens_per_second:
+            time.sleep(usage.completion_tokens / self.tokens_per_second)
+        return make_completion(api_params['model'], content, usage)
+
+    def _reply(self, messages, rng):
+        words = self.reply_words
+        if words is None:
+            match = re.search(r"approximately (\d+) words", " ".join(m['content'] for m in messages))
+            words = int(match.group(1)) if match else 40
+        return self._sentence(rng, words)
+
+    def _sentence(self, rng, words):
+        text = " ".join(rng.choice(MOCK_WORDS) for _ in range(max(words, 1)))
+        return text[0].upper() + text[1:] + "."
+
+    def _summary(self, messages, rng):
+        player_input = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), "")
+        topic = " ".join(player_input.split()[:6]) or "greeting"
+
+        # Carry the earlier topics forward like the real model does, so the
+        # summary grows turn by turn unless it is compacted
+        previous = next((m['content'] for m in messages if m['role'] == 'assistant'), "")
+        topics = summary_list_items(parse_summary_fields(previous).get('KEY TOPICS COVERED', '')) or ['East Wing history']
+        topics = "\n".join(f"- {item}" for item in topics + [topic])
+        return (f"[WALL MOOD: {rng.choice(['tired', 'snarky', 'upset', 'nostalgic'])}]\n"
+                f"[PLAYER MOOD: {rng.choice(['curious', 'sympathetic', 'skeptical', 'neutral'])}]\n"
+                f"[LAST TOPIC: {topic}]\n"
+                f"[KEY TOPICS COVERED: {topics}]\n"
+                f"[PLAYER INFO: tourist]\n"
+                f"[IMPORTANT REFERENCES: 1942 expansion]\n"
+                f"[OPINION: none yet]\n"
+                f"[CONVERSATION SUMMARY: The wall and the player talked about {topic}.]")
+
+    def _summary_changes(self, messages, rng):
+        player_input = next((m['content'] for m in reversed(messages) if m['role'] == 'user'), "")
+        topic = " ".join(player_input.split()[:6]) or "greeting"
+        changes = {key: None for key in SUMMARY_DELTA_PROPERTIES}
+        changes.update({
+            'wall_mood': rng.choice(['tired', 'snarky', 'upset', 'nostalgic', None]),
+            'player_mood': rng.choice(['curious', 'sympathetic', 'skeptical', 'neutral', None]),
+            'last_topic': topic,
+            'key_topics_added': [topic],
+            'conversation_summary': f"The wall and the player talked about {topic}."
+        })
+        for key, schema in SUMMARY_DELTA_PROPERTIES.items():
+            if changes[key] is None and schema['type'] == 'array':
+                changes[key] = []
+        return changes
+
+    def _usage(self, messages, content):
+        prompt_tokens = count_message_tokens(messages)
+        completion_tokens = count_tokens(content)
+
+        # Simulate automatic prompt caching of a repeated system prompt
+        cached_tokens = 0
+        system_prompt = messages[0]['content'] if messages and messages[0]['role'] == 'system' else ""
+        system_tokens = count_tokens(system_prompt)
+        with self.lock:
+            if system_prompt in self.seen_prefixes and system_tokens >= 1024:
+                cached_tokens = system_tokens // 128 * 128
+            self.seen_prefixes.add(system_prompt)
+
+        return make_usage(prompt_tokens, completion_tokens, cached_tokens)
+
+
+def normalize_request(api_params):
+    """Hash the parts of a request that decide its reply
+
+    The random target in the length instruction ("Reply in approximately N
+    words") is masked, and streaming options are ignored, so a recorded
+    conversation matches when it is played again.
+
+    Returns:
+        str: sha256 hex digest of the normalized request
+    """
+    messages = [
+        {'role': m['role'], 'content': LENGTH_TARGET_PATTERN.sub("approximately N words", m['content']).strip()}
+        for m in api_params.get('messages', [])
+    ]
+    response_format = api_params.get('response_format') or {}
+    normalized = {
+        'model': api_params.get('model'),
+        'messages': messages,
+        'response_format': response_format.get('json_schema', {}).get('name', response_format.get('type')),
+        'temperature': api_params.get('temperature'),
+        'reasoning_effort': api_params.get('reasoning_effort')
+    }
+    return hashlib.sha256(json.dumps(normalized, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class CassetteMissError(RuntimeError):
+    """A strict replay got a request the cassette has no recording of"""
+
+
+class CassetteBackend(LLMBackend):
+    """Record API traffic to a cassette file, or replay it without a network
+
+    Record mode passes every request to the wrapped backend and appends one
+    compact JSON line per call to the cassette: the normalized request hash,
+    the reply text, token usage and timing (connect, first token, total).
+
+    Replay mode serves replies from the cassette, matched by request hash.
+    Requests that don't match anything (e.g. the facts changed since the
+    recording) get the next unused recording in order instead and are
+    counted as misses (see describe) - or, with strict, raise
+    CassetteMissError. With replay_latency the original connect,
+    first-token and generation times are slept through too, so latency
+    incidents can be reproduced exactly.
+    """
+
+    name = 'cassette'
+
+    def __init__(self, path, mode, inner=None, replay_latency=False, strict=False):
+        self.path = path
+        self.mode = mode  # 'record' or 'replay'
+        self.inner = inner  # Backend that really answers (record mode)
+        self.replay_latency = replay_latency
+        self.strict = strict  # Replay: raise on a request that wasn't recorded
+        self.lock = threading.Lock()
+        self.misses = 0  # Replayed requests that needed the in-order fallback
+
+        if mode == 'replay':
+            self.entries = []
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        self.entries.append(json.loads(line))
+            self.unused = list(range(len(self.entries)))
+
+    def connect(self):
+        if self.inner:
+            return self.inner.connect()
+
+    def build_params(self, *args, **kwargs):
+        if self.inner:
+            return self.inner.build_params(*args, **kwargs)
+        return super().build_params(*args, **kwargs)
+
+    def describe(self):
+        """One-line summary of the cassette (when replaying, how many replies matched their request)"""
+        if self.mode == 'record':
+            return f"Cassette: recording to {self.path}"
+        with self.lock:
+            replayed = len(self.entries) - len(self.unused)
+        text = f"Cassette: replayed {replayed} of {len(self.entries)} recordings from {self.path}"
+        if self.misses:
+            text += (f" | Unmatched requests: {self.misses} (given the next recording instead - not an exact"
+                     f" reproduction; --replay-strict stops at the first)")
+        return text
+
+    def create(self, **api_params):
+        request_hash = normalize_request(api_params)
+        if self.mode == 'replay':
+            return self._replay(request_hash, api_params)
+        return self._record(request_hash, api_params)
+
+    # ── Record ──
+
+    def _record(self, request_hash, api_params):
+        start = time.perf_counter()
+        response = self.inner.create(**api_params)
+        connect = time.perf_counter() - start
+        entry = {'hash': request_hash, 'model': api_params.get('model'), 'stream': bool(api_params.get('stream'))}
+
+        if not api_params.get('stream'):
+            entry['content'] = response.choices[0].message.content
+            entry['usage'] = usage_fields(response.usage) if getattr(response, 'usage', None) else None
+            entry['timing'] = {'connect': connect, 'first_token': None, 'total': connect}
+            self._append(entry)
+            return response
+        return self._record_stream(response, entry, start, connect)
+
+    def _record_stream(self, response, entry, start, connect):
+        content = []
+        first_token = None
+        usage = None
+        for chunk in response:
+            if getattr(chunk, 'usage', None):
+                usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter() - start - connect
+                content.append(chunk.choices[0].delta.content)
+            yield chunk
+
+        entry['content'] = "".join(content)
+        entry['usage'] = usage_fields(usage) if usage else None
+        entry['timing'] = {'connect': connect, 'first_token': first_token, 'total': time.perf_counter() - start}
+        self._append(entry)
+
+    def _append(self, entry):
+        for key, seconds in entry['timing'].items():
+            if seconds is not None:
+                entry['timing'][key] = round(seconds, 4)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+
+    # ── Replay ──
+
+    def _replay(self, request_hash, api_params):
+        with self.lock:
+            match = next((i for i in self.unused if self.entries[i]['hash'] == request_hash), None)
+            if match is None:
+                if self.strict:
+                    raise CassetteMissError(f"Cassette {self.path} has no recording of this request "
+                                            f"({request_hash[:12]}) - the conversation has diverged")
+                if not self.unused:
+                    raise RuntimeError(f"Cassette {self.path} has no more recorded responses")
+                self.misses += 1
+                match = self.unused[0]
+            self.unused.remove(match)
+        entry = self.entries[match]
+
+        timing = entry.get('timing') or {}
+        usage = make_usage(**entry['usage']) if entry.get('usage') else None
+        if self.replay_latency:
+            time.sleep(timing.get('connect') or 0)
+
+        if not api_params.get('stream'):
+            if self.replay_latency:
+                time.sleep(max((timing.get('total') or 0) - (timing.get('connect') or 0), 0))
+            return make_completion(api_params.get('model'), entry['content'], usage)
+
+        include_usage = api_params.get('stream_options', {}).get('include_usage')
+        return self._replay_stream(entry, usage if include_usage else None, timing)
+
+    def _replay_stream(self, entry, usage, timing):
+        chunk_delay = 0.0
+        if self.replay_latency:
+            time.sleep(timing.get('first_token') or 0)
+            # Spread the rest of the original generation time over the chunks
+            generation = (timing.get('total') or 0) - (timing.get('connect') or 0) - (timing.get('first_token') or 0)
+            chunks = max(math.ceil(len(entry['content']) / 4), 1)
+            chunk_delay = max(generation, 0) / chunks
+        yield from make_stream(entry['content'], usage, chunk_delay)
+
+
+def get_cassette():
+    """The CassetteBackend in use, under the ResilientBackend (None unless recording or replaying)"""
+    backend = get_backend()
+    if isinstance(backend, ResilientBackend):
+        backend = backend.inner
+    return backend if isinstance(backend, CassetteBackend) else None
+
+
+class CallTimeoutError(TimeoutError):
+    """No reply (or first token) arrived within the per-call deadline"""
+
+
+def is_transient_error(error):
+    """True for errors worth retrying: timeouts, dropped connections, rate limits and 5xx
+
+    Checked by type name and status code, so the SDKs don't have to be imported.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    if getattr(error, 'status_code', None) in TRANSIENT_STATUS_CODES:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_TYPES for cls in type(error).__mro__)
+
+
+class PrefetchedStream:
+    """A streamed response whose chunks up to the first token have already been read"""
+
+    def __init__(self, response, first_chunks, iterator):
+        self.response = response
+        self.first_chunks = first_chunks
+        self.iterator = iterator
+
+    def __iter__(self):
+        yield from self.first_chunks
+        yield from self.iterator
+
+    def close(self):
+        close = getattr(self.response, 'close', None)
+        if close:
+            close()
+
+
+class ResilientBackend(LLMBackend):
+    """Per-call deadlines, jittered retries and optional hedging around a backend
+
+    Each attempt runs on a daemon thread and must produce its first token
+    (for a non-streamed call, the whole reply) within `timeout` seconds;
+    an attempt that misses it is abandoned. Timeouts, dropped connections,
+    rate limits and 5xx errors are retried up to `retries` times with
+    exponential backoff and jitter. Other errors (bad key, bad request)
+    are raised straight away.
+
+    With hedging on, if the first attempt hasn't produced a token by the
+    rolling p95 of recent first-token times, an identical second request
+    is sent and whichever answers first is used (the other is closed if
+    it is a stream). Hedged requests are billed too, but only for calls
+    in the slowest ~5%.
+    """
+
+    name = 'resilient'
+
+    def __init__(self, inner, timeout=CALL_TIMEOUT_SECONDS, retries=CALL_RETRIES, hedge=False):
+        self.inner = inner
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge = hedge
+        self.first_token_times = deque(maxlen=HEDGE_WINDOW)  # Seconds, most recent calls
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'retries': 0, 'timeouts': 0, 'hedges': 0, 'hedge_wins': 0}
+
+    def connect(self):
+        return self.inner.connect()
+
+    def build_params(self, *args, **kwargs):
+        return self.inner.build_params(*args, **kwargs)
+
+    def hedge_delay(self):
+        """Seconds to wait for a first token before hedging (None = not enough history yet)"""
+        with self.lock:
+            times = sorted(self.first_token_times)
+        if len(times) < HEDGE_MIN_SAMPLES:
+            return None
+        p95 = times[max(math.ceil(0.95 * len(times)) - 1, 0)]
+        return max(p95, HEDGE_MIN_DELAY_SECONDS)
+
+    def describe(self):
+        """One-line summary of retries, timeouts and hedges so far"""
+        with self.lock:
+            stats = dict(self.stats)
+        text = (f"Calls: {stats['calls']} | Retries: {stats['retries']} | Timeouts: {stats['timeouts']} | "
+                f"Deadline: {self.timeout:g}s")
+        if self.hedge:
+            delay = self.hedge_delay()
+            text += (f" | Hedged: {stats['hedges']} (won {stats['hedge_wins']}) at "
+                     f"{f'{delay:.2f}s' if delay is not None else 'p95 (warming up)'}")
+        return text
+
+    def create(self, **api_params):
+        with self.lock:
+            self.stats['calls'] += 1
+
+        for attempt in range(self.retries + 1):
+            if attempt:
+                delay = min(RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1), RETRY_MAX_DELAY_SECONDS)
+                time.sleep(delay * random.uniform(0.5, 1.5))  # Jitter, so clients don't retry in lockstep
+                with self.lock:
+                    self.stats['retries'] += 1
+            try:
+                return self._race(api_params)
+            except Exception as e:
+                if attempt == self.retries or not is_transient_error(e):
+                    raise
+
+    def _attempt(self, api_params, results, number):
+        """Send one request and report (number, response, error, seconds to first token)"""
+        start = time.perf_counter()
+        try:
+            response = self.inner.create(**api_params)
+            if api_params.get('stream'):
+                # Read up to the first chunk with text - OpenAI sends a
+                # role-only chunk first, which is no sign of a reply yet
+                iterator = iter(response)
+                first_chunks = []
+                for chunk in iterator:
+                    first_chunks.append(chunk)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        break
+                response = PrefetchedStream(response, first_chunks, iterator)
+            results.put((number, response, None, time.perf_counter() - start))
+        except Exception as e:
+            results.put((number, None, e, time.perf_counter() - start))
+
+    def _race(self, api_params):
+        """Run one attempt (plus a hedge, if it is slow) and return the first good response"""
+        results = queue.Queue()
+        start = time.perf_counter()
+        deadline = start + self.timeout
+        hedge_delay = self.hedge_delay() if self.hedge else None
+        hedge_at = start + hedge_delay if hedge_delay is not None else None
+
+        threading.Thread(target=self._attempt, args=(api_params, results, 0), daemon=True).start()
+        running = 1
+        while True:
+            wait_until = min(deadline, hedge_at) if hedge_at else deadline
+            try:
+                number, response, error, seconds = results.get(timeout=max(wait_until - time.perf_counter(), 0))
+            except queue.Empty:
+                if time.perf_counter() >= deadline:
+                    with self.lock:
+                        self.stats['timeouts'] += 1
+                    self._discard_running(results, running)
+                    raise CallTimeoutError(f"no reply within {self.timeout:g} seconds")
+                # Still nothing by the p95 - send the same request again
+                hedge_at = None
+                threading.Thread(target=self._attempt, args=(api_params, results, 1), daemon=True).start()
+                running += 1
+                with self.lock:
+                    self.stats['hedges'] += 1
+                continue
+
+            running -= 1
+            if error is not None:
+                if running:
+                    continue  # The other attempt may still succeed
+                raise error
+
+            with self.lock:
+                self.first_token_times.append(seconds)
+                if number == 1:
+                    self.stats['hedge_wins'] += 1
+            self._discard_running(results, running)
+            return response
+
+    def _discard_running(self, results, running):
+        """Close the attempts still in flight (a hedge's loser, or all of them after a timeout) as they finish"""
+        for _ in range(running):
+            threading.Thread(target=self._discard, args=(results,), daemon=True).start()
+
+    @staticmethod
+    def _discard(results):
+        """Close an abandoned attempt's stream when it finishes, so its connection goes back to the pool"""
+        number, response, error, seconds = results.get()
+        close = getattr(response, 'close', None)
+        if close:
+            try:
+                close()
+            except Exception:
+                pass
+
+
+def get_backend():
+    """Return the active LLM backend (OpenAI unless main() chose another)"""
+    global llm_backend
+    if llm_backend is None:
+        llm_backend = OpenAIBackend()
+    return llm_backend
+
+
+class ModelRouter:
+    """Move chat turns to a faster model while the chosen one is too slow
+
+    Tracks a rolling window of first-token latency (whole-reply latency,
+    when replies aren't streamed) and errors per (model, reasoning_effort). When the median latency of the model a
+    session is routed to goes over the SLO, or too many of its calls fail,
+    its turns are moved one step down MODEL_OPTIONS' 'downgrade_to' chain
+    (gpt-5 -> gpt-5-mini -> gpt-5-nano). The median ignores one-off
+    outliers - those are what hedging is for.
+
+    While downgraded, every ROUTER_PROBE_EVERY turns one turn is sent to
+    the next model up as a probe; if it answers within the SLO, turns move
+    back up. Every decision is kept in `decisions` and appended to a JSONL
+    log file. One router is shared by all sessions in the process, since
+    a provider slowdown affects them all.
+    """
+
+    def __init__(self, slo=ROUTER_SLO_SECONDS, log_file=ROUTER_LOG_FILE, streamed=True):
+        self.slo = slo
+        self.streamed = streamed  # False: turns are timed to the whole reply, so slo should be one for that
+        self.log_file = log_file
+        self.windows = {}  # (model, reasoning_effort) -> deque of (seconds, ok)
+        self.routes = {}  # Chosen model -> model its turns currently go to
+        self.turns_since_probe = {}  # Chosen model -> routed turns since the last probe
+        self.decisions = []
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model):
+        return model, MODEL_OPTIONS[model].get('reasoning_effort')
+
+    def health(self, model):
+        """(median seconds, error rate, samples) over the window, or None if too few samples"""
+        samples = list(self.windows.get(self.key(model), []))
+        if len(samples) < ROUTER_MIN_SAMPLES:
+            return None
+        latencies = sorted(seconds for seconds, ok in samples if ok)
+        median = latencies[len(latencies) // 2] if latencies else float('inf')
+        error_rate = sum(1 for seconds, ok in samples if not ok) / len(samples)
+        return median, error_rate, len(samples)
+
+    def choose(self, model):
+        """Model to send the next turn to, for a session that chose `model`"""
+        with self.lock:
+            current = self.routes.get(model, model)
+
+            # Too slow or failing - step down
+            health = self.health(current)
+            downgrade = MODEL_OPTIONS[current].get('downgrade_to')
+            if health and downgrade and (health[0] > self.slo or health[1] > ROUTER_MAX_ERROR_RATE):
+                median, error_rate, samples = health
+                self._decide('downgrade', model, current, downgrade,
+                             f"median {median:.2f}s, {error_rate:.0%} errors over {samples} calls "
+                             f"(SLO {self.slo:g}s, max {ROUTER_MAX_ERROR_RATE:.0%} errors)")
+                self.routes[model] = current = downgrade
+                self.turns_since_probe[model] = 0
+                return current
+
+            # Downgraded for a while - try the next model up
+            if current != model:
+                self.turns_since_probe[model] = self.turns_since_probe.get(model, 0) + 1
+                if self.turns_since_probe[model] >= ROUTER_PROBE_EVERY:
+                    self.turns_since_probe[model] = 0
+                    return self._step_up(model, current)
+            return current
+
+    def record(self, chosen_model, model, seconds, ok):
+        """Report one turn: the model it was sent to, its latency (see streamed) and success"""
+        with self.lock:
+            key = self.key(model)
+            current = self.routes.get(chosen_model, chosen_model)
+            if current != chosen_model and model != current and model == self._step_up(chosen_model, current):
+                # A probe - move back up only if it was fast and worked
+                if ok and seconds <= self.slo:
+                    self._decide('upgrade', chosen_model, current, model, f"probe answered in {seconds:.2f}s "
+                                                                          f"(SLO {self.slo:g}s)")
+                    self.windows[key] = deque(maxlen=ROUTER_WINDOW)  # Old slow samples no longer count
+                    if model == chosen_model:
+                        del self.routes[chosen_model]
+                    else:
+                        self.routes[chosen_model] = model
+                else:
+                    self._decide('stay', chosen_model, current, current,
+                                 f"probe of {model} {'took ' + format(seconds, '.2f') + 's' if ok else 'failed'}")
+            self.windows.setdefault(key, deque(maxlen=ROUTER_WINDOW)).append((seconds, ok))
+
+    @staticmethod
+    def _step_up(chosen_model, current):
+        """The model one step above `current` on the way back to `chosen_model`"""
+        model = chosen_model
+        while MODEL_OPTIONS[model].get('downgrade_to') not in (current, None):
+            model = MODEL_OPTIONS[model]['downgrade_to']
+        return model
+
+    def _decide(self, action, chosen_model, from_model, to_model, reason):
+        decision = {
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'action': action,
+            'chosen': chosen_model,
+            'from': from_model,
+            'to': to_model,
+            'reasoning_effort': MODEL_OPTIONS[to_model].get('reasoning_effort'),
+            'reason': reason
+        }
+        self.decisions.append(decision)
+        if self.log_file:
+            try:
+                os.makedirs(os.path.dirname(self.log_file) or '.', exist_ok=True)
+                with open(self.log_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(decision) + "\n")
+            except OSError:
+                pass  # The log is best-effort
+
+    def describe(self):
+        """Lines for the perf report: routes and per-model health"""
+        with self.lock:
+            lines = [f"Adaptive routing: SLO {self.slo:g}s "
+                     f"(median time to {'first word' if self.streamed else 'whole reply'})"]
+            for chosen_model, current in self.routes.items():
+                lines.append(f"  {chosen_model} -> {current}")
+            for (model, effort), samples in self.windows.items():
+                health = self.health(model)
+                if health:
+                    lines.append(f"  {model} ({effort or 'default'}): median {health[0]:.2f}s, "
+                                 f"{health[1]:.0%} errors over {health[2]} calls")
+            lines.append(f"  Decisions: {len(self.decisions)}"
+                         + (f" (log: {self.log_file})" if self.log_file and self.decisions else ""))
+        return lines
+
+
+def cheapest_model():
+    """The model with the lowest output price - for housekeeping calls like summary compaction"""
+    return min(MODEL_OPTIONS, key=lambda name: MODEL_OPTIONS[name]['price_output'])
+
+
+def validate_model(model_name):
+    """Validate and return a model name, with user feedback.
+
+    Args:
+        model_name: The model name to validate
+
+    Returns:
+        tuple: (valid_model_name, is_valid_bool)
+    """
+    if model_name in MODEL_OPTIONS:
+        return (model_name, True)
+    else:
+        return (DEFAULT_MODEL, False)
+
+
+def set_color_theme(theme_name):
+    """Set the active color theme by updating global color variables.
+
+    Args:
+        theme_name: Name of theme from COLOR_THEMES dict
 
     Returns:
         bool: True if theme was valid and applied
@@ -682,13 +2446,514 @@ def print_wrapped(text, prefix="", color=""):
             print(COLOR_RESET, end="")
 
 
-def display_api_debug_info(messages, length_instruction, truncate=True):
+class StreamingWrapPrinter:
+    """Print streamed text a word at a time, wrapped exactly like print_wrapped
+
+    Text can arrive in arbitrary fragments (half a word, several words, etc).
+    A word is only printed once the whitespace after it arrives, so line
+    breaks land in the same places textwrap would put them.
+    """
+
+    def __init__(self, prefix="", color=""):
+        self.prefix = prefix
+        self.color = color
+        self.width = TEXT_WIDTH - len(prefix)
+        self.indent = " " * len(prefix)
+        self.line_len = 0
+        self.word = ""
+        self.started = False
+        self.render_seconds = 0.0  # Time spent wrapping and writing to the terminal
+
+    def write(self, text):
+        """Add a fragment of text, printing any words it completes"""
+        start = time.perf_counter()
+        for ch in text:
+            if ch.isspace():
+                self._flush_word()
+            else:
+                self.word += ch
+        sys.stdout.flush()
+        self.render_seconds += time.perf_counter() - start
+
+    def finish(self):
+        """Print the last word and end the paragraph"""
+        start = time.perf_counter()
+        self._flush_word()
+        if self.started:
+            sys.stdout.write("\n")
+            if self.color:
+                sys.stdout.write(COLOR_RESET)
+        sys.stdout.flush()
+        self.render_seconds += time.perf_counter() - start
+
+    def _flush_word(self):
+        if not self.word:
+            return
+        if not self.started:
+            # First word goes right after the prefix
+            sys.stdout.write(f"{self.color}{self.prefix}{self.word}")
+            self.started = True
+            self.line_len = len(self.word)
+        elif self.line_len + 1 + len(self.word) > self.width:
+            # Wrap - indent continuation lines to match the prefix
+            sys.stdout.write(f"\n{self.indent}{self.word}")
+            self.line_len = len(self.word)
+        else:
+            sys.stdout.write(f" {self.word}")
+            self.line_len += 1 + len(self.word)
+        self.word = ""
+
+
+class ResponseFieldParser:
+    """Incrementally decode one string field out of streamed JSON
+
+    Structured outputs emit keys in schema order, so the "response" field of
+    WALL_RESPONSE_SCHEMA arrives before the (much longer) "summary". Feed the
+    raw JSON fragments in as they stream; feed() returns whatever new
+    characters of the field value can be decoded so far.
+    """
+
+    def __init__(self, field="response"):
+        self.buffer = ""  # All raw JSON received so far
+        self.key_pattern = re.compile(r'"' + re.escape(field) + r'"\s*:\s*"')
+        self.pos = None  # Index of the next undecoded value character
+        self.done = False
+
+    def feed(self, fragment):
+        """Add a raw JSON fragment and return newly decoded field text"""
+        self.buffer += fragment
+        if self.done:
+            return ""
+
+        if self.pos is None:
+            match = self.key_pattern.search(self.buffer)
+            if not match:
+                return ""
+            self.pos = match.end()
+
+        decoded = []
+        buffer = self.buffer
+        while self.pos < len(buffer):
+            ch = buffer[self.pos]
+            if ch == '"':
+                self.done = True
+                break
+            if ch != '\\':
+                decoded.append(ch)
+                self.pos += 1
+                continue
+
+            # Escape sequence - wait until all of it has arrived
+            escape_len = 6 if buffer[self.pos + 1:self.pos + 2] == 'u' else 2
+            escape = buffer[self.pos:self.pos + escape_len]
+            if len(escape) < escape_len:
+                break
+            if escape_len == 6 and 0xD800 <= int(escape[2:], 16) <= 0xDBFF:
+                # High surrogate - needs its low surrogate partner too
+                escape = buffer[self.pos:self.pos + 12]
+                if len(escape) < 12:
+                    break
+            decoded.append(json.loads(f'"{escape}"'))
+            self.pos += len(escape)
+
+        return "".join(decoded)
+
+
+class WallResponseStream:
+    """Show a streamed WALL_RESPONSE_SCHEMA reply as it is generated
+
+    show_reply() prints the "response" field as soon as its characters
+    arrive and returns the moment that field is complete. The rest of the
+    JSON (the summary) keeps streaming on a background thread while the
+    player reads and types; result() waits for it and returns the parsed
+    {response, summary} dict.
+    """
+
+    def __init__(self, stream, on_usage=None):
+        self.chunks = self._content(stream)
+        self.parser = ResponseFieldParser("response")
+        self.usage = None
+        self.on_usage = on_usage  # Called with the usage block when it arrives
+        self.error = None
+        self.thread = None
+
+        # Timestamps for perf reporting (see timings())
+        self.started_at = time.perf_counter()
+        self.first_text_at = None
+        self.reply_done_at = None
+        self.stream_done_at = None
+        self.render_seconds = 0.0
+        self.parse_seconds = 0.0
+
+    def _content(self, stream):
+        for chunk in stream:
+            # The final chunk can carry usage with no choices at all
+            # (only sent when stream_options include_usage is set)
+            if getattr(chunk, 'usage', None):
+                self.usage = chunk.usage
+                if self.on_usage:
+                    self.on_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+
+    def show_reply(self, prefix="THE WALL: ", color=""):
+        """Print the reply as it streams in; returns the full reply text"""
+        printer = StreamingWrapPrinter(prefix, color)
+        reply = []
+        try:
+            for fragment in self.chunks:
+                text = self.parser.feed(fragment)
+                if text:
+                    if self.first_text_at is None:
+                        self.first_text_at = time.perf_counter()
+                    reply.append(text)
+                    printer.write(text)
+                if self.parser.done:
+                    break
+        finally:
+            printer.finish()
+            self.reply_done_at = time.perf_counter()
+            self.render_seconds = printer.render_seconds
+
+        # Collect the summary in the background
+        self.thread = threading.Thread(target=self._drain, daemon=True)
+        self.thread.start()
+        return "".join(reply)
+
+    def _drain(self):
+        try:
+            for fragment in self.chunks:
+                self.parser.feed(fragment)
+        except Exception as e:
+            self.error = e
+        self.stream_done_at = time.perf_counter()
+
+    def result(self):
+        """Wait for the stream to finish and return the parsed JSON dict"""
+        if self.thread:
+            self.thread.join()
+        if self.error:
+            raise self.error
+        start = time.perf_counter()
+        result = json.loads(self.parser.buffer)
+        self.parse_seconds = time.perf_counter() - start
+        return result
+
+    def timings(self):
+        """Seconds spent in each phase of the stream (for PerfRecorder)
+
+        first_token: stream opened -> first reply character
+        generation:  first reply character -> reply complete, minus rendering
+        render:      wrapping and printing the reply
+        summary:     reply complete -> stream finished (overlaps player typing)
+        parse:       json.loads of the complete body
+        """
+        timings = {'render': self.render_seconds}
+        if self.first_text_at is not None:
+            timings['first_token'] = self.first_text_at - self.started_at
+            timings['generation'] = max(self.reply_done_at - self.first_text_at - self.render_seconds, 0.0)
+        if self.stream_done_at is not None and self.reply_done_at is not None:
+            timings['summary'] = self.stream_done_at - self.reply_done_at
+        if self.parse_seconds:
+            timings['parse'] = self.parse_seconds
+        return timings
+
+
+class PerfRecorder:
+    """Time the phases of each chat turn (and the opening and memory calls)
+
+    Phases, in the order a turn goes through them:
+        prompt       building the message list for the request
+        connect      sending the request until the API answers (headers in;
+                     for a non-streamed call this is the whole request)
+        first_token  waiting for the first character of the reply
+        generation   the rest of the reply arriving
+        summary      the summary arriving after the reply (streamed turns -
+                     overlaps the player typing their next line)
+        parse        json.loads of the response body
+        render       wrapping and printing the reply
+
+    A record's total is wall-clock time from start() until the reply is
+    shown (see end) - not the sum of the phases, which overlap while a
+    reply streams in, and which include the summary arriving after it.
+
+    Each finished record can also be appended to a JSONL trace file.
+    """
+
+    def __init__(self, trace_file=None):
+        self.records = []
+        self.trace_file = trace_file
+
+    def start(self, label, model=None):
+        """Begin a new record, e.g. start('turn 3', model)"""
+        return {'label': label, 'model': model, 'phases': {}, 'started_at': time.time(),
+                'clock_start': time.perf_counter()}
+
+    def end(self, record):
+        """Mark the reply as shown - its total stops here, even if the record is finished later"""
+        record.setdefault('clock_end', time.perf_counter())
+
+    @contextmanager
+    def span(self, record, phase):
+        """Context manager that adds the time of its block to a record's phase"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(record, phase, time.perf_counter() - start)
+
+    def add(self, record, phase, seconds):
+        """Add seconds to a phase of a record"""
+        record['phases'][phase] = record['phases'].get(phase, 0.0) + seconds
+
+    def finish(self, record):
+        """Store a finished record and append it to the trace file, if any"""
+        self.end(record)
+        record['total'] = record['clock_end'] - record['clock_start']
+        self.records.append(record)
+
+        if self.trace_file:
+            trace = {
+                'time': datetime.fromtimestamp(record['started_at']).isoformat(timespec='seconds'),
+                'label': record['label'],
+                'model': record['model'],
+                'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in record['phases'].items()},
+                'total_ms': round(record['total'] * 1000, 2)
+            }
+            try:
+                with trace_lock, open(self.trace_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(trace) + "\n")
+            except OSError as e:
+                print(f"{COLOR_ALERT}Note: could not write trace file ({e}).{COLOR_RESET}")
+
+    def percentiles(self, phase):
+        """(count, p50, p95, max) in seconds for a phase, or None if never seen"""
+        values = sorted(record['total'] if phase == 'total' else record['phases'][phase]
+                        for record in self.records
+                        if phase == 'total' or phase in record['phases'])
+        if not values:
+            return None
+
+        def nearest_rank(pct):
+            return values[max(math.ceil(pct / 100 * len(values)) - 1, 0)]
+
+        return len(values), nearest_rank(50), nearest_rank(95), values[-1]
+
+
+def display_perf_report(perf, title="LATENCY BY PHASE (THIS SESSION)"):
+    """Display p50/p95 latency per phase for this session
+
+    Args:
+        perf: PerfRecorder for this session
+        title: Report heading
+    """
+    print(f"\n{COLOR_SYSTEM}{'=' * TEXT_WIDTH}")
+    print(title.center(TEXT_WIDTH))
+    print("=" * TEXT_WIDTH + "\n")
+
+    if not perf.records:
+        print("No timed calls yet.")
+    else:
+        print(f"Timed calls: {len(perf.records)} ({', '.join(record['label'] for record in perf.records[-5:])}"
+              f"{', ...' if len(perf.records) > 5 else ''})")
+        print()
+        print(f"{'PHASE':<14}{'COUNT':>7}{'P50 ms':>12}{'P95 ms':>12}{'MAX ms':>12}")
+        print("─" * TEXT_WIDTH)
+        for phase in PERF_PHASES + ['total']:
+            stats = perf.percentiles(phase)
+            if stats:
+                count, p50, p95, slowest = stats
+                print(f"{phase:<14}{count:>7}{p50 * 1000:>12.1f}{p95 * 1000:>12.1f}{slowest * 1000:>12.1f}")
+
+    if isinstance(get_backend(), ResilientBackend):
+        print()
+        print(get_backend().describe())
+    if get_cassette():
+        print(get_cassette().describe())
+    if model_router:
+        print()
+        for line in model_router.describe():
+            print(line)
+    if perf.trace_file:
+        print()
+        print(f"Trace file: {perf.trace_file}")
+    print("=" * TEXT_WIDTH)
+    print(COLOR_RESET)
+
+
+def display_cassette_misses():
+    """At the end of a replayed game, warn if some replies didn't match their request"""
+    cassette = get_cassette()
+    if cassette and cassette.misses:
+        print(f"{COLOR_ALERT}\n{cassette.describe()}{COLOR_RESET}")
+
+
+def perf_percentiles_ms(perf):
+    """p50/p95/max per phase of a PerfRecorder, in milliseconds"""
+    latency = {}
+    for phase in PERF_PHASES + ['total']:
+        stats = perf.percentiles(phase)
+        if stats:
+            count, p50, p95, slowest = stats
+            latency[phase] = {'count': count, 'p50': round(p50 * 1000, 2), 'p95': round(p95 * 1000, 2),
+                              'max': round(slowest * 1000, 2)}
+    return latency
+
+
+def usage_fields(usage):
+    """Pull the token counts out of a response's usage object
+
+    Args:
+        usage: usage object from a chat-completions response
+
+    Returns:
+        dict: prompt_tokens, cached_tokens, completion_tokens, reasoning_tokens
+    """
+    prompt_details = getattr(usage, 'prompt_tokens_details', None)
+    completion_details = getattr(usage, 'completion_tokens_details', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_tokens', 0) or 0,
+        'cached_tokens': getattr(prompt_details, 'cached_tokens', 0) or 0,
+        'completion_tokens': getattr(usage, 'completion_tokens', 0) or 0,
+        'reasoning_tokens': getattr(completion_details, 'reasoning_tokens', 0) or 0
+    }
+
+
+def get_call_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    """Estimate the cost of one API call in US dollars
+
+    Reasoning tokens are part of completion_tokens and billed as output.
+
+    Args:
+        model: Model name (key of MODEL_OPTIONS)
+        prompt_tokens: Total input tokens, including cached ones
+        cached_tokens: Input tokens served from the prompt cache
+        completion_tokens: Output tokens, including reasoning tokens
+
+    Returns:
+        float: Estimated cost in dollars (0.0 for models without prices)
+    """
+    info = MODEL_OPTIONS.get(model, {})
+    uncached_tokens = prompt_tokens - cached_tokens
+    return (uncached_tokens * info.get('price_input', 0.0) +
+            cached_tokens * info.get('price_cached_input', 0.0) +
+            completion_tokens * info.get('price_output', 0.0)) / 1_000_000
+
+
+class SessionUsage:
+    """Record token usage and cost for every API call in a session
+
+    Each response's usage block gives prompt, completion, reasoning
+    (usage.completion_tokens_details.reasoning_tokens) and cached
+    (usage.prompt_tokens_details.cached_tokens) tokens. OpenAI caches long,
+    identical prompt prefixes automatically; cached input tokens are cheaper
+    and faster, so the cache hit rate is reported too.
+    """
+
+    def __init__(self):
+        self.calls = []  # One dict per API call, in order
+        self.lock = threading.Lock()  # Streamed usage arrives on background threads
+
+    def record(self, usage, label, model):
+        """Add one response's usage block
+
+        Args:
+            usage: The response's usage object (ignored if None)
+            label: What the call was for, e.g. 'opening', 'turn 3', 'memory'
+            model: Model the call was made with
+        """
+        if usage is None:
+            return
+        tokens = usage_fields(usage)
+
+        with self.lock:
+            self.calls.append({
+                'label': label,
+                'model': model,
+                'reasoning_effort': MODEL_OPTIONS.get(model, {}).get('reasoning_effort'),
+                **tokens,
+                'cost': get_call_cost(model, tokens['prompt_tokens'], tokens['cached_tokens'],
+                                      tokens['completion_tokens'])
+            })
+
+    def recorder(self, label, model):
+        """Return a callback that records a usage block under this label and model"""
+        return lambda usage: self.record(usage, label, model)
+
+    def totals(self):
+        """Sum every numeric field over all calls"""
+        with self.lock:
+            calls = list(self.calls)
+        totals = {'calls': len(calls)}
+        for field in ['prompt_tokens', 'cached_tokens', 'completion_tokens', 'reasoning_tokens', 'cost']:
+            totals[field] = sum(call[field] for call in calls)
+        return totals
+
+    def describe_cache(self):
+        """One-line prompt cache report for the debug view"""
+        with self.lock:
+            last = self.calls[-1] if self.calls else None
+        if not last:
+            return "No usage reported yet."
+        totals = self.totals()
+        last_rate = last['cached_tokens'] / last['prompt_tokens'] if last['prompt_tokens'] else 0.0
+        session_rate = totals['cached_tokens'] / totals['prompt_tokens'] if totals['prompt_tokens'] else 0.0
+        return (f"Last request: {last['cached_tokens']}/{last['prompt_tokens']} prompt tokens cached ({last_rate:.0%}) | "
+                f"Session: {totals['cached_tokens']}/{totals['prompt_tokens']} over {totals['calls']} requests ({session_rate:.0%})")
+
+
+def display_cost_report(usage):
+    """Display session token totals, estimated cost, and a per-call breakdown
+
+    Args:
+        usage: SessionUsage for this session
+    """
+    print(f"\n{COLOR_SYSTEM}{'=' * TEXT_WIDTH}")
+    print("TOKENS AND ESTIMATED COST".center(TEXT_WIDTH))
+    print("=" * TEXT_WIDTH + "\n")
+
+    if not usage.calls:
+        print("No API calls made yet.")
+        print("\n" + "=" * TEXT_WIDTH)
+        print(COLOR_RESET)
+        return
+
+    totals = usage.totals()
+    cache_rate = totals['cached_tokens'] / totals['prompt_tokens'] if totals['prompt_tokens'] else 0.0
+    print(f"API calls:        {totals['calls']}")
+    print(f"Prompt tokens:    {totals['prompt_tokens']:,} ({totals['cached_tokens']:,} cached, {cache_rate:.0%})")
+    print(f"Output tokens:    {totals['completion_tokens']:,} ({totals['reasoning_tokens']:,} reasoning)")
+    print(f"Estimated cost:   ${totals['cost']:.4f}")
+    print()
+
+    print(f"{'CALL':<10}{'MODEL':<12}{'EFFORT':<8}{'PROMPT':>8}{'CACHED':>8}{'OUTPUT':>8}{'REASON':>8}{'COST':>10}")
+    print("─" * TEXT_WIDTH)
+    for call in usage.calls:
+        effort = call['reasoning_effort'] or '-'
+        print(f"{call['label']:<10}{call['model']:<12}{effort:<8}{call['prompt_tokens']:>8}{call['cached_tokens']:>8}"
+              f"{call['completion_tokens']:>8}{call['reasoning_tokens']:>8}{'$' + format(call['cost'], '.4f'):>10}")
+
+    print()
+    print("Costs are estimates from the prices in MODEL_OPTIONS (USD per 1M tokens).")
+    print("Reasoning tokens are included in output and billed as output.")
+    print("=" * TEXT_WIDTH)
+    print(COLOR_RESET)
+
+
+def display_api_debug_info(messages, length_instruction, truncate=True, usage=None, summary_compactions=0,
+                           profiles=None):
     """Display the last API request details in a readable format
 
     Args:
         messages: List of message dicts sent to API
         length_instruction: The length instruction used
         truncate: If True, truncate long messages at 500 chars (default True)
+        usage: Optional SessionUsage to report prompt cache hits from
+        summary_compactions: Times the summary has been shrunk to fit the budget
+        profiles: Optional (turn label, tokens by section) of each turn so far, for the trend
     """
     print(f"\n{COLOR_SYSTEM}{'=' * TEXT_WIDTH}")
     if truncate:
@@ -697,11 +2962,12 @@ def display_api_debug_info(messages, length_instruction, truncate=True):
         print("LAST API REQUEST DETAILS (FULL)".center(TEXT_WIDTH))
     print("=" * TEXT_WIDTH + "\n")
 
-    for i, msg in enumerate(messages, 1):
+    per_message, sections = prompt_token_profile(messages)
+    for i, (msg, (_, section, tokens)) in enumerate(zip(messages, per_message), 1):
         role = msg["role"].upper()
         content = msg["content"]
 
-        print(f"--- MESSAGE {i}: {role} ---")
+        print(f"--- MESSAGE {i}: {role} - {section}, {tokens:,} tokens ---")
 
         # Truncate very long messages for readability (if requested)
         if truncate and len(content) > 500:
@@ -716,11 +2982,109 @@ def display_api_debug_info(messages, length_instruction, truncate=True):
     print(f"--- LENGTH INSTRUCTION ---")
     print(length_instruction)
     print()
+
+    print(f"--- CONTEXT BUDGET ---")
+    print(f"{count_message_tokens(messages)} of {PROMPT_TOKEN_BUDGET} prompt tokens "
+          f"(summary compacted {summary_compactions} time{'s' if summary_compactions != 1 else ''})")
+    print()
+
+    total = sum(sections.values())
+    print(f"--- TOKENS BY SECTION ---")
+    for name, tokens in sorted(sections.items(), key=lambda item: -item[1]):
+        print(f"{name:<22}{tokens:>8,}{tokens / total:>8.1%}")
+    print(f"{'total':<22}{total:>8,}")
+    print()
+
+    if profiles and len(profiles) > 1:
+        # How each section has grown or shrunk over the session's turns
+        print(f"--- TREND OVER {len(profiles)} TURNS ({profiles[0][0]} to {profiles[-1][0]}) ---")
+        print(f"{'section':<22}{'first':>8}{'last':>8}{'min':>8}{'max':>8}{'mean':>8}")
+        names = [name for name in PROMPT_SECTIONS if any(name in profile for _, profile in profiles)]
+        for name in names + ['total']:
+            values = [sum(profile.values()) if name == 'total' else profile.get(name, 0) for _, profile in profiles]
+            print(f"{name:<22}{values[0]:>8,}{values[-1]:>8,}{min(values):>8,}{max(values):>8,}"
+                  f"{round(sum(values) / len(values)):>8,}")
+        print()
+
+    if usage:
+        print(f"--- PROMPT CACHE ---")
+        for line in textwrap.wrap(usage.describe_cache(), TEXT_WIDTH):
+            print(line)
+        print()
     print("=" * TEXT_WIDTH)
     print(COLOR_RESET)
 
 
-def analyze_summary_evolution(summary_history, model=DEFAULT_MODEL):
+def summary_items(value):
+    """A summary field's items - its bullets, or its sentences if it is prose"""
+    items = summary_list_items(value)
+    if items is None:
+        items = [piece for piece in re.split(r"(?<=[.!?;])\s+", " ".join(value.split())) if piece]
+    return items
+
+
+def analyze_summary_history(summary_history):
+    """Compare the last few summaries field by field - locally, no API call
+
+    Fields in MEMORY_TRAJECTORY_FIELDS become the sequence of their values
+    (repeats collapsed). The items (bullets or sentences) of every other
+    field are compared across the summaries: stable = in every summary,
+    added = in the newest but not the oldest, removed = the other way round.
+
+    Args:
+        summary_history: The last N conversation summaries, oldest first
+
+    Returns:
+        dict: {'summaries': N, 'stable', 'added', 'removed': {field: [items]},
+               'trajectory': {field: [values]}, 'counts': {field: [item count per summary]}}
+    """
+    parsed = [parse_summary_fields(summary) or OrderedDict([('SUMMARY', summary)]) for summary in summary_history]
+    labels = []
+    for fields in parsed:
+        labels.extend(label for label in fields if label not in labels)
+
+    analysis = {'summaries': len(parsed), 'stable': OrderedDict(), 'added': OrderedDict(),
+                'removed': OrderedDict(), 'trajectory': OrderedDict(), 'counts': OrderedDict()}
+    for label in labels:
+        values = [fields.get(label, "") for fields in parsed]
+        if label in MEMORY_TRAJECTORY_FIELDS:
+            sequence = []
+            for value in values:
+                if value and (not sequence or value.lower() != sequence[-1].lower()):
+                    sequence.append(value)
+            analysis['trajectory'][label] = sequence
+            continue
+
+        items = [summary_items(value) for value in values]
+        keys = [{item.lower() for item in field_items} for field_items in items]
+        stable = [item for item in items[-1] if all(item.lower() in other for other in keys)]
+        added = [item for item in items[-1] if item.lower() not in keys[0]]
+        removed = [item for item in items[0] if item.lower() not in keys[-1]]
+        for kind, found in (('stable', stable), ('added', added), ('removed', removed)):
+            if found:
+                analysis[kind][label] = found
+        if len(set(map(len, items))) > 1:
+            analysis['counts'][label] = [len(field_items) for field_items in items]
+    return analysis
+
+
+def describe_memory_analysis(analysis):
+    """Render analyze_summary_history() output as text, in the sections 'memory deep' uses"""
+    stable = [f"- {label.capitalize()}: {'; '.join(items)}" for label, items in analysis['stable'].items()]
+    changes = ([f"+ {label.capitalize()}: {'; '.join(items)}" for label, items in analysis['added'].items()] +
+               [f"- {label.capitalize()} (dropped): {'; '.join(items)}"
+                for label, items in analysis['removed'].items()])
+    trajectory = ([f"- {label.capitalize()}: {' -> '.join(values)}"
+                   for label, values in analysis['trajectory'].items() if values] +
+                  [f"- {label.capitalize()}: {' -> '.join(map(str, counts))} items"
+                   for label, counts in analysis['counts'].items()])
+
+    return "\n".join(["1. STABLE ELEMENTS (in every summary):", *(stable or ["- Nothing has stayed the same."]),
+                      "", "2. CHANGES & ADDITIONS:", *(changes or ["- No changes."]),
+                      "", "3. CONVERSATION TRAJECTORY:", *(trajectory or ["- Steady - no topic or mood changes."])])
+
+
+def analyze_summary_evolution(summary_history, model=DEFAULT_MODEL, usage=None, perf=None):
     """
     Use AI to analyze how the conversation summary has evolved.
     Sends the last N summaries to GPT and asks it to identify:
@@ -731,6 +3095,11 @@ def analyze_summary_evolution(summary_history, model=DEFAULT_MODEL):
     Args:
         summary_history: List of the last N conversation summaries
         model: OpenAI model to use for analysis
+        usage: Optional SessionUsage to record token usage in
+        perf: Optional PerfRecorder to time the call with
+
+    The analysis is cached per (model, summaries), so asking again before
+    the next turn costs nothing.
 
     Returns:
         str: Natural language analysis of summary evolution
@@ -741,6 +3110,12 @@ def analyze_summary_evolution(summary_history, model=DEFAULT_MODEL):
     if len(summary_history) < 2:
         return "Not enough history yet (need at least 2 turns)."
 
+    cache_key = hashlib.sha256("\0".join([model, *summary_history]).encode('utf-8')).hexdigest()
+    with memory_cache_lock:
+        if cache_key in memory_analysis_cache:
+            memory_analysis_cache.move_to_end(cache_key)
+            return memory_analysis_cache[cache_key]
+
     # Build the meta-analysis prompt
     summaries_text = ""
     for i, summary in enumerate(summary_history, 1):
@@ -761,40 +3136,56 @@ Please provide an analytical comparison focusing on:
 
 Be objective and analytical. Focus on factual content rather than emotional interpretation. You may note observable emotional states (e.g., "wall became upset") but avoid deeper psychological analysis (e.g., avoid phrases like "lamenting" or "struggling with"). Be concise but specific."""
 
+    record = perf.start('memory', model) if perf else None
     try:
         # Call API for meta-analysis
-        # Build API call parameters - GPT-5 models don't support custom temperature
-        api_params = {
-            'model': model,
-            'messages': [
-                {"role": "system", "content": "You are a helpful analyst examining conversation summaries."},
-                {"role": "user", "content": meta_prompt}
-            ]
-        }
-        if MODEL_OPTIONS[model]['supports_temperature']:
-            api_params['temperature'] = 0.5  # Lower temperature for more focused analysis
-
-        # GPT-5 models are reasoning models - set reasoning_effort for speed
-        if MODEL_OPTIONS[model]['is_reasoning_model']:
-            api_params['reasoning_effort'] = MODEL_OPTIONS[model]['reasoning_effort']
-
-        response = client.chat.completions.create(**api_params)
-
-        return response.choices[0].message.content
-
+        # Lower temperature (where supported) for more focused analysis
+        api_params = get_backend().build_params(model, [
+            {"role": "system", "content": "You are a helpful analyst examining conversation summaries."},
+            {"role": "user", "content": meta_prompt}
+        ], temperature=0.5)
+
+        start = time.perf_counter()
+        response = get_backend().create(**api_params)
+        if perf:
+            perf.add(record, 'connect', time.perf_counter() - start)
+            perf.finish(record)
+        if usage:
+            usage.record(response.usage, 'memory', model)
+
+        analysis = response.choices[0].message.content
     except Exception as e:
         return f"Error performing meta-analysis: {e}"
 
+    with memory_cache_lock:
+        memory_analysis_cache[cache_key] = analysis
+        while len(memory_analysis_cache) > MEMORY_CACHE_SIZE:
+            memory_analysis_cache.popitem(last=False)
+    return analysis
+
+
+def display_memory_analysis(summary_history, model=DEFAULT_MODEL, usage=None, perf=None, deep=False):
+    """Display how the conversation summary has evolved
 
-def display_memory_analysis(summary_history, model=DEFAULT_MODEL):
-    """Display the meta-analysis of summary evolution"""
+    Args:
+        summary_history: The last N conversation summaries, oldest first
+        model: OpenAI model to use for the deep analysis
+        usage: Optional SessionUsage to record token usage in
+        perf: Optional PerfRecorder to time the call with
+        deep: If True, have the AI analyze the summaries (see analyze_summary_evolution);
+              otherwise compare them locally
+    """
     print(f"\n{COLOR_SYSTEM}{'=' * TEXT_WIDTH}")
     print("CONVERSATION MEMORY EVOLUTION".center(TEXT_WIDTH))
     print("=" * TEXT_WIDTH + "\n")
 
-    print(f"Analyzing last {len(summary_history)} summaries...\n")
-
-    analysis = analyze_summary_evolution(summary_history, model)
+    summary_history = list(summary_history)
+    if deep:
+        print(f"Analyzing last {len(summary_history)} summaries...\n")
+        analysis = analyze_summary_evolution(summary_history, model, usage, perf)
+    else:
+        print(f"Comparing last {len(summary_history)} summaries (type 'memory deep' for the AI's take)...\n")
+        analysis = describe_memory_analysis(analyze_summary_history(summary_history))
 
     # Wrap the analysis text for readability
     wrapper = textwrap.TextWrapper(width=TEXT_WIDTH, break_long_words=False, break_on_hyphens=False)
@@ -836,7 +3227,12 @@ def parse_command(player_input):
             - 'color_select': Trigger color theme selection
             - 'api': Show API request (brief)
             - 'api_all': Show complete API request
-            - 'memory': Show memory analysis
+            - 'memory': Show memory analysis (local)
+            - 'memory_deep': Show the AI's memory analysis
+            - 'turn_show': Show current turn, speed, mood, and model
+            - 'cost': Show token usage and estimated cost
+            - 'perf': Show latency per phase (p50/p95)
+            - 'save': Save the conversation (data = file name or None for the default)
             - 'chat': Normal conversation (data = player_input)
             - 'error': Malformed command (data = error message)
     """
@@ -865,6 +3261,12 @@ def parse_command(player_input):
         return ('api', None)
     if text in ['help memory', 'help summary']:
         return ('memory', None)
+    if text == 'help cost':
+        return ('cost', None)
+    if text == 'help perf':
+        return ('perf', None)
+    if text == 'help save':
+        return ('save', None)
 
     # Catch-all: any other "help <anything>" shows help screen
     if text.startswith('help '):
@@ -903,11 +3305,27 @@ def parse_command(player_input):
     # Memory/summary commands
     if text in ['memory', 'summary']:
         return ('memory', None)
+    if text in ['memory deep', 'summary deep']:
+        return ('memory_deep', None)
 
     # Turn command
     if text == 'turn':
         return ('turn_show', None)
 
+    # Cost command
+    if text == 'cost':
+        return ('cost', None)
+
+    # Perf command
+    if text == 'perf':
+        return ('perf', None)
+
+    # Save command - 'save' or 'save <file>.json' (file name keeps its case)
+    if text == 'save':
+        return ('save', None)
+    if text.startswith('save ') and text.endswith('.json') and len(text.split()) == 2:
+        return ('save', player_input.strip().split()[1])
+
     # Validate common mistakes
     words = text.split()
     if len(words) > 0:
@@ -1056,124 +3474,997 @@ def display_help(turn_count, current_mood, progression_speed, model):
     print("api          - show the last API request (brief)")
     print("api all      - show the complete untruncated API request")
     print()
-    print("memory       - AI summarizes the last few exchanges")
-    print("summary        between the player and 'the Wall'.")
+    print("memory       - how the conversation has developed over the")
+    print("summary        last few exchanges (instant, no AI call)")
+    print("memory deep  - the AI's analysis of the same (slower)")
     print()
     print("turn         - show current turn, speed, mood, and model")
     print()
+    print("cost         - show tokens used and estimated cost, per turn")
+    print()
+    print("perf         - show how long each part of a turn takes")
+    print()
+    print("save         - save the conversation to continue it later")
+    print("save x.json    (with eastWing.py --resume)")
+    print()
     print("─" * TEXT_WIDTH)
     print(COLOR_RESET)
 
 
-# ═══════════════════════════════════════════════════════════════════════════════
-# GAME LOGIC
-# ═══════════════════════════════════════════════════════════════════════════════
-# Core game functions: opening message, main loop, etc.
+# ═══════════════════════════════════════════════════════════════════════════════
+# GAME LOGIC
+# ═══════════════════════════════════════════════════════════════════════════════
+# Core game functions: opening message, main loop, etc.
+
+
+def display_intro():
+    """Display the opening flavor text"""
+    print(f"{COLOR_SYSTEM}{'═' * TEXT_WIDTH}")
+    print("THE EAST WING".center(TEXT_WIDTH))
+    print("═" * TEXT_WIDTH)
+    print()
+    print("You are a tourist visiting Washington DC to see the sights. A history ")
+    print("nerd, you can't wait to see all of the historical buildings.")
+    print()
+    print("You are wandering down Pennsylvania Ave to check out the White House")
+    print("and nearby buildings. You notice the East Wing of the White House")
+    print("has been demolished, with only a small wall and doorway still standing.")
+    print()
+    print("You are surprised when the wall speaks to you...")
+    print(COLOR_RESET)
+    print()
+    print(f"{COLOR_ALERT}⏱ Note: AI responses may take 5-10 seconds (or longer!). Please be patient...{COLOR_RESET}")
+    print_separator()
+
+
+def build_opening_request(system_prompt, progression_speed='slow', model=DEFAULT_MODEL, stream=False,
+                          facts_message=None):
+    """Build the API request for the wall's opening greeting
+
+    Args:
+        system_prompt: The system prompt to use
+        progression_speed: 'slow' or 'fast' - determines pace of stage advancement
+        model: OpenAI model to use
+        stream: If True, request a streamed response
+        facts_message: Retrieved facts to send after the system prompt (see GameSession.facts_message)
+
+    Returns:
+        tuple: (api_params, opening_messages, length_instruction)
+    """
+    # Use turn_count=0 to get stage_10 constraints (30-40 words)
+    length_instruction = get_random_length_instruction(turn_count=0, progression_speed=progression_speed)
+    opening_messages = [{"role": "system", "content": system_prompt}]
+    if facts_message:
+        opening_messages.append(facts_message)
+    opening_messages.append({"role": "user", "content": f"{INTRO_PROMPT}\n\n{length_instruction}"})
+
+    # Use JSON schema to ensure clean output (summary generated but not displayed)
+    api_params = get_backend().build_params(model, opening_messages, temperature=0.9,
+                                            response_format=WALL_RESPONSE_SCHEMA, stream=stream)
+
+    return api_params, opening_messages, length_instruction
+
+
+def get_facts_version(facts):
+    """Short, stable fingerprint of a facts block (changes when the facts do)"""
+    return hashlib.sha256(facts.encode('utf-8')).hexdigest()[:12]
+
+
+def load_greeting_pool():
+    """Load the on-disk greeting pool
+
+    Returns:
+        dict: {"model|facts_mode|facts_version": [{'greeting': ..., 'length_instruction': ...}, ...]}
+    """
+    try:
+        with open(GREETING_POOL_FILE, 'r', encoding='utf-8') as f:
+            pool = json.load(f)
+        return pool if isinstance(pool, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def greeting_pool_key(model, facts, facts_mode='full'):
+    """Pool key for greetings made with a model from these facts, sent whole or retrieved"""
+    return f"{model}|{facts_mode}|{get_facts_version(facts)}"
+
+
+def take_pooled_greeting(model, facts, facts_mode='full'):
+    """Remove and return a random pre-generated greeting, if one is available
+
+    Args:
+        model: Model the greeting must have been generated with
+        facts: Current facts (greetings are tied to the facts they saw)
+        facts_mode: 'full' or 'retrieve' - how the greeting's request carried the facts
+
+    Returns:
+        dict: {'greeting': ..., 'length_instruction': ...} or None if the pool is empty
+    """
+    key = greeting_pool_key(model, facts, facts_mode)
+    with greeting_pool_lock:
+        pool = load_greeting_pool()
+        entries = pool.get(key)
+        if not entries:
+            return None
+        entry = entries.pop(random.randrange(len(entries)))
+        write_json_atomic(GREETING_POOL_FILE, pool)
+    return entry
+
+
+def top_up_greeting_pool(system_prompt, facts, progression_speed='slow', model=DEFAULT_MODEL,
+                         pool_size=GREETING_POOL_SIZE, facts_mode='full', facts_message=None, usage=None):
+    """Generate greetings until the pool for (model, facts mode, facts) holds pool_size
+
+    Runs in the background once the session has started, so the next launch
+    can show its greeting instantly. Pools for older facts versions of the
+    same model and facts mode are dropped as they can never be used again.
+    Makes at most one call per missing greeting, and stops at the first
+    error or pool write that fails (e.g. a read-only data directory).
+
+    Args:
+        system_prompt: The stage_10 system prompt for these facts
+        facts: Current facts
+        progression_speed: 'slow' or 'fast'
+        model: Model to generate greetings with
+        pool_size: Number of greetings to keep ready
+        facts_mode: 'full' or 'retrieve' - how the system prompt carries the facts
+        facts_message: With 'retrieve', the retrieved facts for the opening (see GameSession.facts_message)
+        usage: Optional SessionUsage to record the greeting calls in
+    """
+    key = greeting_pool_key(model, facts, facts_mode)
+    with greeting_pool_lock:
+        missing = pool_size - len(load_greeting_pool().get(key, []))
+
+    for _ in range(missing):
+        api_params, _, length_instruction = build_opening_request(system_prompt, progression_speed, model,
+                                                                  facts_message=facts_message)
+        try:
+            response = get_backend().create(**api_params)
+            if usage:
+                usage.record(response.usage, 'greeting', model)
+            greeting = json.loads(response.choices[0].message.content)["response"]
+        except Exception:
+            return  # Best-effort - try again next session
+
+        with greeting_pool_lock:
+            pool = load_greeting_pool()
+            for other_key in list(pool):
+                parts = other_key.split('|')
+                # Same model and facts mode (or an older key without a mode), other facts
+                if parts[0] == model and other_key != key and (len(parts) != 3 or parts[1] == facts_mode):
+                    del pool[other_key]
+            if len(pool.get(key, [])) >= pool_size:
+                return  # Another game filled it meanwhile
+            pool.setdefault(key, []).append({'greeting': greeting, 'length_instruction': length_instruction})
+            if not write_json_atomic(GREETING_POOL_FILE, pool):
+                return  # Nowhere to keep them - don't pay for more
+
+
+def get_opening_message(system_prompt, progression_speed='slow', model=DEFAULT_MODEL, stream=True, facts=None,
+                        usage=None, perf=None, facts_message=None):
+    """Generate and display the wall's first message
+
+    The flavor text before it is shown separately by display_intro(), so it
+    can be on screen while the facts are still being fetched.
+
+    If facts are given and the greeting pool has a greeting for them (made
+    with the same facts mode), that greeting is shown straight away with no
+    API call at all.
+
+    Args:
+        system_prompt: The system prompt to use
+        progression_speed: 'slow' or 'fast' - determines pace of stage advancement
+        model: OpenAI model to use for the conversation
+        stream: If True, print the greeting as it is generated
+        facts: Current facts, used to look up a pre-generated greeting
+        usage: Optional SessionUsage to record token usage in
+        perf: Optional PerfRecorder to time the greeting with
+        facts_message: Retrieved facts to send after the system prompt, if the facts are not in it
+
+    Returns:
+        tuple: (wall_greeting, opening_messages, length_instruction) for debug display
+    """
+    perf = perf or PerfRecorder()  # Timing is cheap - keep the code below simple
+    record = perf.start('opening', model)
+
+    # Serve a pre-generated greeting if we have one
+    with perf.span(record, 'prompt'):
+        facts_mode = 'retrieve' if facts_message else 'full'
+        pooled = take_pooled_greeting(model, facts, facts_mode) if facts else None
+    if pooled:
+        length_instruction = pooled['length_instruction']
+        opening_messages = [{"role": "system", "content": system_prompt}]
+        if facts_message:
+            opening_messages.append(facts_message)
+        opening_messages.append({"role": "user", "content": f"{INTRO_PROMPT}\n\n{length_instruction}"})
+        with perf.span(record, 'render'):
+            print_wrapped(pooled['greeting'], "THE WALL: ", COLOR_AI)
+        perf.finish(record)
+        print_separator()
+        return pooled['greeting'], opening_messages, length_instruction
+
+    # Get the wall's opening line from the API
+    with perf.span(record, 'prompt'):
+        api_params, opening_messages, length_instruction = build_opening_request(system_prompt, progression_speed,
+                                                                                 model, stream, facts_message)
+
+    # Make API call with error handling for missing/invalid keys
+    try:
+        # Initialize OpenAI client if not already done
+        with perf.span(record, 'connect'):
+            response = get_backend().create(**api_params)
+
+        if stream:
+            # Show the greeting as it arrives - the summary that follows
+            # it is never used for the opening, so nobody waits for it
+            on_usage = usage.recorder('opening', model) if usage else None
+            wall_stream = WallResponseStream(response, on_usage)
+            wall_greeting = wall_stream.show_reply("THE WALL: ", COLOR_AI)
+            perf.end(record)
+            for phase, seconds in wall_stream.timings().items():
+                perf.add(record, phase, seconds)
+        else:
+            if usage:
+                usage.record(response.usage, 'opening', model)
+
+            # Parse JSON response - only display the response, not the summary
+            with perf.span(record, 'parse'):
+                result = json.loads(response.choices[0].message.content)
+            wall_greeting = result["response"]
+            # Note: result["summary"] exists but we don't use it for the opening
+    except Exception as e:
+        # API key is missing, invalid, expired, or other API error
+        display_api_key_error_and_exit(str(e))
+
+    if not stream:
+        with perf.span(record, 'render'):
+            print_wrapped(wall_greeting, "THE WALL: ", COLOR_AI)
+    perf.finish(record)
+    print_separator()
+
+    return wall_greeting, opening_messages, length_instruction
+
+
+def parse_summary_fields(summary):
+    """Split a summary in the prompt's bracketed format into its fields
+
+    Args:
+        summary: Summary text ("[WALL MOOD: ...]\n[PLAYER MOOD: ...]...")
+
+    Returns:
+        OrderedDict: Field name -> value, in order (empty if the text has no fields)
+    """
+    fields = OrderedDict()
+    matches = list(SUMMARY_FIELD_PATTERN.finditer(summary))
+    for match, following in zip(matches, matches[1:] + [None]):
+        value = summary[match.end():following.start() if following else len(summary)].strip()
+        if value.endswith(']'):
+            value = value[:-1].rstrip()
+        fields[match.group(1)] = value
+    return fields
+
+
+def format_summary_fields(fields):
+    """Join fields from parse_summary_fields() back into summary text (a None name is free text)"""
+    return "\n".join(value if name is None else f"[{name}: {value}]" for name, value in fields.items())
+
+
+def summary_list_items(value):
+    """The items of a bulleted summary field, or None if the field is not a list"""
+    lines = [line.strip() for line in value.splitlines() if line.strip()]
+    if lines and all(line[0] in '-*\u2022' for line in lines):
+        return [line[1:].strip() for line in lines]
+    return None
+
+
+def tidy_summary_field(value):
+    """Collapse whitespace and drop repeats; lists keep their newest SUMMARY_MAX_LIST_ITEMS items"""
+    items = summary_list_items(value)
+    pieces = items if items is not None else re.split(r"(?<=[.!?])\s+", " ".join(value.split()))
+    seen = set()
+    unique = []
+    for piece in pieces:
+        if piece and piece.lower() not in seen:
+            seen.add(piece.lower())
+            unique.append(piece)
+    if items is not None:
+        return "\n".join(f"- {item}" for item in unique[-SUMMARY_MAX_LIST_ITEMS:])
+    return " ".join(unique)
+
+
+def shorten_summary_field(value):
+    """Drop a field's oldest list item or sentence (or the last third of a lone sentence)"""
+    items = summary_list_items(value)
+    if items is not None:
+        return "\n".join(f"- {item}" for item in items[1:])
+    sentences = re.split(r"(?<=[.!?])\s+", value)
+    if len(sentences) > 1:
+        return " ".join(sentences[1:])
+    words = value.split()
+    return " ".join(words[:len(words) * 2 // 3]) + "..." if len(words) > 3 else ""
+
+
+def trim_summary(summary, max_tokens, lossy=False):
+    """Shrink a summary locally, without an API call
+
+    The tidy pass (always run) collapses whitespace, drops repeated
+    sentences and list items, and keeps the newest SUMMARY_MAX_LIST_ITEMS
+    bullets of each list. With lossy=True it then drops the oldest bullet
+    or sentence of the longest field until the summary fits - the moods and
+    the last topic are never shortened.
+
+    Args:
+        summary: Summary text
+        max_tokens: Token budget
+        lossy: If True, cut content until the summary fits
+
+    Returns:
+        str: The trimmed summary (only guaranteed to fit if lossy)
+    """
+    fields = parse_summary_fields(summary) or OrderedDict([(None, summary)])
+    for name in fields:
+        fields[name] = tidy_summary_field(fields[name])
+    text = format_summary_fields(fields)
+
+    while lossy and count_tokens(text) > max_tokens:
+        trimmable = [name for name, value in fields.items() if value and name not in SUMMARY_KEEP_FIELDS]
+        if not trimmable:
+            break
+        longest = max(trimmable, key=lambda name: len(fields[name]))
+        fields[longest] = shorten_summary_field(fields[longest])
+        text = format_summary_fields(fields)
+    return text
+
+
+def resummarize(summary, max_tokens, usage=None, perf=None):
+    """Have the cheapest model rewrite a summary shorter, keeping its fields
+
+    Args:
+        summary: Summary text
+        max_tokens: Token budget the rewrite should fit in
+        usage: Optional SessionUsage to record token usage in
+        perf: Optional PerfRecorder to time the call with
+
+    Returns:
+        str: The rewritten summary
+
+    Raises:
+        ValueError: If the rewrite dropped any of the summary's fields
+        Exception: Whatever the backend raises
+    """
+    model = cheapest_model()
+    compact_prompt = f"""Shorten this conversation summary to under {max_tokens * 3 // 4} words.
+Keep exactly the same bracketed fields in the same order. Keep names, facts the player shared and opinions;
+drop repetition and minor details. Reply with the summary only.
+
+{summary}"""
+
+    record = perf.start('compact', model) if perf else None
+    api_params = get_backend().build_params(model, [
+        {"role": "system", "content": "You compress conversation summaries."},
+        {"role": "user", "content": compact_prompt}
+    ], temperature=0.3)
+
+    start = time.perf_counter()
+    response = get_backend().create(**api_params)
+    if perf:
+        perf.add(record, 'connect', time.perf_counter() - start)
+        perf.finish(record)
+    if usage:
+        usage.record(response.usage, 'compact', model)
+
+    rewritten = (response.choices[0].message.content or "").strip()
+    if list(parse_summary_fields(rewritten)) != list(parse_summary_fields(summary)):
+        raise ValueError("rewrite did not keep the summary's fields")
+    return rewritten
+
+
+class SummaryRecord:
+    """The structured summary as typed fields, kept up to date from deltas
+
+    Text fields hold a string and list fields a list of items (see
+    SUMMARY_FIELDS). In --summary-mode delta the model only sends what
+    changed each turn and merge() applies it here; to_text() renders the
+    usual bracketed format, so everything that reads the summary (the next
+    request, compaction, memory analysis, saving) works as in full mode.
+    """
+
+    __slots__ = [key for _, key, _ in SUMMARY_FIELDS]
+
+    def __init__(self):
+        for _, key, kind in SUMMARY_FIELDS:
+            setattr(self, key, [] if kind == 'list' else "")
+
+    @classmethod
+    def from_text(cls, text):
+        """Build a record from summary text in the bracketed format"""
+        record = cls()
+        fields = parse_summary_fields(text)
+        for label, key, kind in SUMMARY_FIELDS:
+            value = fields.get(label, "")
+            if kind == 'list':
+                items = summary_list_items(value)
+                value = items if items is not None else ([value] if value else [])
+            setattr(record, key, value)
+        return record
+
+    def to_text(self):
+        """Render the record in the bracketed summary format"""
+        fields = OrderedDict()
+        for label, key, kind in SUMMARY_FIELDS:
+            value = getattr(self, key)
+            fields[label] = "\n".join(f"- {item}" for item in value) if kind == 'list' else value
+        return format_summary_fields(fields)
+
+    def merge(self, changes):
+        """Apply a summary_changes delta (see WALL_DELTA_RESPONSE_SCHEMA)
+
+        Returns:
+            int: Number of fields that changed
+        """
+        changed = 0
+        for _, key, kind in SUMMARY_FIELDS:
+            current = getattr(self, key)
+            if kind == 'list':
+                removed = {item.strip().lower() for item in changes.get(f"{key}_removed") or []}
+                items = [item for item in current if item.lower() not in removed]
+                known = {item.lower() for item in items}
+                for item in changes.get(f"{key}_added") or []:
+                    item = item.strip()
+                    if item and item.lower() not in known:
+                        items.append(item)
+                        known.add(item.lower())
+                value = items
+            else:
+                value = changes.get(key)
+                if value is None:
+                    continue
+            if value != current:
+                setattr(self, key, value)
+                changed += 1
+        return changed
+
+
+def diff_summary_fields(old, new):
+    """The changes from one set of summary fields to the next
+
+    Unchanged fields are left out, removed fields map to None, and list
+    fields map to {'add': [...], 'drop': [...]} when that reproduces the
+    new list exactly (otherwise to the whole new value).
+    """
+    diff = {}
+    for name, value in new.items():
+        previous = old.get(name)
+        if value == previous:
+            continue
+        old_items = summary_list_items(previous) if previous else None
+        new_items = summary_list_items(value)
+        if old_items is not None and new_items is not None:
+            add = [item for item in new_items if item not in old_items]
+            drop = [item for item in old_items if item not in new_items]
+            if [item for item in old_items if item not in drop] + add == new_items:
+                diff[name] = {'add': add, 'drop': drop}
+                continue
+        diff[name] = value
+    for name in old:
+        if name not in new:
+            diff[name] = None
+    return diff
+
+
+def apply_summary_diff(fields, diff):
+    """Apply a diff from diff_summary_fields() to a copy of the fields"""
+    fields = OrderedDict(fields)
+    for name, change in diff.items():
+        if change is None:
+            fields.pop(name, None)
+        elif isinstance(change, dict):
+            drop = set(change['drop'])
+            items = [item for item in summary_list_items(fields[name]) if item not in drop] + change['add']
+            fields[name] = "\n".join(f"- {item}" for item in items)
+        else:
+            fields[name] = change
+    return fields
+
+
+class SummaryHistory:
+    """The last few summaries, stored as field-level diffs
 
+    The oldest summary is kept whole and each later one only as what
+    changed since the one before (see diff_summary_fields) - most turns
+    change a mood, the last topic and a list item or two. Iterating yields
+    the full summaries, oldest first, like the deque it replaces.
+    """
 
-def get_opening_message(system_prompt, progression_speed='slow', model=DEFAULT_MODEL):
-    """Generate the opening flavor text and the wall's first message
+    __slots__ = ['maxlen', 'base', 'entries']
+
+    def __init__(self, maxlen=SUMMARY_HISTORY_SIZE):
+        self.maxlen = maxlen
+        self.base = None  # Fields of the oldest summary
+        self.entries = deque()  # ('diff', changes) or ('full', fields) per later summary
+
+    def _fields(self):
+        """Yield the fields of each summary, oldest first"""
+        if self.base is None:
+            return
+        fields = self.base
+        yield fields
+        for kind, data in self.entries:
+            fields = apply_summary_diff(fields, data) if kind == 'diff' else data
+            yield fields
+
+    def append(self, summary):
+        """Add the newest summary (the oldest is dropped beyond maxlen)"""
+        fields = parse_summary_fields(summary) or OrderedDict([(None, summary)])
+        if self.base is None:
+            self.base = fields
+            return
+
+        latest = None
+        for latest in self._fields():
+            pass
+        diff = diff_summary_fields(latest, fields)
+        # Field order can't be diffed - keep a reordered summary whole
+        entry = ('diff', diff) if apply_summary_diff(latest, diff) == fields else ('full', fields)
+        self.entries.append(entry)
+        if len(self.entries) >= self.maxlen:
+            oldest = self.entries.popleft()
+            self.base = apply_summary_diff(self.base, oldest[1]) if oldest[0] == 'diff' else oldest[1]
+
+    def extend(self, summaries):
+        for summary in summaries:
+            self.append(summary)
+
+    def __iter__(self):
+        for fields in self._fields():
+            yield format_summary_fields(fields)
+
+    def __len__(self):
+        return 0 if self.base is None else 1 + len(self.entries)
+
+
+class GameSession:
+    """State and turn pipeline of one conversation with the wall
+
+    Holds everything a conversation carries from turn to turn - turn count,
+    speed, mood override, model, color theme, rolling summary (and in delta
+    mode its typed SummaryRecord), summary history and the compiled system
+    prompt - plus its own token usage and timing records. It does no
+    printing, so the interactive game, scripted runs, batch runs and the
+    server all go through the same stage progression, summary carry-over
+    and length instructions.
+
+    Slots keep the per-session footprint small when a process hosts many
+    sessions. to_dict()/from_dict() save and restore the conversation
+    itself (not the usage and timing records, which belong to the process).
+    """
 
-    Args:
-        system_prompt: The system prompt to use
-        progression_speed: 'slow' or 'fast' - determines pace of stage advancement
-        model: OpenAI model to use for the conversation
+    __slots__ = ['facts', 'progression_speed', 'model', 'mood_override', 'color_theme', 'turn_count',
+                 'conversation_summary', 'summary_history', 'last_api_messages', 'last_length_instruction',
+                 'current_stage', 'usage', 'perf', 'system_prompt', 'system_prompt_tokens', 'summary_compactions',
+                 'summary_mode', 'summary_record', 'facts_mode', 'facts_index', 'prompt_profiles']
+
+    def __init__(self, facts, progression_speed='slow', model=DEFAULT_MODEL, mood_override=None, trace_file=None,
+                 summary_mode='full', facts_mode='auto'):
+        self.facts = facts
+        self.progression_speed = progression_speed
+        self.model = model
+        self.mood_override = mood_override  # Manual mood override (None = auto-progression)
+        self.color_theme = DEFAULT_COLOR_THEME
+        self.turn_count = 0
+        self.conversation_summary = ""  # Rolling summary
+        self.summary_mode = summary_mode  # 'full' (model rewrites the summary) or 'delta' (sends changes only)
+        self.summary_record = SummaryRecord() if summary_mode == 'delta' else None  # Typed summary (delta mode)
+        self.summary_history = SummaryHistory()  # Last few summaries for meta-analysis
+        self.last_api_messages = []  # Store last messages sent to API
+        self.last_length_instruction = ""  # Store last length instruction
+        self.current_stage = get_current_stage(0, progression_speed)  # Track current stage for progression
+        self.usage = SessionUsage()  # Tokens and cost of every API call
+        self.perf = PerfRecorder(trace_file)  # Latency of every phase of every turn
+        self.summary_compactions = 0  # Times the summary was shrunk to fit the context budget
+        self.prompt_profiles = deque(maxlen=PROMPT_PROFILE_HISTORY)  # (turn label, prompt tokens by section)
+        self.set_facts_mode(facts_mode)  # Also compiles the system prompt
+
+    def to_dict(self):
+        """The conversation state as a JSON-ready dict (see from_dict)"""
+        return {
+            'version': SESSION_FORMAT_VERSION,
+            'saved_at': datetime.now().isoformat(timespec='seconds'),
+            'turn_count': self.turn_count,
+            'progression_speed': self.progression_speed,
+            'current_stage': self.current_stage,
+            'mood_override': self.mood_override,
+            'model': self.model,
+            'color_theme': self.color_theme,
+            'conversation_summary': self.conversation_summary,
+            'summary_mode': self.summary_mode,
+            'summary_history': list(self.summary_history),
+            'facts_version': get_facts_version(self.facts)
+        }
 
-    Returns:
-        tuple: (wall_greeting, opening_messages, length_instruction) for debug display
-    """
-    print(f"{COLOR_SYSTEM}{'═' * TEXT_WIDTH}")
-    print("THE EAST WING".center(TEXT_WIDTH))
-    print("═" * TEXT_WIDTH)
-    print()
-    print("You are a tourist visiting Washington DC to see the sights. A history ")
-    print("nerd, you can't wait to see all of the historical buildings.")
-    print()
-    print("You are wandering down Pennsylvania Ave to check out the White House")
-    print("and nearby buildings. You notice the East Wing of the White House")
-    print("has been demolished, with only a small wall and doorway still standing.")
-    print()
-    print("You are surprised when the wall speaks to you...")
-    print(COLOR_RESET)
-    print()
-    print(f"{COLOR_ALERT}⏱ Note: AI responses may take 5-10 seconds (or longer!). Please be patient...{COLOR_RESET}")
-    print_separator()
+    @classmethod
+    def from_dict(cls, data, facts, trace_file=None):
+        """Rebuild a session saved with to_dict()
 
-    # Get the wall's opening line from the API
-    # Use turn_count=0 to get stage_10 constraints (30-40 words)
-    length_instruction = get_random_length_instruction(turn_count=0, progression_speed=progression_speed)
-    opening_messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": f"{INTRO_PROMPT}\n\n{length_instruction}"}
-    ]
+        The facts are not saved with the session - it resumes with the
+        current ones (the system prompt is recompiled for them).
 
-    # Use JSON schema to ensure clean output (summary generated but not displayed)
-    # Build API call parameters - GPT-5 models don't support custom temperature
-    api_params = {
-        'model': model,
-        'messages': opening_messages,
-        'response_format': WALL_RESPONSE_SCHEMA
-    }
-    if MODEL_OPTIONS[model]['supports_temperature']:
-        api_params['temperature'] = 0.9
+        Args:
+            data: Dict from to_dict()
+            facts: Current facts
+            trace_file: Optional JSONL file to append one timing record per turn to
 
-    # GPT-5 models are reasoning models - set reasoning_effort for speed
-    if MODEL_OPTIONS[model]['is_reasoning_model']:
-        api_params['reasoning_effort'] = MODEL_OPTIONS[model]['reasoning_effort']
+        Returns:
+            GameSession
 
-    # Make API call with error handling for missing/invalid keys
-    try:
-        # Initialize OpenAI client if not already done
-        global client
-        if client is None:
-            client = OpenAI(api_key=OPENAI_API_KEY)
+        Raises:
+            ValueError: If the data is not a saved session this version can read
+        """
+        if not isinstance(data, dict) or data.get('version') != SESSION_FORMAT_VERSION:
+            raise ValueError("not a saved session (or saved by an incompatible version)")
+        try:
+            progression_speed = data['progression_speed']
+            model = data['model']
+            summary_mode = data.get('summary_mode', 'full')  # Not in sessions saved before delta mode
+            if progression_speed not in PROGRESSION_SPEEDS or model not in MODEL_OPTIONS:
+                raise ValueError(f"unknown speed '{progression_speed}' or model '{model}'")
+            if summary_mode not in SUMMARY_MODES:
+                raise ValueError(f"unknown summary mode '{summary_mode}'")
+            # Saved games can come from a client (serve mode), so check what later code relies on
+            if data['mood_override'] is not None and data['mood_override'] not in PERSONALITY_TYPES:
+                raise ValueError(f"unknown mood '{data['mood_override']}'")
+            if not isinstance(data['conversation_summary'], str):
+                raise ValueError("conversation_summary is not a string")
+            if not isinstance(data['summary_history'], list) or \
+                    not all(isinstance(summary, str) for summary in data['summary_history']):
+                raise ValueError("summary_history is not a list of strings")
+
+            session = cls(facts, progression_speed, model, data['mood_override'], trace_file, summary_mode)
+            session.turn_count = int(data['turn_count'])
+            session.current_stage = data['current_stage']
+            if data.get('color_theme') in COLOR_THEMES:
+                session.color_theme = data['color_theme']
+            session.conversation_summary = data['conversation_summary']
+            if session.summary_record:
+                session.summary_record = SummaryRecord.from_text(session.conversation_summary)
+            session.summary_history.extend(data['summary_history'])
+        except (KeyError, TypeError) as e:
+            raise ValueError(f"saved session is missing or has a bad field ({e})")
+
+        session.compile_prompt()
+        return session
+
+    def dumps(self):
+        """Serialize the conversation state to a compact JSON string"""
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def loads(cls, text, facts, trace_file=None):
+        """Rebuild a session from dumps() output (see from_dict)"""
+        return cls.from_dict(json.loads(text), facts, trace_file)
+
+    def save(self, path):
+        """Write the conversation state to a file (raises OSError on failure)"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, path, facts, trace_file=None):
+        """Resume a session from a file written by save()
+
+        Raises:
+            OSError: If the file can't be read
+            ValueError: If it is not a saved session
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.loads(f.read(), facts, trace_file)
+
+    def current_mood(self):
+        """The wall's personality right now (the override, if set)"""
+        return get_personality_type(self.turn_count, self.progression_speed, self.mood_override)
+
+    def routed_model(self):
+        """The model turns are going to right now (differs from self.model while downgraded)"""
+        return model_router.routes.get(self.model, self.model) if model_router else self.model
+
+    def compile_prompt(self):
+        """Recompile the system prompt for the current speed, mood and stage"""
+        facts = RETRIEVED_FACTS_NOTE if self.facts_index else self.facts
+        compiled = prompt_compiler.get(facts, self.turn_count, self.progression_speed, self.mood_override)
+        self.system_prompt = compiled.text
+        self.system_prompt_tokens = compiled.token_count
+
+    def opening_prompt(self):
+        """The stage_10 system prompt a fresh game opens with (what pooled greetings are made from)"""
+        facts = RETRIEVED_FACTS_NOTE if self.facts_index else self.facts
+        return prompt_compiler.get(facts, 0, self.progression_speed).text
+
+    def set_facts_mode(self, facts_mode):
+        """Send the facts whole in the system prompt or retrieve them per turn ('auto', 'full', 'retrieve')"""
+        self.facts_mode = resolve_facts_mode(self.facts, facts_mode)
+        self.facts_index = get_facts_index(self.facts) if self.facts_mode == 'retrieve' else None
+        self.compile_prompt()
+
+    def set_facts(self, facts):
+        """Switch to other facts mid-conversation (e.g. a better distillation), keeping the facts mode"""
+        self.facts = facts
+        self.facts_index = get_facts_index(facts) if self.facts_mode == 'retrieve' else None
+        self.compile_prompt()
+
+    def facts_message(self, query, context=""):
+        """The system message with the facts relevant to a query (None when the facts are in the system prompt)"""
+        if not self.facts_index:
+            return None
+        chunks = self.facts_index.search(query, context)
+        return {"role": "system", "content": "RELEVANT FACTS ABOUT THE EAST WING (use them naturally):\n"
+                                            + "\n".join(f"- {chunk}" for chunk in chunks)}
+
+    def set_speed(self, progression_speed):
+        """Change the progression speed and recompile the system prompt"""
+        self.progression_speed = progression_speed
+        self.compile_prompt()
+
+    def set_mood(self, mood):
+        """Override the wall's mood and recompile the system prompt"""
+        self.mood_override = mood
+        self.compile_prompt()
+
+    def opening(self):
+        """Generate the opening greeting without displaying it
+
+        Returns:
+            str: The wall's greeting
+        """
+        record = self.perf.start('opening', self.model)
+        with self.perf.span(record, 'prompt'):
+            api_params, opening_messages, length_instruction = build_opening_request(
+                self.system_prompt, self.progression_speed, self.model, facts_message=self.facts_message(""))
+        with self.perf.span(record, 'connect'):
+            response = get_backend().create(**api_params)
+        self.usage.record(response.usage, 'opening', self.model)
+        with self.perf.span(record, 'parse'):
+            greeting = json.loads(response.choices[0].message.content)["response"]
+        self.perf.finish(record)
+        self.last_api_messages = opening_messages
+        self.last_length_instruction = length_instruction
+        return greeting
+
+    def start_turn(self, player_input, stream=False):
+        """Build the request for the next turn
+
+        Args:
+            player_input: What the player said
+            stream: If True, request a streamed response
+
+        Returns:
+            tuple: (api_params, record) - record is the turn's PerfRecorder record
+        """
+        # The adaptive router may send this turn to a faster model
+        model = model_router.choose(self.model) if model_router else self.model
+        record = self.perf.start(f"turn {self.turn_count + 1}", model)
+
+        with self.perf.span(record, 'prompt'):
+            # Check the token budget - the summary gets whatever room the
+            # rest of the request leaves, up to its own ceiling
+            facts_message = self.facts_message(player_input, self.conversation_summary)
+            length_instruction = get_random_length_instruction(self.turn_count, self.progression_speed)
+            fixed_tokens = (self.system_prompt_tokens + count_tokens(player_input) + count_tokens(length_instruction)
+                            + 4 * MESSAGE_TOKEN_OVERHEAD)
+            if self.summary_record:
+                fixed_tokens += count_tokens(SUMMARY_DELTA_INSTRUCTION) + MESSAGE_TOKEN_OVERHEAD
+            if facts_message:
+                fixed_tokens += count_tokens(facts_message['content']) + MESSAGE_TOKEN_OVERHEAD
+            summary_budget = max(min(SUMMARY_TOKEN_BUDGET, PROMPT_TOKEN_BUDGET - fixed_tokens),
+                                 SUMMARY_MIN_TOKEN_BUDGET)
+            over_budget = count_tokens(self.conversation_summary) > summary_budget
+        if over_budget:
+            self.compact_summary(summary_budget)
+
+        with self.perf.span(record, 'prompt'):
+            # Build messages for this turn
+            messages = [{"role": "system", "content": self.system_prompt}]
+            if self.summary_record:
+                # Constant, so it extends the cacheable prefix
+                messages.append({"role": "system", "content": SUMMARY_DELTA_INSTRUCTION})
+            if facts_message:
+                messages.append(facts_message)
+
+            # Add conversation summary if it exists
+            if self.conversation_summary:
+                messages.append({
+                    "role": "assistant",
+                    "content": f"[Conversation summary: {self.conversation_summary}]"
+                })
 
-        response = client.chat.completions.create(**api_params)
+            # Add current player input
+            messages.append({"role": "user", "content": player_input})
 
-        # Parse JSON response - only display the response, not the summary
-        result = json.loads(response.choices[0].message.content)
-        wall_greeting = result["response"]
-        # Note: result["summary"] exists but we don't use it for the opening
-    except Exception as e:
-        # API key is missing, invalid, expired, or other API error
-        display_api_key_error_and_exit(str(e))
+            # Inject the length instruction
+            messages.append({"role": "system", "content": length_instruction})
 
-    print_wrapped(wall_greeting, "THE WALL: ", COLOR_AI)
-    print_separator()
+            # Store for debug display
+            self.last_api_messages = messages.copy()
+            self.last_length_instruction = length_instruction
+            self.prompt_profiles.append((record['label'], prompt_token_profile(messages)[1]))
 
-    return wall_greeting, opening_messages, length_instruction
+            # Call API with structured JSON output
+            response_format = WALL_DELTA_RESPONSE_SCHEMA if self.summary_record else WALL_RESPONSE_SCHEMA
+            api_params = get_backend().build_params(model, messages, temperature=0.9,
+                                                    response_format=response_format, stream=stream)
+
+        return api_params, record
+
+    def send(self, api_params, record):
+        """Send a turn's request, timing it and reporting it to the adaptive router
+
+        Returns:
+            The backend's response (a stream if the request asked for one)
+        """
+        start = time.perf_counter()
+        try:
+            with self.perf.span(record, 'connect'):
+                response = get_backend().create(**api_params)
+        except Exception:
+            if model_router:
+                model_router.record(self.model, record['model'], time.perf_counter() - start, False)
+            raise
+        if model_router:
+            # ResilientBackend has the first token in hand when create() returns - or,
+            # not streamed, the whole reply (the router's SLO is set for that)
+            model_router.record(self.model, record['model'], record['phases']['connect'], True)
+        return response
+
+    def compact_summary(self, max_tokens):
+        """Shrink the rolling summary to fit max_tokens before it is sent again
+
+        The local tidy pass comes first. If that isn't enough, the cheapest
+        model rewrites the summary, and if that fails the lossy local trim
+        makes it fit. Anything past the tidy pass aims well under the budget
+        (SUMMARY_COMPACT_RATIO) so the next turns don't need compacting again.
+        """
+        target = int(max_tokens * SUMMARY_COMPACT_RATIO)
+        summary = trim_summary(self.conversation_summary, target)
+        if count_tokens(summary) > max_tokens:
+            try:
+                summary = resummarize(summary, target, self.usage, self.perf)
+            except Exception:
+                pass  # Offline, API error or a malformed rewrite - trim locally instead
+            if count_tokens(summary) > target:
+                summary = trim_summary(summary, target, lossy=True)
+        self.conversation_summary = summary
+        if self.summary_record:
+            self.summary_record = SummaryRecord.from_text(summary)
+        self.summary_compactions += 1
+
+    def update_summary(self, result):
+        """Carry a parsed reply's summary (or, in delta mode, its summary changes) over to the next turn"""
+        if self.summary_record:
+            self.summary_record.merge(result['summary_changes'])
+            self.add_summary(self.summary_record.to_text())
+        else:
+            self.add_summary(result['summary'])
+
+    def add_summary(self, summary):
+        """Carry a reply's summary over to the next turn"""
+        self.conversation_summary = summary
+
+        # Track summary history for meta-analysis (it drops the oldest)
+        self.summary_history.append(summary)
+
+    def advance(self, record):
+        """Count a finished turn and move to the next stage if it is due"""
+        self.turn_count += 1
+
+        # Check if we've crossed into a new stage
+        new_stage = get_current_stage(self.turn_count, self.progression_speed)
+
+        # If stage has changed (and no manual mood override), regenerate the system prompt
+        if new_stage != self.current_stage and not self.mood_override:
+            self.current_stage = new_stage
+            with self.perf.span(record, 'prompt'):
+                self.compile_prompt()
+
+    def chat(self, player_input):
+        """Run one complete, non-streamed turn
+
+        Args:
+            player_input: What the player said
 
+        Returns:
+            tuple: (wall_response, record) - the record is left open so the
+            caller can time rendering before passing it to perf.finish()
+        """
+        api_params, record = self.start_turn(player_input)
+        response = self.send(api_params, record)
+        self.usage.record(response.usage, record['label'], record['model'])
 
-def play_game(progression_speed='slow', model=DEFAULT_MODEL):
+        # Parse JSON response
+        with self.perf.span(record, 'parse'):
+            result = json.loads(response.choices[0].message.content)
+        self.update_summary(result)
+        self.advance(record)
+
+        return result["response"], record
+
+
+def play_game(progression_speed='slow', model=DEFAULT_MODEL, stream=True, facts_deadline=FACTS_DEADLINE_SECONDS,
+              facts_ttl=FACTS_CACHE_TTL_HOURS, offline=False, greeting_pool_size=GREETING_POOL_SIZE,
+              trace_file=None, resume_file=None, summary_mode='full', facts_mode='auto', distill=True):
     """Main game loop - unified command system, no debug mode
 
     Args:
         progression_speed: 'slow' or 'fast' - determines pace of stage advancement
         model: OpenAI model to use for the conversation
+        stream: If True, print the wall's replies as they are generated
+        facts_deadline: Time budget in seconds for the startup fact searches
+        facts_ttl: Hours before cached facts are refreshed
+        offline: If True, use only cached or fallback facts (no web search)
+        greeting_pool_size: Pre-generated greetings to keep ready (0 = always generate live)
+        trace_file: Optional JSONL file to append one timing record per turn to
+        resume_file: Optional saved conversation to continue (see the 'save' command)
+        summary_mode: 'full' or 'delta' - how the model updates the rolling summary
+        facts_mode: 'auto', 'full' or 'retrieve' - send the facts whole or only the relevant ones
+        distill: If True, send the facts as distilled bullets (see distill_facts)
     """
-    # Fetch current facts about the East Wing
+    # Pipelined startup: fetch facts and set up the LLM backend in the
+    # background while the player reads the intro, then send the greeting
+    # request the moment the facts are in
     print("Fetching current information about the East Wing...")
-    facts = fetch_east_wing_facts()
+    facts_task = BackgroundTask(fetch_east_wing_facts, facts_deadline, facts_ttl, offline)
+    client_task = BackgroundTask(get_backend().connect)
     print()  # Blank line
 
-    # Show brief startup message
+    # Show brief startup message and the opening flavor text
     display_startup()
+    display_intro()
 
-    # Track conversation state
-    turn_count = 0
-    mood_override = None  # Manual mood override (None = auto-progression)
-    conversation_summary = ""  # Rolling summary
-    summary_history = []  # Store last 5 summaries for meta-analysis
-    last_api_messages = []  # Store last messages sent to API
-    last_length_instruction = ""  # Store last length instruction
-    current_stage = get_current_stage(0, progression_speed)  # Track current stage for progression
-    current_color_theme = DEFAULT_COLOR_THEME  # Track current color theme
-
-    # Generate initial system prompt
-    system_prompt = get_system_prompt(facts, turn_count, progression_speed, mood_override)
+    facts = facts_task.result()
+    try:
+        client_task.result()
+    except Exception as e:
+        display_api_key_error_and_exit(str(e))
+    distill_task = None  # Model distillation of new facts, picked up on a later turn
+    if distill:
+        facts, distill_task = start_distilling_facts(facts, offline)
 
-    # Get opening message (uses JSON schema)
-    opening_greeting, opening_api_messages, opening_length_instruction = get_opening_message(system_prompt, progression_speed, model)
+    # Track conversation state
+    session = None
+    if resume_file:
+        try:
+            session = GameSession.load(resume_file, facts, trace_file)
+            session.set_facts_mode(facts_mode)
+        except (OSError, ValueError) as e:
+            print(f"{COLOR_ALERT}Could not resume from {resume_file} ({e}). Starting a new conversation.{COLOR_RESET}\n")
+    resumed = session is not None
+    if not resumed:
+        session = GameSession(facts, progression_speed, model, trace_file=trace_file, summary_mode=summary_mode,
+                              facts_mode=facts_mode)
+    usage, perf = session.usage, session.perf
+    pending_stream = None  # Streamed reply whose summary is still arriving
+    pending_record = None  # Perf record of the reply whose summary is still arriving
+    decisions_seen = len(model_router.decisions) if model_router else 0  # Router decisions already shown
+
+    if resumed:
+        # Pick the conversation up where it was left - no greeting
+        set_color_theme(session.color_theme)
+        print(f"{COLOR_SYSTEM}Resuming saved conversation: Turn: {session.turn_count}, "
+              f"Speed: {session.progression_speed}, Mood: {session.current_mood()}, Model: {session.model}{COLOR_RESET}")
+        print_separator()
+    else:
+        # Get opening message (uses JSON schema)
+        opening_greeting, opening_api_messages, opening_length_instruction = get_opening_message(
+            session.system_prompt, session.progression_speed, session.model, stream,
+            facts if greeting_pool_size else None, usage, perf, session.facts_message(""))
+
+    # Refill the greeting pool for next time while the player chats - not when
+    # resuming, as the resumed prompt is past stage_10 (pooled greetings open fresh
+    # games), and not until the facts are distilled for good
+    if greeting_pool_size and not resumed and not distill_task:
+        BackgroundTask(top_up_greeting_pool, session.system_prompt, facts, session.progression_speed, session.model,
+                       greeting_pool_size, session.facts_mode, session.facts_message(""), usage)
 
     # Main conversation loop
     while True:
@@ -1181,9 +4472,36 @@ def play_game(progression_speed='slow', model=DEFAULT_MODEL):
         try:
             player_input = input(f"{COLOR_PLAYER}YOU: {COLOR_RESET}").strip()
         except (EOFError, KeyboardInterrupt):
+            display_cassette_misses()
             print("\n\nThanks for playing!")
             sys.exit(0)
 
+        # Collect the summary of the last streamed reply - it has been
+        # arriving in the background while the player was typing
+        if pending_stream:
+            try:
+                session.update_summary(pending_stream.result())
+                for phase, seconds in pending_stream.timings().items():
+                    perf.add(pending_record, phase, seconds)
+                perf.finish(pending_record)
+            except Exception as e:
+                # The reply was shown, but the wall won't remember it
+                print(f"{COLOR_ALERT}\n(The wall lost its train of thought: {e}){COLOR_RESET}\n")
+            pending_stream = None
+            pending_record = None
+
+        # Switch to the model's distillation of the facts once it's in
+        if distill_task and distill_task.done():
+            try:
+                session.set_facts(distill_task.result())
+                if greeting_pool_size and not resumed:
+                    BackgroundTask(top_up_greeting_pool, session.opening_prompt(), session.facts,
+                                   session.progression_speed, session.model, greeting_pool_size,
+                                   session.facts_mode, session.facts_message(""), usage)
+            except Exception:
+                pass  # Keep the local distillation
+            distill_task = None
+
         # Pre-interpret command vs conversation
         cmd_type, cmd_data = parse_command(player_input)
 
@@ -1192,6 +4510,7 @@ def play_game(progression_speed='slow', model=DEFAULT_MODEL):
         if cmd_type == 'quit':
             print()
             print_wrapped("Well, I suppose I'll just stand here alone then. Typical.", "THE WALL: ", COLOR_AI)
+            display_cassette_misses()
             print("\nThanks for playing!")
             break
 
@@ -1202,98 +4521,121 @@ def play_game(progression_speed='slow', model=DEFAULT_MODEL):
 
         # Handle help
         if cmd_type == 'help':
-            current_mood = mood_override if mood_override else PROGRESSION_SPEEDS[progression_speed][get_current_stage(turn_count, progression_speed)]['personality']
-            display_help(turn_count, current_mood, progression_speed, model)
+            display_help(session.turn_count, session.current_mood(), session.progression_speed, session.model)
             continue
 
         # Handle speed show
         if cmd_type == 'speed_show':
-            print(f"{COLOR_SYSTEM}\nCurrent game speed: {progression_speed}{COLOR_RESET}\n")
+            print(f"{COLOR_SYSTEM}\nCurrent game speed: {session.progression_speed}{COLOR_RESET}\n")
             continue
 
         # Handle speed select
         if cmd_type == 'speed_select':
-            new_speed = select_speed(progression_speed)
-            if new_speed and new_speed != progression_speed:
-                progression_speed = new_speed
+            new_speed = select_speed(session.progression_speed)
+            if new_speed and new_speed != session.progression_speed:
                 # Regenerate system prompt if needed
-                system_prompt = get_system_prompt(facts, turn_count, progression_speed, mood_override)
+                session.set_speed(new_speed)
             continue
 
         # Handle mood show
         if cmd_type == 'mood_show':
-            current_mood = mood_override if mood_override else PROGRESSION_SPEEDS[progression_speed][get_current_stage(turn_count, progression_speed)]['personality']
-            print(f"{COLOR_SYSTEM}\nThe Wall's current mood: {current_mood}{COLOR_RESET}\n")
+            print(f"{COLOR_SYSTEM}\nThe Wall's current mood: {session.current_mood()}{COLOR_RESET}\n")
             continue
 
         # Handle mood select
         if cmd_type == 'mood_select':
-            current_mood = mood_override if mood_override else PROGRESSION_SPEEDS[progression_speed][get_current_stage(turn_count, progression_speed)]['personality']
-            new_mood = select_mood(current_mood)
+            new_mood = select_mood(session.current_mood())
             if new_mood:
-                mood_override = new_mood
                 # Regenerate system prompt with new mood
-                system_prompt = get_system_prompt(facts, turn_count, progression_speed, mood_override)
+                session.set_mood(new_mood)
             continue
 
         # Handle model show
         if cmd_type == 'model_show':
-            model_info = MODEL_OPTIONS[model]
-            print(f"{COLOR_SYSTEM}\nCurrent model: {model}{COLOR_RESET}")
+            model_info = MODEL_OPTIONS[session.model]
+            print(f"{COLOR_SYSTEM}\nCurrent model: {session.model}{COLOR_RESET}")
+            if session.routed_model() != session.model:
+                print(f"{COLOR_SYSTEM}  Replies are slow right now - turns are going to {session.routed_model()}{COLOR_RESET}")
             print(f"{COLOR_SYSTEM}  {model_info['description']}{COLOR_RESET}")
             print(f"{COLOR_SYSTEM}  Performance: {model_info['performance']} | Speed: {model_info['speed']} | Cost: {model_info['cost']}{COLOR_RESET}\n")
             continue
 
         # Handle model select
         if cmd_type == 'model_select':
-            new_model = select_model(model)
+            new_model = select_model(session.model)
             if new_model:
-                model = new_model
+                session.model = new_model
             continue
 
         # Handle color show
         if cmd_type == 'color_show':
-            theme_info = COLOR_THEMES[current_color_theme]
-            print(f"{COLOR_SYSTEM}\nCurrent color theme: {current_color_theme.replace('-', ' ').title()}{COLOR_RESET}")
+            theme_info = COLOR_THEMES[session.color_theme]
+            print(f"{COLOR_SYSTEM}\nCurrent color theme: {session.color_theme.replace('-', ' ').title()}{COLOR_RESET}")
             print(f"{COLOR_SYSTEM}  {theme_info['description']}{COLOR_RESET}\n")
             continue
 
         # Handle color select
         if cmd_type == 'color_select':
-            new_theme = select_color_theme(current_color_theme)
+            new_theme = select_color_theme(session.color_theme)
             if new_theme:
-                current_color_theme = new_theme
+                session.color_theme = new_theme
                 set_color_theme(new_theme)
                 print(f"{COLOR_SYSTEM}Color theme changed to: {new_theme.replace('-', ' ').title()}{COLOR_RESET}\n")
             continue
 
         # Handle API debug
         if cmd_type == 'api':
-            if last_api_messages:
-                display_api_debug_info(last_api_messages, last_length_instruction, truncate=True)
+            if session.last_api_messages:
+                display_api_debug_info(session.last_api_messages, session.last_length_instruction,
+                                       truncate=True, usage=usage, summary_compactions=session.summary_compactions,
+                                       profiles=list(session.prompt_profiles))
             else:
                 print(f"{COLOR_SYSTEM}\nNo API calls made yet.{COLOR_RESET}\n")
             continue
 
         if cmd_type == 'api_all':
-            if last_api_messages:
-                display_api_debug_info(last_api_messages, last_length_instruction, truncate=False)
+            if session.last_api_messages:
+                display_api_debug_info(session.last_api_messages, session.last_length_instruction,
+                                       truncate=False, usage=usage, summary_compactions=session.summary_compactions,
+                                       profiles=list(session.prompt_profiles))
             else:
                 print(f"{COLOR_SYSTEM}\nNo API calls made yet.{COLOR_RESET}\n")
             continue
 
         # Handle memory analysis
-        if cmd_type == 'memory':
-            if summary_history:
-                display_memory_analysis(summary_history, model)
+        if cmd_type in ['memory', 'memory_deep']:
+            if session.summary_history:
+                display_memory_analysis(session.summary_history, session.model, usage, perf,
+                                        deep=cmd_type == 'memory_deep')
             else:
                 print(f"{COLOR_SYSTEM}\nNo conversation history yet (need at least 2 turns).{COLOR_RESET}\n")
             continue
 
+        # Handle cost report
+        if cmd_type == 'cost':
+            display_cost_report(usage)
+            continue
+
+        # Handle latency report
+        if cmd_type == 'perf':
+            display_perf_report(perf)
+            continue
+
+        # Handle save
+        if cmd_type == 'save':
+            save_file = cmd_data or SESSION_SAVE_FILE
+            try:
+                session.save(save_file)
+                print(f"{COLOR_SYSTEM}\nConversation saved to {save_file}")
+                print(f"Continue it later with: eastWing.py --resume {save_file}{COLOR_RESET}\n")
+            except OSError as e:
+                print(f"{COLOR_ALERT}\nCould not save the conversation ({e}).{COLOR_RESET}\n")
+            continue
+
         # Handle turn show
         if cmd_type == 'turn_show':
-            current_mood = mood_override if mood_override else PROGRESSION_SPEEDS[progression_speed][get_current_stage(turn_count, progression_speed)]['personality']
-            print(f"{COLOR_SYSTEM}\nTurn: {turn_count}, Speed: {progression_speed}, Mood: {current_mood}, Model: {model}{COLOR_RESET}\n")
+            print(f"{COLOR_SYSTEM}\nTurn: {session.turn_count}, Speed: {session.progression_speed}, "
+                  f"Mood: {session.current_mood()}, Model: {session.model}{COLOR_RESET}\n")
             continue
 
         # ═══ CONVERSATION LOGIC ═══
@@ -1305,73 +4647,566 @@ def play_game(progression_speed='slow', model=DEFAULT_MODEL):
 
         # Get AI response with structured JSON output
         try:
-            # Build messages for this turn
-            messages = [{"role": "system", "content": system_prompt}]
+            if stream:
+                api_params, record = session.start_turn(player_input, stream=True)
+                response = session.send(api_params, record)
+
+                # Print the reply as it arrives; the summary is collected
+                # in the background and picked up before the next turn
+                print_separator()
+                pending_stream = WallResponseStream(response, usage.recorder(record['label'], record['model']))
+                pending_record = record
+                pending_stream.show_reply("THE WALL: ", COLOR_AI)
+                perf.end(record)  # The summary still arriving is not part of the turn's total
+                session.advance(record)
+            else:
+                wall_response, record = session.chat(player_input)
 
-            # Add conversation summary if it exists
-            if conversation_summary:
-                messages.append({
-                    "role": "assistant",
-                    "content": f"[Conversation summary: {conversation_summary}]"
-                })
+                # Display response
+                print_separator()
+                with perf.span(record, 'render'):
+                    print_wrapped(wall_response, "THE WALL: ", COLOR_AI)
+                perf.finish(record)
+            print_separator()
 
-            # Add current player input
-            messages.append({"role": "user", "content": player_input})
+            # Let the player know if the adaptive router switched models
+            if model_router:
+                for decision in model_router.decisions[decisions_seen:]:
+                    if decision['action'] != 'stay':
+                        print(f"{COLOR_SYSTEM}(Replies were {'slow' if decision['action'] == 'downgrade' else 'fast again'}"
+                              f" - switched from {decision['from']} to {decision['to']}){COLOR_RESET}\n")
+                decisions_seen = len(model_router.decisions)
 
-            # Get random length instruction and inject it
-            length_instruction = get_random_length_instruction(turn_count, progression_speed)
-            messages.append({"role": "system", "content": length_instruction})
+        except Exception as e:
+            # Retries are already used up - let the player try again
+            pending_stream = None
+            pending_record = None
+            print(f"\nError communicating with the wall: {e}")
+            print("The wall seems to have gone silent... try saying that again.\n")
 
-            # Store for debug display
-            last_api_messages = messages.copy()
-            last_length_instruction = length_instruction
 
-            # Call API with structured JSON output
-            # Build API call parameters - GPT-5 models don't support custom temperature
-            api_params = {
-                'model': model,
-                'messages': messages,
-                'response_format': WALL_RESPONSE_SCHEMA
-            }
-            if MODEL_OPTIONS[model]['supports_temperature']:
-                api_params['temperature'] = 0.9
+# ═══════════════════════════════════════════════════════════════════════════════
+# SCRIPTED / BATCH PLAY
+# ═══════════════════════════════════════════════════════════════════════════════
 
-            # GPT-5 models are reasoning models - set reasoning_effort for speed
-            if MODEL_OPTIONS[model]['is_reasoning_model']:
-                api_params['reasoning_effort'] = MODEL_OPTIONS[model]['reasoning_effort']
 
-            response = client.chat.completions.create(**api_params)
+def load_script(path):
+    """Read a play script
 
-            # Parse JSON response
-            result = json.loads(response.choices[0].message.content)
-            wall_response = result["response"]
-            conversation_summary = result["summary"]
+    A script is a JSONL file with one step per line. A step is either a
+    JSON string (a line the player types) or an object with an optional
+    "player" line and any of "speed", "mood" and "model", which are applied
+    before the line is sent:
+
+        {"speed": "fast", "player": "Hello, wall."}
+        "What happened to the ballroom?"
+        {"mood": "angry"}
+
+    Args:
+        path: Script file
+
+    Returns:
+        list: One dict per step, e.g. {'player': 'Hello, wall.', 'speed': 'fast'}
+    """
+    steps = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                step = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"line {line_number}: {e}")
+            if isinstance(step, str):
+                step = {'player': step}
+            if not isinstance(step, dict):
+                raise ValueError(f"line {line_number}: expected a string or an object")
+            if step.get('speed') not in (None, *PROGRESSION_SPEEDS):
+                raise ValueError(f"line {line_number}: unknown speed '{step['speed']}'")
+            if step.get('model') not in (None, *MODEL_OPTIONS):
+                raise ValueError(f"line {line_number}: unknown model '{step['model']}'")
+            if step.get('mood') not in (None, *PERSONALITY_TYPES):
+                raise ValueError(f"line {line_number}: unknown mood '{step['mood']}'")
+            steps.append(step)
+    return steps
+
+
+def turn_metrics(session, record):
+    """Tokens, cost and phase timings of a finished turn"""
+    metrics = {
+        'phases_ms': {phase: round(seconds * 1000, 2) for phase, seconds in record['phases'].items()},
+        'total_ms': round(record['total'] * 1000, 2)
+    }
+    with session.usage.lock:
+        call = next((call for call in reversed(session.usage.calls) if call['label'] == record['label']), None)
+    if call:
+        for field in ['prompt_tokens', 'cached_tokens', 'completion_tokens', 'reasoning_tokens', 'cost']:
+            metrics[field] = call[field]
+    return metrics
 
-            # Track summary history for meta-analysis (keep last 5)
-            summary_history.append(conversation_summary)
-            if len(summary_history) > 5:
-                summary_history.pop(0)  # Remove oldest
 
-            # Increment turn count
-            turn_count += 1
+def run_script(path, facts, progression_speed='slow', model=DEFAULT_MODEL, out_dir=BATCH_OUTPUT_DIR,
+               trace_file=None, summary_mode='full', facts_mode='auto'):
+    """Play one script through the full turn pipeline, without the UI
 
-            # Check if we've crossed into a new stage
-            new_stage = get_current_stage(turn_count, progression_speed)
+    Commands in the script (help, api, ...) are skipped, except quit, which
+    ends the conversation. An API error ends the conversation too, as it
+    does in the game; it is recorded in the output rather than raised.
 
-            # If stage has changed (and no manual mood override), regenerate the system prompt
-            if new_stage != current_stage and not mood_override:
-                current_stage = new_stage
-                system_prompt = get_system_prompt(facts, turn_count, progression_speed, mood_override)
+    Args:
+        path: Script file (see load_script)
+        facts: Facts for the system prompt
+        progression_speed: Starting speed ('slow' or 'fast')
+        model: Starting model
+        out_dir: Directory to write <script name>.json to
+        trace_file: Optional JSONL file to append one timing record per turn to
+        summary_mode: 'full' or 'delta' - how the model updates the rolling summary
+        facts_mode: 'auto', 'full' or 'retrieve' - send the facts whole or only the relevant ones
 
-            # Display response
-            print_separator()
-            print_wrapped(wall_response, "THE WALL: ", COLOR_AI)
-            print_separator()
+    Returns:
+        dict: The session's result as written to disk (script, settings,
+              transcript with per-turn metrics, totals, error)
+    """
+    session = GameSession(facts, progression_speed, model, trace_file=trace_file, summary_mode=summary_mode,
+                          facts_mode=facts_mode)
+    result = {
+        'script': path,
+        'speed': progression_speed,
+        'model': model,
+        'summary_mode': summary_mode,
+        'facts_mode': session.facts_mode,
+        'turns': 0,
+        'transcript': [],
+        'totals': None,
+        'error': None
+    }
+
+    try:
+        steps = load_script(path)
+        greeting = session.opening()
+        opening_record = session.perf.records[-1]
+        result['transcript'].append({
+            'turn': 0,
+            'player': None,
+            'wall': greeting,
+            'summary': None,
+            'stage': session.current_stage,
+            'mood': session.current_mood(),
+            'model': session.model,
+            'length_instruction': session.last_length_instruction,
+            **turn_metrics(session, opening_record)
+        })
+
+        for step in steps:
+            if step.get('speed') and step['speed'] != session.progression_speed:
+                session.set_speed(step['speed'])
+            if step.get('mood'):
+                session.set_mood(step['mood'])
+            if step.get('model'):
+                session.model = step['model']
+
+            player_input = str(step.get('player') or '').strip()
+            cmd_type, _ = parse_command(player_input)
+            if cmd_type == 'quit':
+                break
+            if cmd_type != 'chat' or not player_input:
+                continue
+
+            # Stage and mood the reply was written in
+            stage = get_current_stage(session.turn_count, session.progression_speed)
+            mood = session.current_mood()
+
+            wall_response, record = session.chat(player_input)
+            session.perf.finish(record)
+            result['transcript'].append({
+                'turn': session.turn_count,
+                'player': player_input,
+                'wall': wall_response,
+                'summary': session.conversation_summary,
+                'stage': stage,
+                'mood': mood,
+                'model': record['model'],  # May differ from the chosen model with --adaptive
+                'length_instruction': session.last_length_instruction,
+                **turn_metrics(session, record)
+            })
+    except Exception as e:
+        result['error'] = str(e)
+
+    result['turns'] = session.turn_count
+    result['totals'] = session.usage.totals()
+    result['perf'] = session.perf
 
+    name = os.path.splitext(os.path.basename(path))[0]
+    os.makedirs(out_dir, exist_ok=True)
+    write_json_atomic(os.path.join(out_dir, f"{name}.json"),
+                      {key: value for key, value in result.items() if key != 'perf'})
+    return result
+
+
+def run_batch(script_paths, facts, progression_speed='slow', model=DEFAULT_MODEL, out_dir=BATCH_OUTPUT_DIR,
+              workers=BATCH_WORKERS, trace_file=None, summary_mode='full', facts_mode='auto'):
+    """Play many scripts concurrently and write a summary of the whole batch
+
+    Each script gets its own GameSession; at most `workers` run at once.
+    The calls are network-bound, so threads overlap them well.
+
+    Args:
+        script_paths: Script files (see load_script)
+        facts: Facts for the system prompt, shared by every session
+        progression_speed: Starting speed for every session
+        model: Starting model for every session
+        out_dir: Directory for the per-script results and batch_summary.json
+        workers: Maximum number of sessions running at once
+        trace_file: Optional JSONL file to append one timing record per turn to
+        summary_mode: 'full' or 'delta' - how the model updates the rolling summary
+        facts_mode: 'auto', 'full' or 'retrieve' - send the facts whole or only the relevant ones
+
+    Returns:
+        list: Each session's result (see run_script), in script order
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    results = {}
+    batch_perf = PerfRecorder()  # All turns of all sessions, for the latency report
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(run_script, path, facts, progression_speed, model, out_dir, trace_file,
+                                   summary_mode, facts_mode): path
+                   for path in script_paths}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            result = results[path] = future.result()
+            batch_perf.records.extend(record for record in result['perf'].records
+                                      if record['label'] != 'opening')
+            status = f"error: {result['error']}" if result['error'] else "ok"
+            print(f"[{done}/{len(script_paths)}] {os.path.basename(path)}: "
+                  f"{result['turns']} turns, ${result['totals']['cost']:.4f} ({status})")
+
+    elapsed = time.perf_counter() - start
+    ordered = [results[path] for path in script_paths]
+
+    summary = {
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'speed': progression_speed,
+        'model': model,
+        'summary_mode': summary_mode,
+        'facts_mode': resolve_facts_mode(facts, facts_mode),
+        'workers': workers,
+        'elapsed_seconds': round(elapsed, 2),
+        'sessions': [{
+            'script': result['script'],
+            'turns': result['turns'],
+            'error': result['error'],
+            **result['totals']
+        } for result in ordered],
+        'turn_latency_ms': perf_percentiles_ms(batch_perf)
+    }
+    os.makedirs(out_dir, exist_ok=True)
+    write_json_atomic(os.path.join(out_dir, 'batch_summary.json'), summary)
+
+    turns = sum(session['turns'] for session in summary['sessions'])
+    failed = sum(1 for session in summary['sessions'] if session['error'])
+    cost = sum(session['cost'] for session in summary['sessions'])
+    print(f"\n{len(ordered)} sessions, {turns} turns in {elapsed:.1f}s ({failed} failed), "
+          f"estimated cost ${cost:.4f}")
+    print(f"Results written to {out_dir}")
+    display_perf_report(batch_perf, "TURN LATENCY BY PHASE (ALL SESSIONS)")
+
+    return ordered
+
+
+# ═══════════════════════════════════════════════════════════════════════════════
+# SERVER MODE
+# ═══════════════════════════════════════════════════════════════════════════════
+
+
+def session_state(session):
+    """JSON-ready view of a session's settings, progress and usage"""
+    return {
+        'turn': session.turn_count,
+        'speed': session.progression_speed,
+        'stage': get_current_stage(session.turn_count, session.progression_speed),
+        'mood': session.current_mood(),
+        'mood_override': session.mood_override,
+        'model': session.model,
+        'routed_model': session.routed_model(),
+        'summary_mode': session.summary_mode,
+        'usage': session.usage.totals()
+    }
+
+
+class WallServer:
+    """Host many walls at once over a small local HTTP/JSON API
+
+    Every visitor gets their own GameSession, so speeds, moods, summaries
+    and stages never mix. The API calls are blocking, so they run on a
+    thread pool; a semaphore caps how many are in flight at once, which
+    keeps throughput bounded by API concurrency rather than by one player.
+    Turns of one session run one at a time, in order.
+
+    Endpoints (all bodies are JSON):
+        POST   /session             start a session - optional {"speed", "mood", "model"};
+                                    returns its id and the wall's greeting. {"state": ...}
+                                    resumes a saved session instead (no greeting)
+        POST   /session/ID/say      {"text": ...} - a chat line or a command
+                                    (turn, mood, speed, model, api, memory [deep], cost, perf, save, quit)
+        GET    /session/ID          the session's state
+        POST   /session/ID          change {"speed", "mood", "model"} ("mood": null = auto)
+        DELETE /session/ID          end the session
+        GET    /stats               sessions, calls in flight and turn latency
+    """
+
+    def __init__(self, facts, progression_speed='slow', model=DEFAULT_MODEL, max_concurrent=SERVE_MAX_CONCURRENT,
+                 idle_minutes=SERVE_IDLE_MINUTES, trace_file=None, summary_mode='full', facts_mode='auto'):
+        self.facts = facts
+        self.progression_speed = progression_speed
+        self.model = model
+        self.summary_mode = summary_mode  # For new sessions (resumed ones keep their own)
+        self.facts_mode = facts_mode
+        self.max_concurrent = max_concurrent
+        self.idle_seconds = idle_minutes * 60
+        self.trace_file = trace_file
+        self.sessions = {}  # id -> GameSession
+        self.session_locks = {}  # id -> asyncio.Lock, so one session's turns run in order
+        self.last_seen = {}  # id -> time.monotonic() of its last request
+        from concurrent.futures import ThreadPoolExecutor
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrent)
+        self.semaphore = None  # Created in serve(), inside the event loop
+        self.in_flight = 0
+        self.perf = PerfRecorder()  # Every turn of every session, for /stats
+
+    async def call(self, func, *args):
+        """Run a blocking function (an API call) on the thread pool"""
+        async with self.semaphore:
+            self.in_flight += 1
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+            finally:
+                self.in_flight -= 1
+
+    def apply_settings(self, session, settings):
+        """Apply {"speed", "mood", "model"} to a session, or return an error message"""
+        for name in ['speed', 'mood', 'model']:
+            value = settings.get(name)
+            if name in settings and not isinstance(value, str) and not (name == 'mood' and value is None):
+                return f"'{name}' must be a string{' or null' if name == 'mood' else ''}."
+        if 'speed' in settings and settings['speed'] not in PROGRESSION_SPEEDS:
+            return f"Unknown speed '{settings['speed']}'. Available: {', '.join(PROGRESSION_SPEEDS)}"
+        if 'model' in settings and settings['model'] not in MODEL_OPTIONS:
+            return f"Unknown model '{settings['model']}'. Available: {', '.join(MODEL_OPTIONS)}"
+        if settings.get('mood') is not None and settings['mood'] not in PERSONALITY_TYPES:
+            return f"Unknown mood '{settings['mood']}'. Available: {', '.join(PERSONALITY_TYPES)}"
+
+        if 'speed' in settings and settings['speed'] != session.progression_speed:
+            session.set_speed(settings['speed'])
+        if 'mood' in settings:
+            session.set_mood(settings['mood'])
+        if 'model' in settings:
+            session.model = settings['model']
+        return None
+
+    async def new_session(self, settings):
+        if 'state' in settings:
+            # Resume a session saved with the 'save' command (possibly by another server)
+            try:
+                session = GameSession.from_dict(settings['state'], self.facts, self.trace_file)
+                session.set_facts_mode(self.facts_mode)
+            except ValueError as e:
+                return 400, {'error': f"Could not resume session ({e})."}
+            greeting = None
+        else:
+            session = GameSession(self.facts, self.progression_speed, self.model, trace_file=self.trace_file,
+                                  summary_mode=self.summary_mode, facts_mode=self.facts_mode)
+            error = self.apply_settings(session, settings)
+            if error:
+                return 400, {'error': error}
+            try:
+                greeting = await self.call(session.opening)
+            except Exception as e:
+                return 502, {'error': f"Error communicating with the wall: {e}"}
+
+        session_id = uuid.uuid4().hex
+        self.sessions[session_id] = session
+        self.session_locks[session_id] = asyncio.Lock()
+        self.last_seen[session_id] = time.monotonic()
+        return 201, {'session': session_id, 'greeting': greeting, **session_state(session)}
+
+    async def say(self, session_id, text):
+        """Handle one line from the player - a command or a chat turn"""
+        session = self.sessions[session_id]
+        text = str(text or '').strip()
+        cmd_type, cmd_data = parse_command(text)
+
+        if cmd_type == 'quit':
+            self.end_session(session_id)
+            return 200, {'reply': "Well, I suppose I'll just stand here alone then. Typical.", 'ended': True}
+        if cmd_type == 'error':
+            return 400, {'error': cmd_data}
+        if cmd_type in ['turn_show', 'mood_show', 'speed_show', 'model_show']:
+            return 200, session_state(session)
+        if cmd_type in ['speed_select', 'mood_select', 'model_select']:
+            return 400, {'error': f"Menus are not available here - POST /session/{session_id} with "
+                                  f"{{\"{cmd_type.split('_')[0]}\": ...}} instead."}
+        if cmd_type in ['api', 'api_all']:
+            return 200, {'messages': session.last_api_messages, 'length_instruction': session.last_length_instruction,
+                         'tokens': prompt_token_profile(session.last_api_messages)[1],
+                         'token_trend': [{'turn': label, **sections} for label, sections in session.prompt_profiles]}
+        if cmd_type == 'cost':
+            with session.usage.lock:
+                calls = list(session.usage.calls)
+            return 200, {'totals': session.usage.totals(), 'calls': calls}
+        if cmd_type == 'perf':
+            return 200, {'latency_ms': perf_percentiles_ms(session.perf)}
+        if cmd_type == 'save':
+            return 200, {'state': session.to_dict()}
+        if cmd_type in ['memory', 'memory_deep']:
+            if not session.summary_history:
+                return 200, {'analysis': "No conversation history yet (need at least 2 turns)."}
+            if cmd_type == 'memory':
+                local = analyze_summary_history(list(session.summary_history))
+                return 200, {'analysis': describe_memory_analysis(local), 'changes': local}
+            analysis = await self.call(analyze_summary_evolution, list(session.summary_history), session.model,
+                                       session.usage, session.perf)
+            return 200, {'analysis': analysis}
+        if cmd_type != 'chat':
+            return 400, {'error': f"'{text}' is not available here. Commands: turn, mood, speed, model, api, "
+                                  "memory [deep], cost, perf, save, quit"}
+        if not text:
+            return 400, {'error': "Say something."}
+
+        try:
+            wall_response, record = await self.call(session.chat, text)
         except Exception as e:
-            print(f"\nError communicating with the wall: {e}")
-            print("The wall seems to have gone silent...\n")
-            break
+            return 502, {'error': f"Error communicating with the wall: {e}"}
+        session.perf.finish(record)
+        self.perf.records.append(record)
+        if len(self.perf.records) > SERVE_PERF_RECORDS:
+            del self.perf.records[0]
+        return 200, {'reply': wall_response, **session_state(session), 'metrics': turn_metrics(session, record)}
+
+    def end_session(self, session_id):
+        self.sessions.pop(session_id, None)
+        self.session_locks.pop(session_id, None)
+        self.last_seen.pop(session_id, None)
+
+    def stats(self):
+        return {
+            'sessions': len(self.sessions),
+            'in_flight': self.in_flight,
+            'max_concurrent': self.max_concurrent,
+            'turn_latency_ms': perf_percentiles_ms(self.perf)
+        }
+
+    async def dispatch(self, method, path, body):
+        """Route one request
+
+        Returns:
+            tuple: (HTTP status, JSON-ready payload)
+        """
+        try:
+            data = json.loads(body) if body.strip() else {}
+        except ValueError:
+            return 400, {'error': "Request body must be JSON."}
+        if not isinstance(data, dict):
+            return 400, {'error': "Request body must be a JSON object."}
+
+        parts = [part for part in path.split('?')[0].split('/') if part]
+        if parts == ['stats'] and method == 'GET':
+            return 200, self.stats()
+        if parts == ['session'] and method == 'POST':
+            return await self.new_session(data)
+        if len(parts) not in [2, 3] or parts[0] != 'session':
+            return 404, {'error': f"No such endpoint: {method} {path}"}
+
+        session_id = parts[1]
+        if session_id not in self.sessions:
+            return 404, {'error': f"No such session: {session_id}"}
+        self.last_seen[session_id] = time.monotonic()
+
+        async with self.session_locks[session_id]:
+            if session_id not in self.sessions:  # Ended while we waited
+                return 404, {'error': f"No such session: {session_id}"}
+            session = self.sessions[session_id]
+            if len(parts) == 3 and parts[2] == 'say' and method == 'POST':
+                return await self.say(session_id, data.get('text'))
+            if len(parts) == 2 and method == 'GET':
+                return 200, session_state(session)
+            if len(parts) == 2 and method == 'POST':
+                error = self.apply_settings(session, data)
+                return (400, {'error': error}) if error else (200, session_state(session))
+            if len(parts) == 2 and method == 'DELETE':
+                self.end_session(session_id)
+                return 200, {'ended': True, 'usage': session.usage.totals()}
+        return 404, {'error': f"No such endpoint: {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        """Serve HTTP/1.1 requests on one connection (with keep-alive)"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                length = int(headers.get('content-length') or 0)
+                if length > SERVE_MAX_BODY_BYTES:
+                    status, payload = 413, {'error': "Request body too large."}
+                    keep_alive = False
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    try:
+                        status, payload = await self.dispatch(method.upper(), path, body.decode('utf-8', 'replace'))
+                    except Exception as e:
+                        # A bug, not the client's fault - answer rather than drop the connection
+                        status, payload = 500, {'error': f"Internal error: {e}"}
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+
+                content = json.dumps(payload).encode('utf-8')
+                writer.write((f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(content)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1')
+                             + content)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass  # Malformed request or client went away - just drop the connection
+        finally:
+            writer.close()
+
+    async def expire_idle_sessions(self):
+        """End sessions nobody has used for idle_minutes"""
+        while True:
+            await asyncio.sleep(60)
+            now = time.monotonic()
+            for session_id, last_seen in list(self.last_seen.items()):
+                if now - last_seen > self.idle_seconds and not self.session_locks[session_id].locked():
+                    self.end_session(session_id)
+
+    async def serve(self, host=SERVE_HOST, port=SERVE_PORT):
+        """Run the server until interrupted"""
+        self.semaphore = asyncio.Semaphore(self.max_concurrent)
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        expiry = asyncio.ensure_future(self.expire_idle_sessions())
+        print(f"The wall is listening on http://{host}:{port} "
+              f"(up to {self.max_concurrent} API calls at once). Press Ctrl+C to stop.")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            expiry.cancel()
+            self.executor.shutdown(wait=False)
 
 
 def main():
@@ -1411,8 +5246,240 @@ def main():
              '  - gpt-4o-mini: Legacy model, good quality, low cost\n'
              '  - Change during gameplay with "model ?" command'
     )
+    parser.add_argument(
+        '--summary-mode',
+        choices=SUMMARY_MODES,
+        default='full',
+        help='How the model keeps the conversation summary up to date:\n'
+             '  - full: rewrites the whole summary every turn (default)\n'
+             '  - delta: sends only the fields that changed - fewer tokens\n'
+             '    to generate, so each turn finishes sooner'
+    )
+    parser.add_argument(
+        '--no-stream',
+        action='store_true',
+        help='Wait for each complete reply instead of printing the\n'
+             "wall's words as they are generated"
+    )
+    parser.add_argument(
+        '--facts-mode',
+        choices=FACTS_MODES,
+        default='auto',
+        help='How the facts are sent to the model:\n'
+             '  - full: all of them in the system prompt, every turn\n'
+             '  - retrieve: only the few most relevant to what was just\n'
+             '    said, so turns stay small however many facts there are\n'
+             f'  - auto: retrieve when the facts are over {FACTS_FULL_MAX_TOKENS} tokens (default)'
+    )
+    parser.add_argument(
+        '--no-distill',
+        action='store_true',
+        help='Send the facts as fetched instead of as distilled bullets\n'
+             '  - Distilling drops repeated sentences and, if the facts are\n'
+             f'    still over {FACTS_DISTILL_TOKENS} tokens, has the cheapest model condense them\n'
+             '  - Done once per new set of facts, then cached'
+    )
+    parser.add_argument(
+        '--facts-timeout',
+        type=float,
+        default=FACTS_DEADLINE_SECONDS,
+        metavar='SECONDS',
+        help='Time budget for the startup fact searches (default: %(default)s)\n'
+             '  - Searches still running after this are skipped\n'
+             '  - Missing facts are filled in from built-in fallback facts'
+    )
+    parser.add_argument(
+        '--facts-ttl',
+        type=float,
+        default=FACTS_CACHE_TTL_HOURS,
+        metavar='HOURS',
+        help='How long cached facts stay fresh (default: %(default)s)\n'
+             '  - Older facts are still used, then refreshed in the background'
+    )
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help='Never search the web for facts:\n'
+             '  - Uses cached facts from earlier runs, or built-in fallback facts'
+    )
+    parser.add_argument(
+        '--greeting-pool',
+        type=int,
+        default=GREETING_POOL_SIZE,
+        metavar='N',
+        help='Keep N pre-generated opening greetings on disk (default: %(default)s)\n'
+             '  - The greeting is shown instantly instead of waiting for the AI\n'
+             '  - Use 0 to always generate the greeting live'
+    )
+    parser.add_argument(
+        '--trace',
+        type=str,
+        metavar='FILE',
+        help='Append one JSON line of phase timings per turn to FILE'
+    )
+    parser.add_argument(
+        '--backend',
+        choices=['openai', 'mock'],
+        default='openai',
+        help='Where replies come from:\n'
+             '  - openai: the OpenAI API (default)\n'
+             '  - mock: a local stand-in with canned replies - no network or\n'
+             '    API key needed (implies --offline and no greeting pool)'
+    )
+    parser.add_argument(
+        '--mock-latency',
+        type=float,
+        default=MOCK_LATENCY_SECONDS,
+        metavar='SECONDS',
+        help='Mock backend: delay before the first token (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--mock-tps',
+        type=float,
+        default=MOCK_TOKENS_PER_SECOND,
+        metavar='N',
+        help='Mock backend: tokens generated per second, 0 = instant (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--mock-words',
+        type=int,
+        metavar='N',
+        help='Mock backend: reply length in words (default: follow the length instruction)'
+    )
+    parser.add_argument(
+        '--record',
+        type=str,
+        metavar='FILE',
+        help='Record every API request and reply (with timing) to a cassette FILE\n'
+             '  - The greeting is always generated live, so a replay can match it'
+    )
+    parser.add_argument(
+        '--replay',
+        type=str,
+        metavar='FILE',
+        help='Replay replies from a cassette FILE instead of calling the API\n'
+             '  - Needs no network or API key (implies --offline)\n'
+             '  - Type the same lines as in the recording to match replies'
+    )
+    parser.add_argument(
+        '--replay-latency',
+        action='store_true',
+        help='With --replay: wait as long as the original replies took'
+    )
+    parser.add_argument(
+        '--replay-strict',
+        action='store_true',
+        help='With --replay: fail a request that was not recorded instead of\n'
+             'replaying the next recording in order'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=CALL_TIMEOUT_SECONDS,
+        metavar='SECONDS',
+        help='Give up on an API call with no reply (or first word) after\n'
+             'SECONDS and retry it (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--retries',
+        type=int,
+        default=CALL_RETRIES,
+        metavar='N',
+        help='Retry timed-out, rate-limited or failed API calls N times,\n'
+             'with growing, jittered delays (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--hedge',
+        action='store_true',
+        help='Send a second copy of any API call that is slower than 95%%\n'
+             'of recent calls, and use whichever answers first\n'
+             '  - Cuts the slowest replies short, for a little extra cost'
+    )
+    parser.add_argument(
+        '--adaptive',
+        action='store_true',
+        help='Switch to a faster model while replies are slower than --slo,\n'
+             'and back when they recover (e.g. gpt-5-mini -> gpt-5-nano)\n'
+             '  - Every switch is logged to ~/.eastWing/router_log.jsonl'
+    )
+    parser.add_argument(
+        '--slo',
+        type=float,
+        metavar='SECONDS',
+        help='With --adaptive: target median time to the first word of a\n'
+             f'reply (default: {ROUTER_SLO_SECONDS:g})\n'
+             '  - Without streaming (--no-stream, --script, --batch, --serve),\n'
+             f'    the time to the whole reply instead (default: {ROUTER_REPLY_SLO_SECONDS:g})'
+    )
+    parser.add_argument(
+        '--resume',
+        type=str,
+        metavar='FILE',
+        nargs='?',
+        const=SESSION_SAVE_FILE,
+        help='Continue a conversation saved with the "save" command\n'
+             '  - FILE defaults to the file "save" writes when given no name'
+    )
+    parser.add_argument(
+        '--script',
+        type=str,
+        metavar='FILE',
+        help='Play a JSONL script of player lines without the interactive UI\n'
+             '  - One JSON string (or {"player": ..., "speed"/"mood"/"model": ...})\n'
+             '    per line\n'
+             '  - Writes the transcript and per-turn metrics to --out'
+    )
+    parser.add_argument(
+        '--batch',
+        type=str,
+        metavar='DIR',
+        help='Play every *.jsonl script in DIR, several at once (see --script)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=BATCH_WORKERS,
+        metavar='N',
+        help='With --script/--batch: sessions to run at once (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--out',
+        type=str,
+        default=BATCH_OUTPUT_DIR,
+        metavar='DIR',
+        help='With --script/--batch: directory for results (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help='Host the wall for many players at once over a local HTTP/JSON API\n'
+             '  - POST /session to start, POST /session/ID/say {"text": ...} to talk\n'
+             '  - Every session has its own stage, mood and memory'
+    )
+    parser.add_argument(
+        '--host',
+        type=str,
+        default=SERVE_HOST,
+        help='With --serve: address to listen on (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=SERVE_PORT,
+        help='With --serve: port to listen on (default: %(default)s)'
+    )
+    parser.add_argument(
+        '--max-concurrent',
+        type=int,
+        default=SERVE_MAX_CONCURRENT,
+        metavar='N',
+        help='With --serve: API calls in flight at once (default: %(default)s)'
+    )
     args = parser.parse_args()
 
+    # Load environment variables
+    load_environment()
+
     # Validate and configure model
     model_to_use, is_valid = validate_model(args.model)
 
@@ -1425,6 +5492,39 @@ def main():
 
     # API key validation removed - key is now hardcoded in line 23
 
+    # Choose the LLM backend
+    global llm_backend, model_router, asyncio
+    if args.backend == 'mock':
+        llm_backend = MockBackend(args.mock_latency, args.mock_tps, args.mock_words)
+        args.offline = True  # No network at all
+        args.greeting_pool = 0  # Don't mix canned greetings into the real pool
+        print(f"{COLOR_ALERT}Using mock backend - replies are canned, not AI generated{COLOR_RESET}")
+    else:
+        llm_backend = OpenAIBackend()
+
+    if args.replay:
+        try:
+            llm_backend = CassetteBackend(args.replay, 'replay', replay_latency=args.replay_latency,
+                                          strict=args.replay_strict)
+        except (OSError, ValueError) as e:
+            print(f"{COLOR_ALERT}Error: could not read cassette '{args.replay}' ({e}).{COLOR_RESET}")
+            sys.exit(1)
+        args.offline = True
+        args.greeting_pool = 0  # Greetings must come from the cassette
+        print(f"{COLOR_ALERT}Replaying recorded replies from {args.replay}{COLOR_RESET}")
+    elif args.record:
+        llm_backend = CassetteBackend(args.record, 'record', inner=llm_backend)
+        args.greeting_pool = 0  # Record the opening a replay will ask for, and no pool top-ups
+        print(f"{COLOR_ALERT}Recording API traffic to {args.record}{COLOR_RESET}")
+
+    # Deadlines and retries for every call (and hedging if asked for)
+    llm_backend = ResilientBackend(llm_backend, args.timeout, max(args.retries, 0), args.hedge)
+
+    if args.adaptive:
+        streamed = not (args.no_stream or args.script or args.batch or args.serve)  # Only play_game streams turns
+        slo = args.slo if args.slo is not None else ROUTER_SLO_SECONDS if streamed else ROUTER_REPLY_SLO_SECONDS
+        model_router = ModelRouter(slo, streamed=streamed)
+
     # Determine progression speed from flags (default is slow)
     if args.fast:
         progression_speed = 'fast'
@@ -1435,8 +5535,58 @@ def main():
     print(f"{COLOR_ALERT}Current game speed: {progression_speed}{COLOR_RESET}")
     print()  # Blank line
 
+    # Scripted play: no UI, just the turn pipeline and the results on disk
+    if args.script or args.batch:
+        if args.script:
+            script_paths = [args.script]
+        else:
+            try:
+                script_paths = sorted(os.path.join(args.batch, name) for name in os.listdir(args.batch)
+                                      if name.endswith('.jsonl'))
+            except OSError as e:
+                print(f"{COLOR_ALERT}Error: could not read batch directory '{args.batch}' ({e}).{COLOR_RESET}")
+                sys.exit(1)
+        if not script_paths:
+            print(f"{COLOR_ALERT}Error: no *.jsonl scripts in '{args.batch}'.{COLOR_RESET}")
+            sys.exit(1)
+
+        facts = fetch_east_wing_facts(args.facts_timeout, args.facts_ttl, args.offline)
+        try:
+            get_backend().connect()
+        except Exception as e:
+            display_api_key_error_and_exit(str(e), wait=False)
+        if not args.no_distill:
+            facts = distill_facts(facts, args.offline)
+        run_batch(script_paths, facts, progression_speed, model_to_use, args.out, args.workers, args.trace,
+                  args.summary_mode, args.facts_mode)
+        return
+
+    # Server mode: many players, one process
+    if args.serve:
+        facts = fetch_east_wing_facts(args.facts_timeout, args.facts_ttl, args.offline)
+        try:
+            get_backend().connect()
+        except Exception as e:
+            display_api_key_error_and_exit(str(e), wait=False)
+        if not args.no_distill:
+            facts = distill_facts(facts, args.offline)
+        server = WallServer(facts, progression_speed, model_to_use, max(args.max_concurrent, 1),
+                            trace_file=args.trace, summary_mode=args.summary_mode, facts_mode=args.facts_mode)
+        import asyncio
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            print("\nServer stopped.")
+        except OSError as e:
+            print(f"{COLOR_ALERT}Error: could not listen on {args.host}:{args.port} ({e}).{COLOR_RESET}")
+            sys.exit(1)
+        return
+
     try:
-        play_game(progression_speed=progression_speed, model=model_to_use)
+        play_game(progression_speed=progression_speed, model=model_to_use, stream=not args.no_stream,
+                  facts_deadline=args.facts_timeout, facts_ttl=args.facts_ttl, offline=args.offline,
+                  greeting_pool_size=args.greeting_pool, trace_file=args.trace, resume_file=args.resume,
+                  summary_mode=args.summary_mode, facts_mode=args.facts_mode, distill=not args.no_distill)
     except KeyboardInterrupt:
         print("\n\nThanks for playing!")
         sys.exit(0)
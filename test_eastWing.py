@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Tests for the East Wing's facts retrieval.
+
+Offline - no API calls, no network.
+
+    python -m unittest test_eastWing
+"""
+
+import re
+import unittest
+
+import eastWing
+
+
+# A retrieved fact's own bullet marker at the start of one of its sentences
+# (facts_message() adds the only one a fact should have)
+DOUBLED_BULLET_PATTERN = re.compile(r"(?:^|[.!?]\s)[-*•]\s")
+
+# Facts as distill_facts_locally() leaves them: a heading and "- " bullets,
+# one with a dash inside a sentence that must be kept
+DISTILLED_FACTS = """- The East Wing of the White House was originally built in 1902.
+- It was remodeled in 1942 during World War II to provide additional office space.
+- It houses the First Lady's staff and the White House Social Secretary.
+
+Recent news:
+- The East Wing was demolished in 2025 - to make room for a ballroom.
+* Tourists used to enter the White House through the East Wing.
+• - The colonnade connects it to the Executive Residence."""
+
+
+class ChunkFactsTest(unittest.TestCase):
+
+    def test_drops_bullet_markers(self):
+        for chunk in eastWing.chunk_facts(DISTILLED_FACTS):
+            self.assertIsNone(DOUBLED_BULLET_PATTERN.search(chunk), chunk)
+
+    def test_keeps_the_sentences(self):
+        text = " ".join(eastWing.chunk_facts(DISTILLED_FACTS))
+        self.assertIn("The East Wing of the White House was originally built in 1902.", text)
+        self.assertIn("demolished in 2025 - to make room for a ballroom.", text)
+        self.assertIn("The colonnade connects it to the Executive Residence.", text)
+
+    def test_keeps_a_leading_minus_sign(self):
+        self.assertEqual(eastWing.chunk_facts("-5 degrees on the day it fell."), ["-5 degrees on the day it fell."])
+
+
+class FactsMessageTest(unittest.TestCase):
+
+    def test_no_doubled_bullet_markers(self):
+        facts = eastWing.distill_facts_locally(f"{eastWing.FALLBACK_FACTS}\n\n{DISTILLED_FACTS}")
+        session = eastWing.GameSession(facts, 'fast', eastWing.DEFAULT_MODEL, facts_mode='retrieve')
+        for query in ["", "When was the East Wing built?", "ballroom demolition", "First Lady staff"]:
+            lines = session.facts_message(query)['content'].splitlines()[1:]
+            self.assertTrue(lines, query)
+            for line in lines:
+                self.assertTrue(line.startswith("- "), line)
+                self.assertIsNone(DOUBLED_BULLET_PATTERN.search(line[2:]), line)
+
+
+if __name__ == "__main__":
+    unittest.main()